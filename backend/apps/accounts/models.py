@@ -1,13 +1,20 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
+from apps.media.storage import content_addressed_storage
+
 
 class User(AbstractUser):
     """Кастомная модель пользователя"""
     email = models.EmailField(unique=True)
     first_name = models.CharField(max_length=30, blank=True)
     last_name = models.CharField(max_length=30, blank=True)
-    avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    # Хранится по SHA-256 содержимого (upload_to задает только исходное имя)
+    avatar = models.ImageField(
+        upload_to='avatars/', blank=True, null=True, storage=content_addressed_storage
+    )
+    # Карта уменьшенных копий avatar (см. apps.media.variants)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     bio = models.TextField(max_length=500, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
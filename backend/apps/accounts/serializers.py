@@ -2,6 +2,7 @@ from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
 from .models import User
+from apps.media.fields import ImageVariantsField
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -68,6 +69,7 @@ class UserLoginSerializer(serializers.Serializer):
 class UserProfileSerializer(serializers.ModelSerializer):
     """Сериализатор для профиля пользователя""" 
     full_name = serializers.ReadOnlyField()
+    avatar_variants = ImageVariantsField('avatar')
     posts_count = serializers.SerializerMethodField()
     comments_count = serializers.SerializerMethodField()
 
@@ -75,7 +77,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = User
         fields = (
             'id', 'username', 'email', 'first_name', 'last_name',
-            'full_name', 'avatar', 'bio', 'created_at', 'updated_at',
+            'full_name', 'avatar', 'avatar_variants', 'bio', 'created_at', 'updated_at',
             'posts_count', 'comments_count'
         )
         read_only_fields = ('id', 'created_at', 'updated_at')
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0002_comments_sync_index'),
+        ('main', '0021_change_txid'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='change_txid',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['change_txid', 'id'], name='comments_txid_idx'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                CREATE TRIGGER comments_change_txid
+                BEFORE INSERT OR UPDATE ON comments
+                FOR EACH ROW EXECUTE FUNCTION stamp_change_txid()
+            """,
+            reverse_sql='DROP TRIGGER comments_change_txid ON comments',
+        ),
+    ]
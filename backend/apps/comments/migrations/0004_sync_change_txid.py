@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:29
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comments', '0003_change_txid'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='comment',
+            name='comments_sync_idx',
+        ),
+        # Существующие комментарии читает первая синхронизация (позиция 0);
+        # триггер иначе оставил бы прежнее значение
+        migrations.RunSQL(
+            sql=[
+                'ALTER TABLE comments DISABLE TRIGGER comments_change_txid',
+                'UPDATE comments SET change_txid = 0 WHERE change_txid IS NULL',
+                'ALTER TABLE comments ENABLE TRIGGER comments_change_txid',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
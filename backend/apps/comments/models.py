@@ -1,5 +1,35 @@
-from django.db import models
+from collections import Counter
+
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
+
+
+class CommentQuerySet(models.QuerySet):
+    """QuerySet комментариев с поддержкой счетчика активных комментариев"""
+
+    def set_active(self, is_active):
+        """
+        Массово меняет is_active и в той же транзакции корректирует
+        posts.active_comments_count. Возвращает число измененных комментариев.
+        """
+        from apps.main.models import Post
+
+        with transaction.atomic():
+            changed = list(
+                self.exclude(is_active=is_active)
+                .select_for_update(of=('self',))
+                .values_list('pk', 'post_id')
+            )
+            per_post = Counter(post_id for _, post_id in changed)
+            updated = self.model.objects.filter(
+                pk__in=[pk for pk, _ in changed]
+            ).update(is_active=is_active, updated_at=timezone.now())
+            sign = 1 if is_active else -1
+            Post.objects.adjust_comments_count({
+                post_id: sign * count for post_id, count in per_post.items()
+            })
+        return updated
 
 
 class Comment(models.Model):
@@ -25,6 +55,10 @@ class Comment(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Транзакция, последней изменившая комментарий (триггер, apps.main.watermarks)
+    change_txid = models.BigIntegerField(null=True, editable=False)
+
+    objects = CommentQuerySet.as_manager()
 
     class Meta:
         db_table = 'comments'
@@ -35,11 +69,44 @@ class Comment(models.Model):
             models.Index(fields=['post', '-created_at']),
             models.Index(fields=['author', '-created_at']),
             models.Index(fields=['parent', '-created_at']),
+            models.Index(fields=['change_txid', 'id'], name='comments_txid_idx'),
         ]
 
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженное состояние для счетчика активных комментариев
+        if not instance.get_deferred_fields() & {'post_id', 'is_active'}:
+            instance._loaded_counter_state = (instance.post_id, instance.is_active)
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Сохраняет комментарий и обновляет posts.active_comments_count"""
+        from apps.main.models import Post
+        from apps.main.trending import record_engagement
+
+        is_new = self._state.adding
+        deltas = Counter()
+        previous = getattr(self, '_loaded_counter_state', None)
+        if previous is None and not self._state.adding:
+            previous = type(self).objects.filter(pk=self.pk).values_list(
+                'post_id', 'is_active'
+            ).first()
+        if previous is not None and previous[1]:
+            deltas[previous[0]] -= 1
+        if self.is_active:
+            deltas[self.post_id] += 1
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Post.objects.adjust_comments_count(deltas)
+            if is_new and self.is_active:
+                record_engagement(comments={self.post_id: 1})
+        self._loaded_counter_state = (self.post_id, self.is_active)
+
     @property
     def replies_count(self):
         return self.replies.filter(is_active=True).count()
@@ -1,9 +1,11 @@
 from rest_framework import serializers
 from .models import Comment
 from apps.main.models import Post
+from apps.main.sparse import SparseFieldsMixin
+from apps.media.fields import image_variants
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Базовый сериализатор для комментариев"""
     author_info = serializers.SerializerMethodField()
     replies_count = serializers.ReadOnlyField()
@@ -17,16 +19,36 @@ class CommentSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = ['author', 'is_active']
+        # Колонки для вычисляемых полей (см. apps.main.sparse)
+        sparse_sources = {
+            'author_info': (
+                'author__id', 'author__username', 'author__first_name',
+                'author__last_name', 'author__avatar', 'author__avatar_variants'
+            ),
+            'replies_count': (),
+            'is_reply': ('parent',),
+        }
 
     def get_author_info(self, obj):
         return {
             'id': obj.author.id,
             'username': obj.author.username,
             'full_name': obj.author.full_name,
-            'avatar': obj.author.avatar.url if obj.author.avatar else None
+            'avatar': obj.author.avatar.url if obj.author.avatar else None,
+            'avatar_variants': image_variants(obj.author, 'avatar')
         }
     
 
+class CommentSyncSerializer(CommentSerializer):
+    """Комментарий для синхронизации клиентов: с постом, без счетчика ответов"""
+
+    class Meta(CommentSerializer.Meta):
+        fields = [
+            'id', 'post', 'content', 'author', 'author_info', 'parent',
+            'is_reply', 'created_at', 'updated_at'
+        ]
+
+
 class CommentCreateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания комментариев"""
     
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import Comment
+
+
+@receiver(post_delete, sender=Comment)
+def comment_post_delete(sender, instance, **kwargs):
+    """Уменьшает счетчик активных комментариев поста при удалении"""
+    from apps.main.models import Post
+
+    if instance.is_active:
+        Post.objects.adjust_comments_count({instance.post_id: -1})
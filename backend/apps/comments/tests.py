@@ -1,3 +1,90 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from apps.main.models import Category, Post
+
+from .models import Comment
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ActiveCommentsCountTests(TestCase):
+    def setUp(self):
+        self.author = get_user_model().objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+        category = Category.objects.create(name='Europe', slug='europe')
+        self.post = Post.objects.create(
+            title='Post', content='Text', author=self.author, category=category, status='published'
+        )
+        self.other = Post.objects.create(
+            title='Other', content='Text', author=self.author, category=category, status='published'
+        )
+
+    def comment(self, post=None, **kwargs):
+        return Comment.objects.create(
+            post=post or self.post, author=self.author, content='Hi', **kwargs
+        )
+
+    def assertCounts(self, *expected):
+        self.assertEqual(
+            tuple(Post.objects.get(pk=post.pk).active_comments_count for post in (self.post, self.other)),
+            expected
+        )
+
+    def test_create_and_toggle(self):
+        first = self.comment()
+        self.comment()
+        self.comment(is_active=False)
+        self.assertCounts(2, 0)
+
+        first.is_active = False
+        first.save()
+        self.assertCounts(1, 0)
+
+        first.is_active = True
+        first.save()
+        self.assertCounts(2, 0)
+
+    def test_move_to_other_post(self):
+        comment = self.comment()
+
+        comment.post = self.other
+        comment.save()
+
+        self.assertCounts(0, 1)
+
+    def test_delete_only_counts_active_comments(self):
+        active = self.comment()
+        inactive = self.comment(is_active=False)
+
+        inactive.delete()
+        self.assertCounts(1, 0)
+        active.delete()
+        self.assertCounts(0, 0)
+
+    def test_bulk_set_active(self):
+        self.comment()
+        self.comment()
+        self.comment(post=self.other)
+
+        self.assertEqual(Comment.objects.filter(post=self.post).set_active(False), 2)
+        self.assertCounts(0, 1)
+        # Уже неактивные комментарии счетчик не меняют
+        self.assertEqual(Comment.objects.all().set_active(False), 1)
+        self.assertCounts(0, 0)
+        Comment.objects.all().set_active(True)
+        self.assertCounts(2, 1)
+
+    def test_reconcile_fixes_drift(self):
+        self.comment()
+        self.comment(post=self.other)
+        Post.objects.filter(pk=self.post.pk).update(active_comments_count=7)
+
+        out = StringIO()
+        call_command('reconcile_comments_count', chunk_size=1, stdout=out)
+
+        self.assertCounts(1, 1)
+        self.assertIn('Checked 2 posts, fixed 1', out.getvalue())
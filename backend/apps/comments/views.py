@@ -2,6 +2,7 @@ from rest_framework import generics, permissions, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.db.models import Q
 from django.shortcuts import get_object_or_404
 
 from .models import Comment
@@ -12,10 +13,29 @@ from .serializers import (
     CommentDetailSerializer
 )
 from .permissions import IsAuthorOrReadOnly
+from apps.main.conditional import (
+    aggregate_validators,
+    conditional_view,
+    get_validators,
+    ConditionalListMixin,
+    ConditionalRetrieveMixin,
+    COMMENT_VALIDATOR_SCOPES,
+)
 from apps.main.models import Post
+from apps.main.sparse import SparseQuerysetMixin
+
+
+def post_comments_queryset(request, post_id):
+    """Комментарии поста - для валидаторов post_comments"""
+    return Comment.objects.filter(post_id=post_id, is_active=True)
+
 
+def replies_queryset(request, comment_id):
+    """Ответы на комментарий - для валидаторов comment_replies"""
+    return Comment.objects.filter(parent_id=comment_id, is_active=True)
 
-class CommentListCreateView(generics.ListCreateAPIView):
+
+class CommentListCreateView(SparseQuerysetMixin, ConditionalListMixin, generics.ListCreateAPIView):
     """Список и создание комментариев"""
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -23,6 +43,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
     search_fields = ['content']
     ordering_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
+    validator_scopes = COMMENT_VALIDATOR_SCOPES
 
     def get_queryset(self):
         return Comment.objects.filter(is_active=True).select_related(
@@ -35,12 +56,24 @@ class CommentListCreateView(generics.ListCreateAPIView):
         return CommentSerializer
     
 
-class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CommentDetailView(
+    SparseQuerysetMixin, ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView
+):
     """Детальный просмотр, обновление и удаление комментария"""
     queryset = Comment.objects.filter(is_active=True).select_related('author', 'post')
     serializer_class = CommentDetailSerializer
     permission_classes = [IsAuthorOrReadOnly]
 
+    def get_object_validators(self, instance):
+        # Ответ включает ответы на комментарий
+        last_modified, count = aggregate_validators(Comment.objects.filter(
+            Q(pk=instance.pk) | Q(parent_id=instance.pk), is_active=True
+        ))
+        return get_validators(
+            self.request, type(self).__name__, last_modified=last_modified,
+            extra=(instance.pk, count)
+        )
+
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
             return CommentUpdateSerializer
@@ -52,7 +85,7 @@ class CommentDetailView(generics.RetrieveUpdateDestroyAPIView):
         instance.save()
 
 
-class MyCommentsView(generics.ListAPIView):
+class MyCommentsView(SparseQuerysetMixin, generics.ListAPIView):
     """Список комментариев текущего пользователя"""
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -69,6 +102,7 @@ class MyCommentsView(generics.ListAPIView):
     
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional_view(COMMENT_VALIDATOR_SCOPES, queryset=post_comments_queryset)
 def post_comments(request, post_id):
     """Получить комментарий к определенному посту"""
     post = get_object_or_404(Post, id=post_id, status='published')
@@ -90,11 +124,12 @@ def post_comments(request, post_id):
             'slug': post.slug
         },
         'comments': serializer.data,
-        'comments_count': post.comments.filter(is_active=True).count()
+        'comments_count': post.comments_count
     })
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional_view(COMMENT_VALIDATOR_SCOPES, queryset=replies_queryset)
 def comment_replies(request, comment_id):
     """Получить ответы на комментарий"""
     parent_comment = get_object_or_404(Comment, id=comment_id, is_active=True)
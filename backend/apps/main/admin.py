@@ -9,11 +9,11 @@ class CategoryAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('name', 'description')
     prepopulated_fields = {'slug': ('name',)}
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'published_posts_count')
 
     def posts_count(self, obj):
-        return obj.posts.count()
-    posts_count.short_description = 'Posts Count'
+        return obj.published_posts_count
+    posts_count.short_description = 'Published Posts'
 
 
 @admin.register(Post)
@@ -25,7 +25,7 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('status', 'category', 'created_at', 'updated_at')
     search_fields = ('title', 'content', 'author__username')
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ('created_at', 'updated_at', 'views_count')
+    readonly_fields = ('created_at', 'updated_at', 'views_count', 'active_comments_count')
     raw_id_fields = ('author',)
     
     fieldsets = (
@@ -36,14 +36,14 @@ class PostAdmin(admin.ModelAdmin):
             'fields': ('category', 'author', 'status')
         }),
         ('Statistics', {
-            'fields': ('views_count', 'created_at', 'updated_at'),
+            'fields': ('views_count', 'active_comments_count', 'created_at', 'updated_at'),
             'classes': ('collapse',)
         }),
     )
 
     def comments_count(self, obj):
-        return obj.comments.count()
-    comments_count.short_description = 'Comments'
+        return obj.active_comments_count
+    comments_count.short_description = 'Active comments'
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('author', 'category')
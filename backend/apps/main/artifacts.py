@@ -0,0 +1,103 @@
+"""
+Файлы рекомендательных индексов (NumPy .npz) в общем хранилище.
+
+Индексы читают и пишут задачи на разных хостах, поэтому файл лежит в
+хранилище FileField (как офлайн-пакеты категорий), а текущая версия
+задается строкой recommendation_artifacts. Каждая версия сохраняется под
+новым именем; старый файл удаляется после коммита переключения.
+
+Инкрементальные сборки дописывают к версии небольшие файлы-дельты
+(append): их имена хранятся в state['deltas'] и читаются после основного
+файла. Новая полная версия (save) удаляет и старый файл, и его дельты.
+"""
+import io
+import tempfile
+import uuid
+
+import numpy as np
+from django.core.files import File
+from django.db import transaction
+
+from .models import RecommendationArtifact
+
+
+def _storage():
+    return RecommendationArtifact._meta.get_field('file').storage
+
+
+def _write(name, arrays):
+    with tempfile.TemporaryFile() as target:
+        np.savez(target, **arrays)
+        target.seek(0)
+        return _storage().save(
+            f'recommendations/{name}-{uuid.uuid4().hex}.npz', File(target)
+        )
+
+
+def _read(filename):
+    with _storage().open(filename, 'rb') as f:
+        # Хранилище может не поддерживать seek - читаем файл целиком
+        buffer = io.BytesIO(f.read())
+    with np.load(buffer, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def _delete_on_commit(filenames):
+    storage = _storage()
+    filenames = [filename for filename in filenames if filename]
+    if filenames:
+        transaction.on_commit(lambda: [storage.delete(filename) for filename in filenames])
+
+
+def save(name, arrays, built_at, state=None):
+    """Сохраняет {имя: массив} новой версией артефакта name"""
+    filename = _write(name, arrays)
+    with transaction.atomic():
+        artifact = RecommendationArtifact.objects.select_for_update().filter(name=name).first()
+        stale = []
+        if artifact is not None:
+            stale = [artifact.file.name, *artifact.state.get('deltas', [])]
+        artifact, _ = RecommendationArtifact.objects.update_or_create(
+            name=name,
+            defaults={'file': filename, 'built_at': built_at, 'state': state or {}}
+        )
+        _delete_on_commit([old for old in stale if old != filename])
+    return artifact
+
+
+def append(name, arrays, built_at, state=None):
+    """
+    Дописывает {имя: массив} дельтой к текущей версии артефакта name и
+    обновляет state. DoesNotExist - версия еще не собрана.
+    """
+    filename = _write(name, arrays)
+    try:
+        with transaction.atomic():
+            artifact = RecommendationArtifact.objects.select_for_update().get(name=name)
+            artifact.state = {
+                **artifact.state,
+                **(state or {}),
+                'deltas': [*artifact.state.get('deltas', []), filename],
+            }
+            artifact.built_at = built_at
+            artifact.save(update_fields=['state', 'built_at', 'updated_at'])
+    except BaseException:
+        _storage().delete(filename)
+        raise
+    return artifact
+
+
+def load(name):
+    """
+    ({имя: массив}, запись) текущей версии или (None, None), если
+    артефакт еще не собран. Дельты версии - load_deltas(запись).
+    """
+    artifact = RecommendationArtifact.objects.filter(name=name).first()
+    if artifact is None:
+        return None, None
+    return _read(artifact.file.name), artifact
+
+
+def load_deltas(artifact):
+    """[{имя: массив}, ...] дельт версии в порядке записи"""
+    return [_read(filename) for filename in artifact.state.get('deltas', [])]
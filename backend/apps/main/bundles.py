@@ -0,0 +1,298 @@
+"""
+Офлайн-пакеты категорий (/api/v1/posts/categories/<slug>/bundle/).
+
+Пакет - zip-архив со всеми опубликованными постами категории, их
+изображениями в размере card и комментариями верхнего уровня:
+
+    manifest.json     - версия, категория, список постов и изображений
+    posts/<id>.json   - пост с полным текстом и его комментарии
+    images/<имя>      - изображение поста (вариант card или оригинал)
+
+Для каждого поста в манифесте хранится отпечаток: updated_at поста,
+файл изображения, max(updated_at) и число комментариев. При пересборке
+заново сериализуются только посты с изменившимся отпечатком, записи
+остальных копируются из предыдущей версии архива. Если не изменилось
+ничего, новая версия не создается.
+
+Пересборка запускается задачей build_category_bundle через
+BUNDLE_DEBOUNCE секунд после изменений постов, комментариев и категории
+и периодически задачей refresh_category_bundles - она подхватывает
+изменения без сигналов (массовые UPDATE, готовые варианты изображений).
+"""
+import hashlib
+import json
+import os
+import posixpath
+import tempfile
+import zipfile
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.comments.models import Comment
+from apps.comments.serializers import CommentSyncSerializer
+from apps.media.variants import get_variant_storage, is_current
+
+from .models import Category, CategoryBundle, Post
+from .serializers import CategorySerializer, PostBundleSerializer
+
+
+BUNDLE_FORMAT = 1
+BUNDLE_CONTENT_TYPE = 'application/zip'
+MANIFEST_NAME = 'manifest.json'
+IMAGE_VARIANT = 'card'
+# Задержка пересборки после изменения, секунды
+BUNDLE_DEBOUNCE = 60
+BUNDLE_LOCK_TIMEOUT = 30 * 60
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def pending_key(category_id):
+    return f'bundles:pending:{category_id}'
+
+
+def lock_key(category_id):
+    return f'bundles:lock:{category_id}'
+
+
+def _digest(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _dumps(data):
+    return json.dumps(data, cls=JSONEncoder, ensure_ascii=False).encode()
+
+
+def post_image(post):
+    """
+    (хранилище, имя файла) изображения поста для пакета: JPEG варианта
+    card, пока вариантов нет - оригинал; None - у поста нет изображения.
+    """
+    if not post.image:
+        return None
+    variants = post.image_variants or {}
+    if is_current(variants, post.image.name):
+        variant = variants.get('variants', {}).get(IMAGE_VARIANT)
+        if variant:
+            return get_variant_storage(post.image.storage), variant['jpeg']
+    return post.image.storage, post.image.name
+
+
+def image_path(name):
+    """Путь изображения в архиве (одинаковые файлы хранятся один раз)"""
+    extension = os.path.splitext(name)[1].lower()
+    return posixpath.join('images', hashlib.sha1(name.encode()).hexdigest()[:20] + extension)
+
+
+def post_path(post_id):
+    return f'posts/{post_id}.json'
+
+
+def _comment_states(category):
+    """{post_id: (max(updated_at), count)} комментариев верхнего уровня"""
+    rows = Comment.objects.filter(
+        post__category=category, parent__isnull=True, is_active=True
+    ).order_by().values('post_id').annotate(last=Max('updated_at'), count=Count('id'))
+    return {row['post_id']: (row['last'], row['count']) for row in rows}
+
+
+def _manifest_entries(category):
+    """Записи манифеста для текущих опубликованных постов категории"""
+    posts = Post.objects.filter(category=category, status='published').only(
+        'id', 'slug', 'title', 'updated_at', 'image', 'image_variants'
+    ).order_by('-created_at', '-id')
+    comments = _comment_states(category)
+    entries = []
+    images = {}
+    for post in posts:
+        image = post_image(post)
+        path = image_path(image[1]) if image else None
+        if image:
+            images[path] = image
+        last_comment, comments_count = comments.get(post.id, (None, 0))
+        entries.append({
+            'id': post.id,
+            'slug': post.slug,
+            'title': post.title,
+            'updated_at': post.updated_at,
+            'path': post_path(post.id),
+            'image': path,
+            'comments_count': comments_count,
+            'fingerprint': _digest(
+                post.updated_at.isoformat(), image and image[1],
+                last_comment.isoformat() if last_comment else None, comments_count
+            ),
+        })
+    return entries, images
+
+
+def _open_previous(bundle):
+    """Предыдущая версия архива или None, если ее нет или она не читается"""
+    if bundle is None or not bundle.file:
+        return None
+    try:
+        return zipfile.ZipFile(bundle.file.storage.open(bundle.file.name, 'rb'))
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+
+def _post_documents(post_ids, images_by_post):
+    """{post_id: JSON записи поста} для постов, которые нужно сериализовать"""
+    if not post_ids:
+        return {}
+    comments = defaultdict(list)
+    for comment in Comment.objects.filter(
+        post_id__in=post_ids, parent__isnull=True, is_active=True
+    ).select_related('author').order_by('created_at', 'id'):
+        comments[comment.post_id].append(comment)
+
+    documents = {}
+    posts = Post.objects.filter(id__in=post_ids).select_related('author', 'category')
+    for post in posts:
+        documents[post.id] = _dumps({
+            'post': PostBundleSerializer(post).data,
+            'image': images_by_post.get(post.id),
+            'comments': CommentSyncSerializer(comments[post.id], many=True).data,
+        })
+    return documents
+
+
+def _write_archive(target, manifest, entries, images, documents, previous):
+    previous_names = set(previous.namelist()) if previous else set()
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(MANIFEST_NAME, _dumps(manifest))
+        for entry in entries:
+            if entry['id'] in documents:
+                archive.writestr(entry['path'], documents[entry['id']])
+            else:
+                archive.writestr(entry['path'], previous.read(entry['path']))
+        # Изображения уже сжаты - хранятся без повторного сжатия
+        for path, (storage, name) in images.items():
+            if path in previous_names:
+                data = previous.read(path)
+            else:
+                with storage.open(name, 'rb') as source:
+                    data = source.read()
+            archive.writestr(path, data, compress_type=zipfile.ZIP_STORED)
+
+
+def _file_hash(fileobj):
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fileobj.read(HASH_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def build(category_id, force=False):
+    """
+    Собирает новую версию пакета категории, если содержимое изменилось
+    (force - пересобрать все посты). Возвращает сводку сборки.
+    """
+    category = Category.objects.filter(pk=category_id).first()
+    if category is None:
+        return {'category_id': category_id, 'skipped': 'missing'}
+
+    bundle = CategoryBundle.objects.filter(category=category).first()
+    entries, images = _manifest_entries(category)
+    category_fingerprint = _digest(category.name, category.slug, category.description)
+
+    previous_manifest = bundle.manifest if bundle else {}
+    previous = None if force else _open_previous(bundle)
+    if previous is None or previous_manifest.get('format') != BUNDLE_FORMAT:
+        previous_fingerprints = {}
+    else:
+        previous_fingerprints = {
+            entry['id']: entry['fingerprint'] for entry in previous_manifest.get('posts', [])
+        }
+    changed = [
+        entry['id'] for entry in entries
+        if previous_fingerprints.get(entry['id']) != entry['fingerprint']
+    ]
+
+    if (
+        previous is not None
+        and not changed
+        and len(entries) == len(previous_fingerprints)
+        and previous_manifest.get('category_fingerprint') == category_fingerprint
+    ):
+        previous.close()
+        return {'category_id': category.id, 'version': bundle.version, 'unchanged': True}
+
+    version = (bundle.version if bundle else 0) + 1
+    built_at = timezone.now()
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': version,
+        'built_at': built_at,
+        'category': CategorySerializer(category).data,
+        'category_fingerprint': category_fingerprint,
+        'posts': entries,
+        'images': sorted(images),
+    }
+    documents = _post_documents(changed, {entry['id']: entry['image'] for entry in entries})
+
+    try:
+        with tempfile.TemporaryFile() as target:
+            _write_archive(target, manifest, entries, images, documents, previous)
+            sha256, size = _file_hash(target)
+            name = CategoryBundle._meta.get_field('file').storage.save(
+                f'bundles/{category.id}/{category.slug}-v{version}.zip', File(target)
+            )
+    finally:
+        if previous is not None:
+            previous.close()
+
+    # JSON-представление манифеста (даты - строки), как в архиве
+    manifest = json.loads(_dumps(manifest))
+    old_name = bundle.file.name if bundle else None
+    with transaction.atomic():
+        bundle, _ = CategoryBundle.objects.update_or_create(
+            category=category,
+            defaults={
+                'version': version,
+                'file': name,
+                'size': size,
+                'sha256': sha256,
+                'manifest': manifest,
+                'built_at': built_at,
+            }
+        )
+        if old_name and old_name != name:
+            storage = bundle.file.storage
+            transaction.on_commit(lambda: storage.delete(old_name))
+
+    return {
+        'category_id': category.id,
+        'version': version,
+        'posts': len(entries),
+        'rebuilt_posts': len(documents),
+        'bytes': size,
+    }
+
+
+def schedule_rebuild(*category_ids):
+    """
+    Планирует пересборку пакетов категорий через BUNDLE_DEBOUNCE секунд
+    после коммита. Пока пересборка запланирована, новые изменения ее не
+    дублируют.
+    """
+    category_ids = {pk for pk in category_ids if pk is not None}
+    if not category_ids:
+        return
+
+    def enqueue():
+        from .tasks import build_category_bundle
+
+        for category_id in category_ids:
+            if cache.add(pending_key(category_id), 1, BUNDLE_DEBOUNCE * 10):
+                build_category_bundle.apply_async((category_id,), countdown=BUNDLE_DEBOUNCE)
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,262 @@
+"""
+Рекомендации "читатели этого поста также читали".
+
+Взаимодействия - чтения авторизованных пользователей (post_readers) и
+активные комментарии - собираются в разреженную матрицу
+пользователь x пост (NumPy/SciPy). Сходство постов - косинус между
+столбцами матрицы; top-k соседей каждого поста сохраняются в
+post_neighbours (kind='co_engagement').
+
+Полная сборка (rebuild) сохраняет сырые взаимодействия артефактом в
+общем хранилище (apps.main.artifacts) вместе с водяным знаком
+транзакций (apps.main.watermarks). Инкрементальное обновление (refresh)
+дочитывает строки, измененные транзакциями после знака, дописывает их
+дельтой к артефакту и пересчитывает соседей постов, которых они
+коснулись. Каждое взаимодействие помнит свой источник (строку
+post_readers или comments): повторно прочитанная строка заменяет
+прежнюю запись, а снятый с публикации комментарий получает вес 0.
+Удаленные строки учитываются при следующей полной сборке.
+"""
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from apps.comments.models import Comment
+
+from . import artifacts
+from .models import Post, PostNeighbours, PostReader
+from .related import store_neighbours
+from .similarity import l2_normalize, top_k_similar
+from .watermarks import changed_between, snapshot_xmin
+
+
+KIND = PostNeighbours.KIND_CO_ENGAGEMENT
+ARTIFACT_NAME = 'co_engagement'
+ARRAYS = ('user_ids', 'post_ids', 'weights', 'kinds', 'source_ids')
+
+# Источники взаимодействий
+SOURCE_READER = 0
+SOURCE_COMMENT = 1
+
+VIEW_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+FETCH_CHUNK_SIZE = 10000
+# Дельт у артефакта, после которых refresh сохраняет его целиком
+MAX_DELTAS = 96
+ROW_DTYPE = np.dtype((np.int64, 4))
+
+
+class Interactions:
+    """
+    Сырые взаимодействия: параллельные массивы user_ids, post_ids,
+    weights и источник каждого из них (kinds, source_ids)
+    """
+
+    def __init__(self, user_ids, post_ids, weights, kinds=None, source_ids=None):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.post_ids = np.asarray(post_ids, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        # Без источников (синтетические данные) каждое взаимодействие уникально
+        self.kinds = np.asarray(
+            np.zeros(len(self.user_ids)) if kinds is None else kinds, dtype=np.int8
+        )
+        self.source_ids = np.asarray(
+            np.arange(len(self.user_ids)) if source_ids is None else source_ids,
+            dtype=np.int64
+        )
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def extend(self, other):
+        """
+        Взаимодействия self и other; для повторного источника остается
+        запись из other.
+        """
+        merged = Interactions(*(
+            np.concatenate([getattr(self, name), getattr(other, name)]) for name in ARRAYS
+        ))
+        keys = merged.source_ids * 2 + merged.kinds
+        # Последнее вхождение ключа - первое в развернутом массиве
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = np.sort(len(keys) - 1 - last)
+        return Interactions(*(getattr(merged, name)[keep] for name in ARRAYS))
+
+    def to_arrays(self):
+        return {name: getattr(self, name) for name in ARRAYS}
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(*(arrays[name] for name in ARRAYS))
+
+
+def _rows(queryset, user_field, weight):
+    """[[user_id, post_id, вес, id источника], ...] строк queryset"""
+    rows = queryset.values_list(user_field, 'post_id', weight, 'id').iterator(
+        chunk_size=FETCH_CHUNK_SIZE
+    )
+    return np.fromiter(rows, dtype=ROW_DTYPE).reshape(-1, 4)
+
+
+def load_interactions(since=None, until=None):
+    """
+    Взаимодействия с опубликованными постами. С since/until - только
+    строки, измененные транзакциями в [since, until), включая снятые
+    с публикации комментарии (вес 0).
+    """
+    readers = PostReader.objects.filter(post__status='published')
+    comments = Comment.objects.filter(post__status='published')
+    if since is None:
+        comments = comments.filter(is_active=True)
+    else:
+        readers = changed_between(readers, since, until)
+        comments = changed_between(comments, since, until)
+
+    views = _rows(readers, 'user_id', Value(1))
+    commented = _rows(
+        comments, 'author_id', Case(When(is_active=True, then=1), default=0)
+    )
+    return Interactions(
+        np.concatenate([views[:, 0], commented[:, 0]]),
+        np.concatenate([views[:, 1], commented[:, 1]]),
+        np.concatenate([
+            views[:, 2] * VIEW_WEIGHT,
+            commented[:, 2] * COMMENT_WEIGHT,
+        ]),
+        np.concatenate([
+            np.full(len(views), SOURCE_READER), np.full(len(commented), SOURCE_COMMENT)
+        ]),
+        np.concatenate([views[:, 3], commented[:, 3]]),
+    )
+
+
+def load_stored():
+    """(взаимодействия последней сборки с дельтами, запись артефакта) или (None, None)"""
+    arrays, artifact = artifacts.load(ARTIFACT_NAME)
+    if arrays is None:
+        return None, None
+    interactions = Interactions.from_arrays(arrays)
+    for delta in artifacts.load_deltas(artifact):
+        interactions = interactions.extend(Interactions.from_arrays(delta))
+    return interactions, artifact
+
+
+def interaction_matrix(interactions):
+    """
+    CSR-матрица пользователь x пост и массив id постов по столбцам.
+    Повторные взаимодействия суммируются и сглаживаются log1p;
+    взаимодействия с весом 0 (снятые комментарии) пропускаются.
+    """
+    present = interactions.weights > 0
+    _, user_rows = np.unique(interactions.user_ids[present], return_inverse=True)
+    post_ids, post_columns = np.unique(interactions.post_ids[present], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (interactions.weights[present], (user_rows, post_columns)),
+        shape=(user_rows.max() + 1 if len(user_rows) else 0, len(post_ids)),
+        dtype=np.float32
+    )
+    matrix.sum_duplicates()
+    np.log1p(matrix.data, out=matrix.data)
+    return matrix, post_ids
+
+
+def item_neighbours(matrix, post_ids, k, only_post_ids=None):
+    """
+    {post_id: [[post_id, score], ...]} - top-k постов по косинусу
+    столбцов матрицы. only_post_ids ограничивает пересчитываемые посты.
+    """
+    items = l2_normalize(matrix.T.tocsr())
+    rows = None
+    if only_post_ids is not None:
+        rows = np.flatnonzero(np.isin(post_ids, np.asarray(list(only_post_ids), dtype=np.int64)))
+    neighbours, scores = top_k_similar(items, k, rows)
+    rows = np.arange(len(post_ids)) if rows is None else rows
+    return {
+        int(post_ids[row]): [
+            [int(post_ids[neighbour]), round(float(score), 4)]
+            for neighbour, score in zip(row_neighbours, row_scores)
+            if neighbour >= 0
+        ]
+        for row, row_neighbours, row_scores in zip(rows, neighbours, scores)
+    }
+
+
+def _store(lists):
+    existing = set(Post.objects.filter(id__in=list(lists)).values_list('id', flat=True))
+    store_neighbours(
+        {post_id: items for post_id, items in lists.items() if post_id in existing},
+        kind=KIND
+    )
+
+
+def rebuild(k=None):
+    """Полная сборка: все взаимодействия, соседи всех постов"""
+    k = k or settings.RELATED_POSTS_K
+    # Граница берется до чтения: строки, закоммиченные во время чтения,
+    # refresh прочитает еще раз и заменит по источнику
+    until = snapshot_xmin()
+    interactions = load_interactions()
+    matrix, post_ids = interaction_matrix(interactions)
+    lists = item_neighbours(matrix, post_ids, k)
+    with transaction.atomic():
+        _store(lists)
+        PostNeighbours.objects.filter(kind=KIND).exclude(
+            post_id__in=post_ids.tolist()
+        ).delete()
+    artifacts.save(
+        ARTIFACT_NAME, interactions.to_arrays(), timezone.now(), state={'txid': until}
+    )
+    return interactions, len(lists)
+
+
+def refresh(k=None):
+    """
+    Инкрементальное обновление: дочитывает взаимодействия, измененные
+    после последней сборки, и пересчитывает соседей постов, которых они
+    коснулись. Без сохраненной полной сборки выполняет rebuild.
+    """
+    k = k or settings.RELATED_POSTS_K
+    stored, artifact = load_stored()
+    if stored is None or 'txid' not in artifact.state:
+        return rebuild(k)
+
+    until = snapshot_xmin()
+    fresh = load_interactions(since=artifact.state['txid'], until=until)
+    if not len(fresh):
+        return stored, 0
+
+    interactions = stored.extend(fresh)
+    active = set(np.unique(fresh.post_ids).tolist())
+    matrix, post_ids = interaction_matrix(interactions)
+    lists = item_neighbours(matrix, post_ids, k, only_post_ids=active)
+    with transaction.atomic():
+        _store(lists)
+        # У поста не осталось взаимодействий
+        PostNeighbours.objects.filter(
+            kind=KIND, post_id__in=active - set(lists)
+        ).delete()
+
+    state = {'txid': until}
+    if len(artifact.state.get('deltas', [])) >= MAX_DELTAS:
+        artifacts.save(ARTIFACT_NAME, interactions.to_arrays(), timezone.now(), state=state)
+    else:
+        artifacts.append(ARTIFACT_NAME, fresh.to_arrays(), timezone.now(), state=state)
+    return interactions, len(active)
+
+
+def synthetic_interactions(interactions, users, posts, seed=0):
+    """
+    Случайные взаимодействия для бенчмарка: популярность постов
+    распределена по Ципфу, активность пользователей - с умеренным
+    перекосом (квадрат равномерной величины).
+    """
+    rng = np.random.default_rng(seed)
+    post_ids = (rng.zipf(1.3, interactions) - 1) % posts + 1
+    user_ids = (users * rng.random(interactions) ** 2).astype(np.int64) + 1
+    weights = np.where(
+        rng.random(interactions) < 0.1, COMMENT_WEIGHT, VIEW_WEIGHT
+    ).astype(np.float32)
+    return Interactions(user_ids, post_ids, weights)
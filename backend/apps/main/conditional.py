@@ -0,0 +1,238 @@
+"""
+Условные GET-запросы: ETag / Last-Modified и ответ 304.
+
+Валидаторы считаются без сериализации ответа:
+- объект - по его updated_at;
+- список - по агрегату max(updated_at) и count() того же queryset (один
+  запрос; count замечает удаленные и скрытые записи);
+- версии областей кэша ответов (apps.main.response_cache): они меняются и
+  при изменениях, не затрагивающих updated_at, - закрепление, подписки,
+  тренды, число комментариев (SCOPE_COMMENTS). Списки, все изменения
+  которых покрыты областями, проверяются без запроса к БД;
+- версии счетчиков просмотров постов, попавших в ответ: сериализаторы
+  отмечают их в запросе, список постов запоминается по ETag без счетчиков
+  и при следующем запросе проверяется до сериализации. Списки,
+  отсортированные по просмотрам, зависят от общей SCOPE_COUNTERS;
+- параметры запроса и текущий пользователь.
+
+Если If-None-Match / If-Modified-Since совпадает, клиент получает 304, а
+сериализатор не запускается. Last-Modified отдается только ответам без
+областей и счетчиков: их изменения не двигают updated_at, и
+If-Modified-Since вернул бы устаревший 304. Потоковые ответы отдаются
+без валидаторов: тело сериализуется уже после возврата из представления,
+и посты со счетчиками в нем заранее неизвестны. Ответы помечаются
+Cache-Control: private, no-cache - браузер перепроверяет их при каждом
+запросе.
+"""
+import hashlib
+from functools import wraps
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from .response_cache import (
+    get_scope_versions,
+    post_counter_scope,
+    tracked_counter_posts,
+    POST_LIST_SCOPES,
+    TRENDING_LIST_SCOPES,
+    RELATED_LIST_SCOPES,
+    SCOPE_CATEGORIES,
+    SCOPE_COMMENTS,
+    SCOPE_COUNTERS,
+    SCOPE_POSTS,
+)
+
+
+# Ответы с постами: число комментариев меняется без updated_at
+POST_VALIDATOR_SCOPES = POST_LIST_SCOPES + (SCOPE_COMMENTS,)
+TRENDING_VALIDATOR_SCOPES = TRENDING_LIST_SCOPES + (SCOPE_COMMENTS,)
+RELATED_VALIDATOR_SCOPES = RELATED_LIST_SCOPES + (SCOPE_COMMENTS,)
+# published_posts_count категорий меняется при сохранении постов
+CATEGORY_VALIDATOR_SCOPES = (SCOPE_CATEGORIES, SCOPE_POSTS)
+# Число ответов меняется при добавлении ответа в другой список
+COMMENT_VALIDATOR_SCOPES = (SCOPE_COMMENTS,)
+
+# Значения ?ordering= / ?order=, при которых состав списка зависит от просмотров
+COUNTER_ORDERINGS = {'views', 'views_count', 'unique_views', 'unique_views_7d'}
+COUNTER_POSTS_TIMEOUT = 24 * 60 * 60
+
+
+def make_etag(*parts):
+    """Слабый ETag из значений частей"""
+    return 'W/"%s"' % hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def aggregate_validators(queryset, field='updated_at'):
+    """Возвращает (max(field), count) queryset одним запросом"""
+    result = queryset.order_by().aggregate(last_modified=Max(field), count=Count('pk'))
+    return result['last_modified'], result['count']
+
+
+def ordered_by_counters(request):
+    """Отсортирован ли ответ по счетчикам просмотров (?ordering= / ?order=)"""
+    return any(
+        value.strip().lstrip('-') in COUNTER_ORDERINGS
+        for key in ('ordering', 'order')
+        for raw in request.query_params.getlist(key)
+        for value in raw.split(',')
+    )
+
+
+def get_validators(request, name, scopes=(), last_modified=None, extra=()):
+    """
+    Возвращает (etag, last_modified) ответа эндпоинта name без учета
+    счетчиков просмотров (их добавляет conditional_response).
+    extra - дополнительные значения, от которых зависит ответ.
+    last_modified - None, если ответ зависит от областей.
+    """
+    if ordered_by_counters(request):
+        scopes = (*scopes, SCOPE_COUNTERS)
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    user_id = request.user.pk if request.user.is_authenticated else None
+    versions = sorted(get_scope_versions(scopes).items()) if scopes else []
+    etag = make_etag(
+        name, params, user_id, versions,
+        last_modified.isoformat() if last_modified else None, extra
+    )
+    return etag, None if scopes else last_modified
+
+
+def not_modified(request, etag, last_modified=None):
+    """Ответ 304, если условия запроса совпали с валидаторами, иначе None"""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None
+    )
+
+
+def set_validators(response, etag, last_modified=None):
+    """Добавляет ETag / Last-Modified к успешному ответу или 304"""
+    if response.status_code in (200, 304):
+        if etag:
+            response['ETag'] = etag
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def _counter_posts_key(etag):
+    return f'conditional:counter-posts:{hashlib.sha1(etag.encode()).hexdigest()}'
+
+
+def conditional_response(request, etag, last_modified, render):
+    """
+    304 или результат render() с валидаторами. К etag добавляются версии
+    счетчиков постов, попавших в прошлые ответы с тем же etag. Если в
+    ответ попали новые посты, он отдается без ETag: их версии прочитаны
+    уже после сериализации и могли опередить данные ответа.
+    """
+    key = _counter_posts_key(etag)
+    post_ids = set(cache.get(key, ()))
+    if post_ids:
+        last_modified = None
+    versions = get_scope_versions([post_counter_scope(pk) for pk in sorted(post_ids)])
+    full_etag = make_etag(etag, sorted(versions.items()))
+
+    response = not_modified(request, full_etag, last_modified)
+    if response is None:
+        response = render()
+        if response.streaming:
+            # Посты потока станут известны только при чтении тела
+            return set_validators(response, None)
+        rendered = tracked_counter_posts(request)
+        if rendered - post_ids:
+            cache.set(key, sorted(post_ids | rendered), COUNTER_POSTS_TIMEOUT)
+            full_etag = last_modified = None
+    return set_validators(response, full_etag, last_modified)
+
+
+def conditional_view(scopes=(), queryset=None, field='updated_at'):
+    """
+    Декоратор для функций-представлений DRF (ставится под @api_view, над
+    @cache_response, чтобы 304 не читал и кэш).
+    queryset(request, **kwargs) - записи ответа для агрегата
+    max(field) + count; None - только версии областей. Если queryset
+    бросает Http404, представление само вернет ошибку.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            last_modified = count = None
+            if queryset is not None:
+                last_modified, count = aggregate_validators(
+                    queryset(request, *args, **kwargs), field
+                )
+            etag, last_modified = get_validators(
+                request, view_func.__name__, scopes, last_modified,
+                extra=(sorted(kwargs.items()), count)
+            )
+            return conditional_response(
+                request, etag, last_modified,
+                lambda: view_func(request, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
+
+
+class ConditionalListMixin:
+    """
+    Условные запросы для list() generic-представлений. Ставится перед
+    CachedListMixin. validator_field = None - только версии областей.
+    """
+    validator_scopes = ()
+    validator_field = 'updated_at'
+
+    def list(self, request, *args, **kwargs):
+        last_modified = count = None
+        if self.validator_field:
+            last_modified, count = aggregate_validators(
+                self.filter_queryset(self.get_queryset()), self.validator_field
+            )
+        etag, last_modified = get_validators(
+            request, type(self).__name__, self.validator_scopes, last_modified,
+            extra=(sorted(kwargs.items()), count)
+        )
+        return conditional_response(
+            request, etag, last_modified,
+            lambda: super(ConditionalListMixin, self).list(request, *args, **kwargs)
+        )
+
+
+class ConditionalRetrieveMixin:
+    """Условные запросы для retrieve() generic-представлений"""
+    validator_scopes = ()
+    validator_field = 'updated_at'
+
+    def get_object_validators(self, instance):
+        return get_validators(
+            self.request, type(self).__name__, self.validator_scopes,
+            getattr(instance, self.validator_field), extra=(instance.pk,)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(instance)
+        return conditional_response(
+            request, etag, last_modified,
+            lambda: Response(self.get_serializer(instance).data)
+        )
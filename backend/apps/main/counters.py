@@ -0,0 +1,332 @@
+"""
+Буферизованные счетчики просмотров постов.
+
+Просмотры накапливаются в быстром хранилище (Redis, в тестах - память
+процесса) и периодически сбрасываются в posts.views_count задачей
+apps.main.tasks.flush_view_counts.
+
+Уникальные посетители считаются HyperLogLog-скетчами: один скетч на пост
+за все время и по одному на каждый день (хранятся UNIQUE_DAYS_TTL дней).
+Оценки сбрасываются в posts.unique_views / unique_views_7d задачей
+apps.main.tasks.flush_unique_views.
+
+Пары (пост, авторизованный читатель) копятся множеством и сбрасываются
+в post_readers задачей apps.main.tasks.flush_post_readers.
+"""
+import hashlib
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .hll import HyperLogLog
+
+
+UNIQUE_WINDOW_DAYS = 7
+UNIQUE_DAYS_TTL = UNIQUE_WINDOW_DAYS + 1
+
+
+def window_days(today=None, days=UNIQUE_WINDOW_DAYS):
+    """Даты окна уникальных просмотров, начиная с сегодняшней"""
+    today = today or timezone.now().date()
+    return [today - timedelta(days=offset) for offset in range(days)]
+
+
+class BaseViewCounter:
+    """Базовый интерфейс буфера просмотров"""
+
+    def incr(self, post_id, amount=1):
+        """Добавляет просмотры к посту, возвращает накопленную дельту"""
+        raise NotImplementedError
+
+    def pending(self, post_ids):
+        """Возвращает {post_id: дельта} для еще не сброшенных просмотров"""
+        raise NotImplementedError
+
+    def drain(self):
+        """Атомарно забирает все накопленные дельты и очищает буфер"""
+        raise NotImplementedError
+
+    def restore(self, deltas):
+        """Возвращает дельты в буфер (если сброс в БД не удался)"""
+        for post_id, delta in deltas.items():
+            if delta:
+                self.incr(post_id, delta)
+
+    def add_visitor(self, post_id, visitor, day=None):
+        """Добавляет посетителя в дневной и общий скетчи поста"""
+        raise NotImplementedError
+
+    def drain_dirty_visitors(self):
+        """Забирает id постов, у которых менялись скетчи"""
+        raise NotImplementedError
+
+    def mark_dirty_visitors(self, post_ids):
+        """Возвращает посты в набор измененных (если сброс в БД не удался)"""
+        raise NotImplementedError
+
+    def unique_counts(self, post_id, today=None):
+        """Возвращает (уникальных за все время, уникальных за 7 дней)"""
+        raise NotImplementedError
+
+    def unique_counts_many(self, post_ids, today=None):
+        """Возвращает {post_id: (уникальных за все время, за 7 дней)}"""
+        return {post_id: self.unique_counts(post_id, today) for post_id in post_ids}
+
+    def add_reader(self, post_id, user_id):
+        """Запоминает, что пользователь читал пост"""
+        raise NotImplementedError
+
+    def drain_readers(self):
+        """Забирает накопленные пары (post_id, user_id)"""
+        raise NotImplementedError
+
+    def restore_readers(self, readers):
+        """Возвращает пары (post_id, user_id) в буфер (если сброс в БД не удался)"""
+        for post_id, user_id in readers:
+            self.add_reader(post_id, user_id)
+
+
+class LocMemViewCounter(BaseViewCounter):
+    """Счетчик в памяти процесса - для тестов и локальной разработки"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._deltas = {}
+        self._sketches = {}
+        self._dirty = set()
+        self._readers = set()
+
+    def incr(self, post_id, amount=1):
+        with self._lock:
+            self._deltas[post_id] = self._deltas.get(post_id, 0) + amount
+            return self._deltas[post_id]
+
+    def pending(self, post_ids):
+        with self._lock:
+            return {
+                post_id: self._deltas[post_id]
+                for post_id in post_ids if post_id in self._deltas
+            }
+
+    def drain(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+        return deltas
+
+    def add_visitor(self, post_id, visitor, day=None):
+        day = day or timezone.now().date()
+        with self._lock:
+            changed = False
+            for key in ((post_id, None), (post_id, day)):
+                sketch = self._sketches.setdefault(key, HyperLogLog())
+                changed = sketch.add(visitor) or changed
+            if changed:
+                self._dirty.add(post_id)
+
+    def drain_dirty_visitors(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+        return dirty
+
+    def mark_dirty_visitors(self, post_ids):
+        with self._lock:
+            self._dirty.update(post_ids)
+
+    def unique_counts(self, post_id, today=None):
+        with self._lock:
+            total = self._sketches.get((post_id, None))
+            daily = [
+                self._sketches[(post_id, day)]
+                for day in window_days(today) if (post_id, day) in self._sketches
+            ]
+            return (
+                total.count() if total else 0,
+                HyperLogLog.union(daily).count() if daily else 0
+            )
+
+    def add_reader(self, post_id, user_id):
+        with self._lock:
+            self._readers.add((post_id, user_id))
+
+    def drain_readers(self):
+        with self._lock:
+            readers, self._readers = self._readers, set()
+        return readers
+
+
+class RedisViewCounter(BaseViewCounter):
+    """Счетчик на Redis: один HASH post_id -> дельта"""
+    key = 'post_views:pending'
+    dirty_key = 'post_uv:dirty'
+    readers_key = 'post_readers:pending'
+    pipeline_batch_size = 500
+
+    def __init__(self, url=None):
+        import redis
+
+        self.client = redis.Redis.from_url(url or settings.VIEW_COUNTER_REDIS_URL)
+
+    def incr(self, post_id, amount=1):
+        return self.client.hincrby(self.key, post_id, amount)
+
+    def pending(self, post_ids):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return {}
+        values = self.client.hmget(self.key, post_ids)
+        return {
+            post_id: int(value)
+            for post_id, value in zip(post_ids, values) if value is not None
+        }
+
+    def drain(self):
+        # HGETALL и DEL в одной транзакции MULTI/EXEC за один запрос:
+        # новые просмотры попадут уже в новый HASH, а промежуточного ключа,
+        # который мог бы остаться после падения воркера, нет
+        pipe = self.client.pipeline()
+        pipe.hgetall(self.key)
+        pipe.delete(self.key)
+        data, _ = pipe.execute()
+        return {int(post_id): int(delta) for post_id, delta in data.items()}
+
+    def restore(self, deltas):
+        pipe = self.client.pipeline()
+        for post_id, delta in deltas.items():
+            if delta:
+                pipe.hincrby(self.key, post_id, delta)
+        pipe.execute()
+
+    @staticmethod
+    def _sketch_key(post_id, day=None):
+        suffix = day.strftime('%Y%m%d') if day else 'all'
+        return f'post_uv:{post_id}:{suffix}'
+
+    def add_visitor(self, post_id, visitor, day=None):
+        day = day or timezone.now().date()
+        daily_key = self._sketch_key(post_id, day)
+        pipe = self.client.pipeline()
+        pipe.pfadd(self._sketch_key(post_id), visitor)
+        pipe.pfadd(daily_key, visitor)
+        pipe.expire(daily_key, timedelta(days=UNIQUE_DAYS_TTL))
+        total_changed, daily_changed, _ = pipe.execute()
+        if total_changed or daily_changed:
+            self.client.sadd(self.dirty_key, post_id)
+
+    def drain_dirty_visitors(self):
+        pipe = self.client.pipeline()
+        pipe.smembers(self.dirty_key)
+        pipe.delete(self.dirty_key)
+        members, _ = pipe.execute()
+        return {int(post_id) for post_id in members}
+
+    def mark_dirty_visitors(self, post_ids):
+        post_ids = list(post_ids)
+        if post_ids:
+            self.client.sadd(self.dirty_key, *post_ids)
+
+    def unique_counts(self, post_id, today=None):
+        pipe = self.client.pipeline()
+        pipe.pfcount(self._sketch_key(post_id))
+        # PFCOUNT по нескольким ключам считает объединение скетчей
+        pipe.pfcount(*[self._sketch_key(post_id, day) for day in window_days(today)])
+        total, last_week = pipe.execute()
+        return total, last_week
+
+    def unique_counts_many(self, post_ids, today=None):
+        # Все PFCOUNT пачки постов - одним запросом
+        post_ids = list(post_ids)
+        days = window_days(today)
+        counts = {}
+        for start in range(0, len(post_ids), self.pipeline_batch_size):
+            batch = post_ids[start:start + self.pipeline_batch_size]
+            pipe = self.client.pipeline(transaction=False)
+            for post_id in batch:
+                pipe.pfcount(self._sketch_key(post_id))
+                pipe.pfcount(*[self._sketch_key(post_id, day) for day in days])
+            values = pipe.execute()
+            for index, post_id in enumerate(batch):
+                counts[post_id] = (values[2 * index], values[2 * index + 1])
+        return counts
+
+    def add_reader(self, post_id, user_id):
+        self.client.sadd(self.readers_key, f'{post_id}:{user_id}')
+
+    def drain_readers(self):
+        pipe = self.client.pipeline()
+        pipe.smembers(self.readers_key)
+        pipe.delete(self.readers_key)
+        members, _ = pipe.execute()
+        return {
+            tuple(int(part) for part in member.split(b':'))
+            for member in members
+        }
+
+    def restore_readers(self, readers):
+        readers = [f'{post_id}:{user_id}' for post_id, user_id in readers]
+        if readers:
+            self.client.sadd(self.readers_key, *readers)
+
+
+_counter = None
+_counter_lock = threading.Lock()
+
+
+def get_view_counter():
+    """Возвращает экземпляр счетчика из настройки VIEW_COUNTER_BACKEND"""
+    global _counter
+    if _counter is None:
+        with _counter_lock:
+            if _counter is None:
+                _counter = import_string(settings.VIEW_COUNTER_BACKEND)()
+    return _counter
+
+
+def get_client_ip(request):
+    """
+    IP клиента с учетом обратных прокси: каждый из TRUSTED_PROXY_COUNT
+    доверенных прокси дописывает адрес в конец X-Forwarded-For, поэтому
+    клиент - N-й адрес с конца. Более левые адреса задает сам клиент, им
+    верить нельзя. Без доверенных прокси (по умолчанию) заголовок
+    игнорируется - его целиком задает клиент.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    forwarded = [
+        address.strip()
+        for address in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',')
+        if address.strip()
+    ]
+    if proxies and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def get_visitor_key(request):
+    """
+    Ключ посетителя для уникальных просмотров: id пользователя или
+    хэш IP + User-Agent для анонимных клиентов.
+    """
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'u:{user.pk}'
+    fingerprint = '|'.join([
+        get_client_ip(request),
+        request.META.get('HTTP_USER_AGENT', ''),
+    ])
+    return 'a:' + hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+
+
+def apply_pending_views(posts):
+    """Добавляет несброшенные просмотры к views_count загруженных постов"""
+    posts = [
+        post for post in posts
+        if post.pk is not None and 'views_count' not in post.get_deferred_fields()
+    ]
+    if not posts:
+        return posts
+    deltas = get_view_counter().pending(post.pk for post in posts)
+    for post in posts:
+        post.views_count += deltas.get(post.pk, 0)
+    return posts
@@ -0,0 +1,197 @@
+"""
+Фасеты списка постов: ?facets=category,author,month.
+
+Все запрошенные фасеты считаются одним запросом поверх того же
+отфильтрованного queryset, что и страница результатов (фильтры, поиск,
+права доступа):
+
+    SELECT GROUPING(...), ..., COUNT(*) FROM (<отфильтрованные посты>)
+    GROUP BY GROUPING SETS ((категория), (автор), (месяц))
+
+- один проход по строкам вместо COUNT на каждое значение фасета.
+Подписи значений (название категории, имя автора) читаются тем же
+запросом.
+
+Результат кэшируется по нормализованному ключу фильтра: параметры, не
+влияющие на состав выборки (страница, сортировка, поля), в ключ не
+входят, поэтому все страницы и сортировки одного фильтра читают одну
+запись. Ключ включает версии областей постов и категорий - любое
+изменение поста делает старые записи недоступными.
+"""
+import hashlib
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F
+from django.db.models.functions import TruncMonth
+from rest_framework import status
+from rest_framework.response import Response
+
+from .response_cache import get_scope_versions, SCOPE_CATEGORIES, SCOPE_POSTS
+
+
+FACETS_PARAM = 'facets'
+FACET_SCOPES = (SCOPE_POSTS, SCOPE_CATEGORIES)
+FACET_CACHE_TIMEOUT = 10 * 60
+# Значений категорий и авторов в ответе (по убыванию числа постов)
+FACET_LIMIT = 50
+
+# Параметры, которые не меняют состав выборки
+IGNORED_PARAMS = {
+    FACETS_PARAM, 'page', 'page_size', 'cursor', 'pagination', 'ordering',
+    'fields', 'exclude', 'stream',
+}
+
+
+@dataclass(frozen=True)
+class Facet:
+    name: str
+    # (псевдоним колонки, выражение); первая колонка - значение группировки
+    columns: tuple
+    labels: tuple
+    # Сортировка значений: по числу постов или по значению (месяцы)
+    by_count: bool = True
+
+    @property
+    def aliases(self):
+        return [alias for alias, _ in self.columns]
+
+    def value(self, values, count):
+        return {**dict(zip(self.labels, values)), 'count': count}
+
+
+FACETS = {
+    'category': Facet(
+        'category',
+        (
+            ('facet_category_id', F('category_id')),
+            ('facet_category_name', F('category__name')),
+            ('facet_category_slug', F('category__slug')),
+        ),
+        ('id', 'name', 'slug'),
+    ),
+    'author': Facet(
+        'author',
+        (
+            ('facet_author_id', F('author_id')),
+            ('facet_author_username', F('author__username')),
+        ),
+        ('id', 'username'),
+    ),
+    'month': Facet(
+        'month',
+        (('facet_month', TruncMonth('created_at')),),
+        ('month',),
+        by_count=False,
+    ),
+}
+
+
+def parse_facets(request):
+    """
+    Имена запрошенных фасетов в порядке FACETS; [] - фасеты не запрошены.
+    ValueError - неизвестный фасет.
+    """
+    requested = {
+        name.strip()
+        for raw in request.query_params.getlist(FACETS_PARAM)
+        for name in raw.split(',') if name.strip()
+    }
+    unknown = requested - set(FACETS)
+    if unknown:
+        raise ValueError(
+            f'Unknown facets: {", ".join(sorted(unknown))}. '
+            f'Available: {", ".join(FACETS)}'
+        )
+    return [name for name in FACETS if name in requested]
+
+
+def cache_key(request, names):
+    """Ключ фасетов: параметры фильтра, пользователь и версии областей"""
+    params = sorted(
+        (key, value)
+        for key in request.query_params if key not in IGNORED_PARAMS
+        for value in request.query_params.getlist(key) if value != ''
+    )
+    # Авторизованные пользователи видят свои черновики
+    user_id = request.user.pk if request.user.is_authenticated else None
+    versions = sorted(get_scope_versions(FACET_SCOPES).items())
+    raw = repr((names, params, user_id, versions))
+    return f'facets:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def compute(queryset, names):
+    """{фасет: [значения с count]} для queryset одним запросом GROUPING SETS"""
+    facets = [FACETS[name] for name in names]
+    inner = queryset.order_by().values(**{
+        alias: expression for facet in facets for alias, expression in facet.columns
+    })
+    sql, params = inner.query.sql_with_params()
+    connection = connections[queryset.db]
+    quote = connection.ops.quote_name
+
+    groupings = ', '.join(f'GROUPING({quote(facet.aliases[0])})' for facet in facets)
+    columns = ', '.join(quote(alias) for facet in facets for alias in facet.aliases)
+    sets = ', '.join(
+        '(%s)' % ', '.join(quote(alias) for alias in facet.aliases) for facet in facets
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT {groupings}, {columns}, COUNT(*) FROM ({sql}) AS filtered '
+            f'GROUP BY GROUPING SETS ({sets})',
+            params
+        )
+        rows = cursor.fetchall()
+
+    result = {facet.name: [] for facet in facets}
+    for row in rows:
+        flags, count = row[:len(facets)], row[-1]
+        offset = len(facets)
+        for facet, grouped_out in zip(facets, flags):
+            width = len(facet.columns)
+            if not grouped_out:
+                result[facet.name].append(facet.value(row[offset:offset + width], count))
+            offset += width
+
+    for facet in facets:
+        values = result[facet.name]
+        if facet.by_count:
+            values.sort(key=lambda value: (-value['count'], str(value[facet.labels[1]])))
+            del values[FACET_LIMIT:]
+        else:
+            values.sort(key=lambda value: value[facet.labels[0]], reverse=True)
+            for value in values:
+                value[facet.labels[0]] = value[facet.labels[0]].strftime('%Y-%m')
+    return result
+
+
+def get_facets(request, queryset, names):
+    """Фасеты из кэша или compute()"""
+    key = cache_key(request, names)
+    result = cache.get(key)
+    if result is None:
+        result = compute(queryset, names)
+        cache.set(key, result, FACET_CACHE_TIMEOUT)
+    return result
+
+
+class FacetedListMixin:
+    """
+    ?facets= для list() generic-представлений: facets рядом с
+    результатами страницы. Ставится после CachedListMixin - при попадании
+    в кэш ответа фасеты уже лежат в нем.
+    """
+
+    def list(self, request, *args, **kwargs):
+        try:
+            names = parse_facets(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = super().list(request, *args, **kwargs)
+        if names and response.status_code == 200:
+            response.data['facets'] = get_facets(
+                request, self.filter_queryset(self.get_queryset()), names
+            )
+        return response
@@ -0,0 +1,202 @@
+"""
+Поиск постов рядом с точкой без PostGIS.
+
+Координаты поста кодируются в ячейку Z-order (как geohash, но целым
+числом): широта и долгота квантуются до CELL_BITS бит, биты
+перемежаются, начиная с долготы. Ячейка уровня L - общий префикс из L
+бит каждой координаты, все точки внутри нее образуют непрерывный
+диапазон posts.geo_cell, поэтому предварительный отбор - несколько
+диапазонных условий по B-tree индексу.
+
+Запрос рядом с точкой берет уровень, на котором ячейка не меньше радиуса
+по обеим осям; круг поиска целиком покрывается ячейкой точки и восемью
+соседними. Кандидаты (id, широта, долгота) читаются из покрывающего
+индекса, точное расстояние (гаверсинус) и ранжирование считаются NumPy
+для всего набора сразу.
+"""
+import math
+
+import numpy as np
+from django.db.models import Q
+
+
+CELL_BITS = 26
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 200.0
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_SPREAD_MASKS = (
+    (16, 0x0000FFFF0000FFFF),
+    (8, 0x00FF00FF00FF00FF),
+    (4, 0x0F0F0F0F0F0F0F0F),
+    (2, 0x3333333333333333),
+    (1, 0x5555555555555555),
+)
+
+
+def _spread(values):
+    """Вставляет нулевой бит перед каждым битом (32 -> 64 бит)"""
+    values = np.asarray(values, dtype=np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in _SPREAD_MASKS:
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+
+def _interleave(x, y):
+    return (_spread(x) << np.uint64(1)) | _spread(y)
+
+
+def grid(lats, lngs, bits=CELL_BITS):
+    """Целочисленные координаты (x - долгота, y - широта) на сетке 2^bits"""
+    scale = 1 << bits
+    x = ((np.asarray(lngs, dtype=np.float64) + 180.0) / 360.0 * scale).astype(np.int64)
+    y = ((np.asarray(lats, dtype=np.float64) + 90.0) / 180.0 * scale).astype(np.int64)
+    return np.clip(x, 0, scale - 1), np.clip(y, 0, scale - 1)
+
+
+def cell_ids(lats, lngs):
+    """Ячейки Z-order для массивов координат"""
+    return _interleave(*grid(lats, lngs)).astype(np.int64)
+
+
+def cell_id(lat, lng):
+    """Ячейка Z-order точки (значение posts.geo_cell)"""
+    return int(cell_ids([lat], [lng])[0])
+
+
+def covering_level(lat, radius_km):
+    """
+    Наибольший уровень, на котором ячейка не меньше radius_km по обеим
+    осям. Ширина ячейки берется на самой дальней от экватора широте круга;
+    0 - круг задевает полюс, подходит только весь мир.
+    """
+    reach = min(90.0, abs(lat) + radius_km / KM_PER_DEGREE)
+    cos_reach = math.cos(math.radians(reach))
+    for level in range(CELL_BITS, 0, -1):
+        height = 180.0 / (1 << level) * KM_PER_DEGREE
+        width = 360.0 / (1 << level) * KM_PER_DEGREE * cos_reach
+        if height >= radius_km and width >= radius_km:
+            return level
+    return 0
+
+
+def covering_ranges(lat, lng, radius_km):
+    """
+    Диапазоны [low, high) geo_cell, покрывающие круг: ячейка точки и
+    соседние на уровне covering_level, смежные диапазоны объединены.
+    """
+    level = covering_level(lat, radius_km)
+    shift = CELL_BITS - level
+    span = 1 << (2 * shift)
+    if level == 0:
+        return [(0, span)]
+
+    size = 1 << level
+    x, y = (int(value[0]) >> shift for value in grid([lat], [lng]))
+    cells = {
+        int(_interleave((x + dx) % size, y + dy))
+        for dx in (-1, 0, 1)
+        for dy in (-1, 0, 1)
+        if 0 <= y + dy < size
+    }
+    return _merge_ranges(cells, span)
+
+
+def bbox_ranges(min_lat, min_lng, max_lat, max_lng):
+    """
+    Диапазоны [low, high) geo_cell, покрывающие прямоугольник (без
+    перехода через 180-й меридиан): ячейки уровня, на котором ячейка не
+    меньше прямоугольника, - не больше четырех.
+    """
+    level = CELL_BITS
+    while level > 0 and (
+        360.0 / (1 << level) < max_lng - min_lng or 180.0 / (1 << level) < max_lat - min_lat
+    ):
+        level -= 1
+    shift = CELL_BITS - level
+    xs, ys = (values >> shift for values in grid([min_lat, max_lat], [min_lng, max_lng]))
+    cells = {
+        int(_interleave(x, y))
+        for x in range(int(xs[0]), int(xs[1]) + 1)
+        for y in range(int(ys[0]), int(ys[1]) + 1)
+    }
+    return _merge_ranges(cells, 1 << (2 * shift))
+
+
+def _merge_ranges(cells, span):
+    """Диапазоны значений ячеек размера span, смежные объединены"""
+    ranges = []
+    for cell in sorted(cells):
+        low = cell * span
+        if ranges and ranges[-1][1] == low:
+            ranges[-1][1] = low + span
+        else:
+            ranges.append([low, low + span])
+    return [tuple(bounds) for bounds in ranges]
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Расстояния по дуге большого круга от точки до массива точек, км"""
+    lat1 = math.radians(lat)
+    lats = np.radians(lats)
+    dlat = lats - lat1
+    dlng = np.radians(np.asarray(lngs, dtype=np.float64) - lng)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lats) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def rank(ids, lats, lngs, lat, lng, radius_km, limit):
+    """[(id, расстояние)] не дальше radius_km, ближайшие limit по возрастанию"""
+    distances = haversine_km(lat, lng, lats, lngs)
+    inside = np.flatnonzero(distances <= radius_km)
+    if len(inside) > limit:
+        inside = inside[np.argpartition(distances[inside], limit - 1)[:limit]]
+    order = inside[np.argsort(distances[inside], kind='stable')]
+    return list(zip(np.asarray(ids)[order].tolist(), distances[order].tolist()))
+
+
+def nearby(queryset, lat, lng, radius_km=DEFAULT_RADIUS_KM, limit=DEFAULT_LIMIT):
+    """
+    [(id, расстояние, км)] записей queryset (с колонками latitude,
+    longitude, geo_cell) не дальше radius_km от точки, по возрастанию
+    расстояния.
+    """
+    condition = Q()
+    for low, high in covering_ranges(lat, lng, radius_km):
+        condition |= Q(geo_cell__gte=low, geo_cell__lt=high)
+    rows = list(
+        queryset.filter(condition).order_by().values_list('id', 'latitude', 'longitude')
+    )
+    if not rows:
+        return []
+    ids, lats, lngs = (np.array(column) for column in zip(*rows))
+    return rank(ids, lats, lngs, lat, lng, radius_km, limit)
+
+
+def synthetic_points(count, seed=0):
+    """
+    Случайные точки для бенчмарка: 80% сгруппированы вокруг тысячи
+    "городов" (разброс ~20 км), остальные распределены по суше условно
+    равномерно.
+    """
+    rng = np.random.default_rng(seed)
+    cities = np.column_stack([
+        np.degrees(np.arcsin(rng.uniform(-0.85, 0.95, 1000))),
+        rng.uniform(-180.0, 180.0, 1000),
+    ])
+    clustered = int(count * 0.8)
+    centers = cities[rng.integers(0, len(cities), clustered)]
+    lats = np.concatenate([
+        centers[:, 0] + rng.normal(0.0, 0.2, clustered),
+        np.degrees(np.arcsin(rng.uniform(-0.85, 0.95, count - clustered))),
+    ])
+    lngs = np.concatenate([
+        centers[:, 1] + rng.normal(0.0, 0.2, clustered),
+        rng.uniform(-180.0, 180.0, count - clustered),
+    ])
+    lngs = (lngs + 180.0) % 360.0 - 180.0
+    return np.clip(lats, -90.0, 90.0), lngs
@@ -0,0 +1,60 @@
+"""
+Минимальная реализация HyperLogLog для оценки числа уникальных посетителей.
+
+Используется бэкендом LocMemViewCounter; в Redis те же скетчи хранятся
+нативно (PFADD/PFCOUNT/PFMERGE). Размер скетча фиксирован - 2**precision
+байт - и не зависит от трафика поста.
+"""
+import hashlib
+import math
+
+
+class HyperLogLog:
+    """Скетч HyperLogLog с 2**precision регистрами"""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    @staticmethod
+    def _hash(value):
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def add(self, value):
+        """Добавляет значение, возвращает True если скетч изменился"""
+        x = self._hash(value)
+        index = x >> (64 - self.precision)
+        rest = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+            return True
+        return False
+
+    def merge(self, other):
+        """Объединяет скетч с другим (in-place)"""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches with different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        """Оценка числа уникальных значений"""
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Коррекция для малых значений (linear counting)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    @classmethod
+    def union(cls, sketches, precision=14):
+        """Новый скетч - объединение переданных"""
+        result = cls(precision)
+        for sketch in sketches:
+            result.merge(sketch)
+        return result
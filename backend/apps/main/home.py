@@ -0,0 +1,156 @@
+"""
+Снимок главной страницы (/api/v1/home/).
+
+Главная собирала ответ из featured_posts, recent_posts, popular_posts,
+pinned_posts_list и списка категорий. Задача rebuild_home_snapshot
+заранее собирает все разделы в один JSON, сжимает его gzip и кладет в
+кэш вместе с ETag и временем сборки - представление отдает готовые байты
+без запросов к БД.
+
+Снимок пересобирается по расписанию и после изменений постов, закреплений,
+категорий и подписок - с задержкой HOME_DEBOUNCE, чтобы серия изменений
+вызвала одну пересборку.
+
+Снимок собирается вне запроса, поэтому сериализаторы получают
+синтетический запрос к SITE_URL - URL изображений в нем абсолютные, как
+и в ответах обычных представлений.
+"""
+import gzip
+import hashlib
+import json
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpRequest
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Category, Post
+from .serializers import CategorySerializer, PostListSerializer
+from .trending import trending_posts
+
+
+SNAPSHOT_KEY = 'home:snapshot'
+PENDING_KEY = 'home:rebuild-pending'
+# Задержка пересборки после изменения, секунды
+HOME_DEBOUNCE = 30
+
+FEATURED_PINNED = 3
+FEATURED_POPULAR = 6
+LIST_SIZE = 10
+
+
+class SnapshotRequest(HttpRequest):
+    """
+    Анонимный GET к SITE_URL: схема и хост для абсолютных URL. Хост
+    задан настройкой, а не клиентом, поэтому ALLOWED_HOSTS не проверяется.
+    """
+
+    def __init__(self, base_url):
+        super().__init__()
+        url = urlsplit(base_url)
+        self.method = 'GET'
+        self.path = self.path_info = '/'
+        self.META = {
+            'HTTP_HOST': url.netloc,
+            'SERVER_NAME': url.hostname,
+            'SERVER_PORT': str(url.port or ''),
+        }
+        self._scheme = url.scheme
+
+    def _get_scheme(self):
+        return self._scheme
+
+    def get_host(self):
+        return self.META['HTTP_HOST']
+
+
+def accepts_gzip(header):
+    """
+    Принимает ли клиент gzip по заголовку Accept-Encoding. Кодировка с
+    q=0 запрещена; если gzip не указан явно, решает "*".
+    """
+    qualities = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+    return quality > 0
+
+
+def build_payload():
+    """Разделы главной страницы (все списки постов - PostListSerializer)"""
+    context = {'request': Request(SnapshotRequest(settings.SITE_URL))}
+    posts = Post.objects.with_subscription_info().defer('content')
+    pinned = list(Post.objects.pinned_posts())
+    pinned_ids = [post.id for post in pinned]
+    featured_pinned = pinned[:FEATURED_PINNED]
+
+    def serialize(items):
+        return PostListSerializer(items, many=True, context=context).data
+
+    return {
+        'built_at': timezone.now(),
+        'featured': {
+            'pinned_posts': serialize(featured_pinned),
+            'popular_posts': serialize(trending_posts(
+                posts, FEATURED_POPULAR, exclude_ids=pinned_ids, fallback_order='-created_at'
+            )),
+            'total_pinned': len(pinned),
+        },
+        'pinned_posts': serialize(pinned),
+        'recent_posts': serialize(
+            posts.filter(status='published').order_by('-created_at')[:LIST_SIZE]
+        ),
+        'popular_posts': serialize(trending_posts(posts, LIST_SIZE)),
+        'categories': CategorySerializer(Category.objects.all(), many=True, context=context).data,
+    }
+
+
+def build_snapshot():
+    """Собирает снимок и сохраняет его в кэш без срока жизни"""
+    payload = build_payload()
+    body = json.dumps(payload, cls=JSONEncoder, ensure_ascii=False).encode()
+    snapshot = {
+        'built_at': payload['built_at'],
+        'etag': '"%s"' % hashlib.sha1(body).hexdigest(),
+        'body': body,
+        'gzip': gzip.compress(body, compresslevel=6),
+    }
+    cache.set(SNAPSHOT_KEY, snapshot, None)
+    return snapshot
+
+
+def get_snapshot():
+    """Готовый снимок; если его нет в кэше - собирает сразу"""
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        snapshot = build_snapshot()
+    return snapshot
+
+
+def schedule_rebuild():
+    """
+    Планирует пересборку через HOME_DEBOUNCE секунд после коммита.
+    Пока пересборка запланирована, новые изменения ее не дублируют.
+    """
+    def enqueue():
+        if cache.add(PENDING_KEY, 1, HOME_DEBOUNCE * 10):
+            from .tasks import rebuild_home_snapshot
+
+            rebuild_home_snapshot.apply_async(countdown=HOME_DEBOUNCE)
+
+    transaction.on_commit(enqueue)
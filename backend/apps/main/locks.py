@@ -0,0 +1,22 @@
+"""
+Блокировки задач в общем кэше с токеном владельца.
+
+cache.add ставит ключ, только если его нет; значение - случайный токен.
+Снимает блокировку только ее владелец: если она истекла по таймауту и ее
+уже взял другой воркер, release ключ не трогает.
+"""
+import uuid
+
+from django.core.cache import cache
+
+
+def acquire(key, timeout):
+    """Токен блокировки или None, если она занята"""
+    token = uuid.uuid4().hex
+    return token if cache.add(key, token, timeout) else None
+
+
+def release(key, token):
+    """Снимает блокировку, если она все еще принадлежит token"""
+    if token is not None and cache.get(key) == token:
+        cache.delete(key)
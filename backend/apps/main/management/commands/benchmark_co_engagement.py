@@ -0,0 +1,56 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+from apps.main import co_engagement
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the co-engagement build on synthetic interactions (no database access)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interactions', type=int, default=10_000_000)
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--posts', type=int, default=50_000)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument(
+            '--active-posts',
+            type=int,
+            default=1000,
+            help='Posts recomputed by the incremental refresh step'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _timed(self, label, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write(f'{label}: {time.perf_counter() - started:.2f}s')
+        return result
+
+    def handle(self, *args, **options):
+        interactions = self._timed(
+            'Generate interactions',
+            co_engagement.synthetic_interactions,
+            options['interactions'], options['users'], options['posts'], options['seed']
+        )
+        matrix, post_ids = self._timed(
+            'Build user x post matrix', co_engagement.interaction_matrix, interactions
+        )
+        self.stdout.write(
+            f'Matrix: {matrix.shape[0]} users x {matrix.shape[1]} posts, '
+            f'{matrix.nnz} non-zero'
+        )
+
+        active = post_ids[:options['active_posts']].tolist()
+        self._timed(
+            f'Incremental refresh ({len(active)} posts)',
+            co_engagement.item_neighbours, matrix, post_ids, options['k'], only_post_ids=active
+        )
+        lists = self._timed(
+            'Full item-item top-k', co_engagement.item_neighbours, matrix, post_ids, options['k']
+        )
+
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed neighbours for {len(lists)} posts, peak RSS {peak_mb:.0f} MB'
+        ))
@@ -0,0 +1,111 @@
+import resource
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from apps.main import geo
+from apps.main.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark "posts near me" queries: cell-range prefilter plus NumPy haversine '
+        'on synthetic points (no database access) or on geotagged posts (--database)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--points', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--radius', type=float, default=geo.DEFAULT_RADIUS_KM)
+        parser.add_argument('--limit', type=int, default=geo.DEFAULT_LIMIT)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--database',
+            action='store_true',
+            help='Query published geotagged posts instead of synthetic points'
+        )
+
+    def _timed(self, label, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        self.stdout.write(f'{label}: {time.perf_counter() - started:.2f}s')
+        return result
+
+    def _report(self, timings, candidates):
+        timings = np.array(timings) * 1000
+        self.stdout.write(
+            f'{len(timings)} queries, radius {self.radius} km: '
+            f'mean {timings.mean():.2f} ms, p50 {np.percentile(timings, 50):.2f} ms, '
+            f'p95 {np.percentile(timings, 95):.2f} ms, p99 {np.percentile(timings, 99):.2f} ms'
+        )
+        if candidates:
+            self.stdout.write(f'Candidates per query: mean {np.mean(candidates):.0f}, max {max(candidates)}')
+
+    def handle(self, *args, **options):
+        self.radius = options['radius']
+        if options['database']:
+            self._database(options)
+        else:
+            self._synthetic(options)
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(f'Done, peak RSS {peak_mb:.0f} MB'))
+
+    def _synthetic(self, options):
+        lats, lngs = self._timed(
+            'Generate points', geo.synthetic_points, options['points'], options['seed']
+        )
+        cells = self._timed('Encode cells', geo.cell_ids, lats, lngs)
+        # Отсортированный массив ячеек - аналог B-tree индекса posts_geo_cell_idx
+        order = self._timed('Sort cells (index build)', np.argsort, cells, kind='stable')
+        cells, lats, lngs = cells[order], lats[order], lngs[order]
+        ids = order + 1
+
+        rng = np.random.default_rng(options['seed'] + 1)
+        centers = rng.integers(0, len(cells), options['queries'])
+        timings, candidates = [], []
+        mismatches = 0
+        for index in centers:
+            lat, lng = lats[index], lngs[index]
+            started = time.perf_counter()
+            selected = np.concatenate([
+                np.arange(*np.searchsorted(cells, (low, high)))
+                for low, high in geo.covering_ranges(lat, lng, self.radius)
+            ])
+            result = geo.rank(
+                ids[selected], lats[selected], lngs[selected],
+                lat, lng, self.radius, options['limit']
+            )
+            timings.append(time.perf_counter() - started)
+            candidates.append(len(selected))
+
+            if len(timings) <= 20:
+                # Сверка с полным перебором всех точек
+                expected = geo.rank(ids, lats, lngs, lat, lng, self.radius, options['limit'])
+                mismatches += [pk for pk, _ in result] != [pk for pk, _ in expected]
+
+        self._report(timings, candidates)
+        started = time.perf_counter()
+        geo.rank(ids, lats, lngs, lats[centers[0]], lngs[centers[0]], self.radius, options['limit'])
+        self.stdout.write(
+            f'Full scan of {len(cells)} points for comparison: '
+            f'{(time.perf_counter() - started) * 1000:.2f} ms per query'
+        )
+        if mismatches:
+            raise CommandError(f'{mismatches} queries differ from the full scan')
+
+    def _database(self, options):
+        posts = Post.objects.filter(status='published', geo_cell__isnull=False)
+        total = posts.count()
+        if not total:
+            raise CommandError('No published geotagged posts')
+        self.stdout.write(f'Published geotagged posts: {total}')
+
+        sample = list(
+            posts.order_by('?').values_list('latitude', 'longitude')[:options['queries']]
+        )
+        timings = []
+        for lat, lng in sample:
+            started = time.perf_counter()
+            geo.nearby(posts, lat, lng, self.radius, options['limit'])
+            timings.append(time.perf_counter() - started)
+        self._report(timings, None)
@@ -0,0 +1,154 @@
+import random
+import time
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from apps.main import suggest
+from apps.main.models import Post
+
+
+TARGET_P99_MS = 20.0
+SEED_BATCH_SIZE = 10_000
+SEED_SLUG_PREFIX = 'suggest-benchmark-'
+
+SYLLABLES = (
+    'ba', 'ber', 'ca', 'del', 'do', 'fa', 'gra', 'is', 'ka', 'lan', 'le', 'lo',
+    'ma', 'mon', 'na', 'nor', 'pa', 'ri', 'ro', 'sa', 'stel', 'ta', 'ter', 'to',
+    'va', 'vik', 'za', 'zel',
+)
+TRAVEL_WORDS = (
+    'guide', 'hidden', 'beaches', 'mountains', 'weekend', 'old', 'town', 'food',
+    'markets', 'hiking', 'trails', 'lakes', 'islands', 'road', 'trip', 'budget',
+    'winter', 'summer', 'castles', 'museums', 'villages', 'coast', 'night',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark title autocomplete on published posts: trigram lookups without '
+        'the cache (cold) and through suggest() (warm), against the 20 ms p99 target. '
+        'Synthetic published posts are added until --posts exist'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts',
+            type=int,
+            default=1_000_000,
+            help='Published posts to benchmark on; missing ones are generated'
+        )
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=suggest.DEFAULT_LIMIT)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--typos',
+            type=float,
+            default=0.2,
+            help='Share of prefixes with two adjacent letters swapped'
+        )
+
+    def _title(self, places, rng):
+        words = [rng.choice(places) for _ in range(rng.randint(1, 2))]
+        words += rng.sample(TRAVEL_WORDS, rng.randint(1, 4))
+        rng.shuffle(words)
+        return ' '.join(words).capitalize()
+
+    def _seed_posts(self, count, rng):
+        """Дополняет опубликованные посты синтетическими до count"""
+        missing = count - Post.objects.filter(status='published').count()
+        if missing <= 0:
+            return
+        author, _ = get_user_model().objects.get_or_create(
+            email='suggest-benchmark@example.com', defaults={'username': 'suggest-benchmark'}
+        )
+        places = list({
+            ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            for _ in range(20_000)
+        })
+        offset = Post.objects.filter(slug__startswith=SEED_SLUG_PREFIX).count()
+        self.stdout.write(f'Generating {missing} published posts')
+        started = time.perf_counter()
+        for start in range(0, missing, SEED_BATCH_SIZE):
+            Post.objects.bulk_create([
+                Post(
+                    title=self._title(places, rng),
+                    slug=f'{SEED_SLUG_PREFIX}{offset + index}',
+                    content='',
+                    author=author,
+                    status='published',
+                )
+                for index in range(start, min(start + SEED_BATCH_SIZE, missing))
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE posts')
+        self.stdout.write(f'Generated in {time.perf_counter() - started:.1f}s')
+
+    def _prefixes(self, titles, count, typos, rng):
+        prefixes = []
+        while len(prefixes) < count:
+            words = suggest.normalize_prefix(rng.choice(titles)).split()
+            if not words:
+                continue
+            start = rng.randrange(len(words))
+            prefix = ' '.join(words[start:])[:rng.randint(suggest.MIN_PREFIX_LENGTH, 12)]
+            if len(prefix) >= 4 and rng.random() < typos:
+                index = rng.randrange(len(prefix) - 1)
+                prefix = prefix[:index] + prefix[index + 1] + prefix[index] + prefix[index + 2:]
+            if len(prefix.strip()) >= suggest.MIN_PREFIX_LENGTH:
+                prefixes.append(prefix)
+        return prefixes
+
+    def _report(self, label, timings):
+        timings = np.array(timings) * 1000
+        p99 = np.percentile(timings, 99)
+        self.stdout.write(
+            f'{label}: {len(timings)} queries, mean {timings.mean():.2f} ms, '
+            f'p50 {np.percentile(timings, 50):.2f} ms, p95 {np.percentile(timings, 95):.2f} ms, '
+            f'p99 {p99:.2f} ms'
+        )
+        return p99
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self._seed_posts(options['posts'], rng)
+
+        posts = Post.objects.filter(status='published')
+        total = posts.count()
+        if not total:
+            raise CommandError('No published posts')
+        self.stdout.write(f'Published posts: {total}')
+
+        titles = list(posts.order_by('?').values_list('title', flat=True)[:10_000])
+        prefixes = self._prefixes(titles, options['queries'], options['typos'], rng)
+        limit = options['limit']
+
+        cold = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            suggest.lookup(suggest.normalize_prefix(prefix), limit)
+            cold.append(time.perf_counter() - started)
+        cold_p99 = self._report('Cold (database)', cold)
+
+        for prefix in prefixes:
+            suggest.suggest(prefix, limit)
+        warm = []
+        for prefix in prefixes:
+            started = time.perf_counter()
+            suggest.suggest(prefix, limit)
+            warm.append(time.perf_counter() - started)
+        warm_p99 = self._report('Warm (cache)', warm)
+
+        failed = [
+            label for label, p99 in (('cold', cold_p99), ('warm', warm_p99))
+            if p99 > TARGET_P99_MS
+        ]
+        if failed:
+            raise CommandError(
+                f'p99 above {TARGET_P99_MS:.0f} ms target ({", ".join(failed)}) '
+                f'on {total} posts'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Cold and warm p99 within {TARGET_P99_MS:.0f} ms target on {total} posts'
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.main import bundles
+from apps.main.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Build offline bundles for categories (only changed posts are re-serialized)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--category',
+            action='append',
+            default=[],
+            help='Category slug (can be repeated; default: all categories)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rebuild every post instead of reusing the previous bundle'
+        )
+
+    def handle(self, *args, **options):
+        categories = Category.objects.order_by('id')
+        if options['category']:
+            categories = categories.filter(slug__in=options['category'])
+            missing = set(options['category']) - set(categories.values_list('slug', flat=True))
+            if missing:
+                raise CommandError(f'Unknown categories: {", ".join(sorted(missing))}')
+
+        for category in categories:
+            result = bundles.build(category.id, force=options['force'])
+            if result.get('unchanged'):
+                self.stdout.write(f'{category.slug}: v{result["version"]} is up to date')
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{category.slug}: v{result["version"]}, {result["posts"]} posts '
+                    f'({result["rebuilt_posts"]} rebuilt), {result["bytes"]} bytes'
+                ))
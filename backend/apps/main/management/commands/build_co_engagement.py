@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from apps.main import co_engagement
+
+
+class Command(BaseCommand):
+    help = 'Build "readers also engaged with" neighbours from readers and comments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=None,
+            help='Number of neighbours per post (default: RELATED_POSTS_K)'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only add interactions since the last build and refresh the posts they touch'
+        )
+
+    def handle(self, *args, **options):
+        build = co_engagement.refresh if options['incremental'] else co_engagement.rebuild
+        interactions, updated = build(options['k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(interactions)} interactions, updated neighbours for {updated} posts'
+        ))
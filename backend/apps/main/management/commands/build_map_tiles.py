@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from apps.main import map_tiles
+
+
+class Command(BaseCommand):
+    help = 'Precompute map clusters of geotagged posts for every zoom level'
+
+    def handle(self, *args, **options):
+        changed = map_tiles.build_all()
+        self.stdout.write(self.style.SUCCESS(
+            f'Map tiles for zoom 0-{map_tiles.MAX_ZOOM} rebuilt, {changed} tiles changed'
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from apps.main import related
+
+
+class Command(BaseCommand):
+    help = 'Build the TF-IDF related posts index and store top-k neighbours per post'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--k',
+            type=int,
+            default=None,
+            help='Number of neighbours per post (default: RELATED_POSTS_K)'
+        )
+
+    def handle(self, *args, **options):
+        index = related.rebuild(options['k'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(index.post_ids)} posts, {len(index.terms)} terms, '
+            f'{index.k} neighbours per post'
+        ))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from apps.main.models import Post, make_excerpt
+
+
+class Command(BaseCommand):
+    help = 'Recompute posts.excerpt from posts.content in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of posts processed per batch'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        updated = 0
+        while True:
+            rows = list(
+                Post.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', 'content', 'excerpt')[:chunk_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            stale = [
+                Post(id=post_id, excerpt=make_excerpt(content))
+                for post_id, content, excerpt in rows
+                if excerpt != make_excerpt(content)
+            ]
+            if stale:
+                Post.objects.bulk_update(stale, ['excerpt'])
+                updated += len(stale)
+            self.stdout.write(f'Checked up to post {last_id}, updated {updated}...')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt excerpts for {updated} posts'))
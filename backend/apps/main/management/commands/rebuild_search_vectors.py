@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from apps.main.models import Post
+from apps.main.search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Build posts.search_vector for existing posts in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of posts updated per statement'
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only posts without a search vector'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        posts = Post.objects.order_by('id')
+        if options['missing_only']:
+            posts = posts.filter(search_vector__isnull=True)
+
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                posts.filter(id__gt=last_id).values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            updated += update_search_vectors(Post.objects.filter(id__in=ids))
+            self.stdout.write(f'Updated {updated} posts...')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search vectors for {updated} posts'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from apps.main.models import Category, Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute categories.published_posts_count in bulk'
+
+    def handle(self, *args, **options):
+        published_count = Post.objects.filter(
+            category=OuterRef('pk'), status='published'
+        ).order_by().values('category').annotate(total=Count('pk')).values('total')
+
+        with transaction.atomic():
+            updated = Category.objects.update(
+                published_posts_count=Coalesce(
+                    Subquery(published_count, output_field=IntegerField()), Value(0)
+                )
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Recomputed published posts count for {updated} categories')
+        )
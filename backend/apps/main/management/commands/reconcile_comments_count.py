@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from apps.comments.models import Comment
+from apps.main.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recalculate posts.active_comments_count in chunks and fix drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of posts processed per transaction'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        actual_count = Comment.objects.filter(
+            post=OuterRef('pk'), is_active=True
+        ).order_by().values('post').annotate(total=Count('pk')).values('total')
+
+        last_id = 0
+        checked = fixed = 0
+        while True:
+            ids = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+
+            with transaction.atomic():
+                drifted = [
+                    Post(id=post_id, active_comments_count=actual)
+                    for post_id, stored, actual in Post.objects.filter(id__in=ids)
+                    .select_for_update()
+                    .annotate(actual=Coalesce(
+                        Subquery(actual_count, output_field=IntegerField()), Value(0)
+                    ))
+                    .values_list('id', 'active_comments_count', 'actual')
+                    if stored != actual
+                ]
+                Post.objects.bulk_update(drifted, ['active_comments_count'])
+
+            checked += len(ids)
+            fixed += len(drifted)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Checked {checked} posts, fixed {fixed} comment counters')
+        )
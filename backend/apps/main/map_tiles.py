@@ -0,0 +1,413 @@
+"""
+Кластеры геотегированных постов для тайлов карты (/api/v1/posts/map/).
+
+Тайлы - стандартная сетка Web Mercator (zoom/x/y, как у OSM). Каждый
+тайл делится на CLUSTER_GRID x CLUSTER_GRID ячеек; опубликованные посты
+одной ячейки образуют кластер: число постов, центроид и представитель -
+пост с наибольшим trending_score. Ячейки вложены: ячейка зума z ровно
+покрывает 2 x 2 ячейки зума z + 1, поэтому кластеры тайла складываются из
+кластеров четырех дочерних тайлов без обращения к постам.
+
+Кластеры всех зумов от 0 до MAX_ZOOM хранятся в map_tiles компактными
+списками. Задача build_map_tiles полностью пересчитывает их NumPy по всем
+постам и переписывает только изменившиеся тайлы. Изменение поста помечает
+тайлы с его старым и новым положением на всех зумах (dirty_at), задача
+rebuild_dirty_map_tiles пересчитывает их: тайлы MAX_ZOOM - по постам
+внутри тайла, остальные - из дочерних.
+
+Тайлы кэшируются по отдельности; запрос карты - одно чтение get_many по
+тайлам bbox, в БД идут только промахи кэша. Пересборка кладет тайлы в
+кэш после коммита (set), промахи заполняются только add - значение,
+прочитанное из БД до коммита пересборки, не перезаписывает новое.
+"""
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import geo
+from .models import MapTile, Post
+
+
+MAX_ZOOM = 14
+GRID_BITS = 3
+CLUSTER_GRID = 1 << GRID_BITS
+GRID_MASK = CLUSTER_GRID - 1
+MAX_LATITUDE = 85.05112878
+# Больше тайлов, чем нужно экрану 1920x1080 с запасом
+MAX_TILES = 64
+
+TILE_CACHE_TIMEOUT = 24 * 60 * 60
+PENDING_KEY = 'map-tiles:rebuild-pending'
+LOCK_KEY = 'map-tiles:lock'
+LOCK_TIMEOUT = 30 * 60
+# Задержка пересборки после изменения, секунды
+MAP_DEBOUNCE = 30
+
+# Поля кластера в MapTile.clusters
+CELL, COUNT, LAT, LNG, SCORE, POST_ID, SLUG, TITLE = range(8)
+
+
+def tile_cache_key(zoom, x, y):
+    return f'map:tile:{zoom}:{x}:{y}'
+
+
+def grid_positions(lats, lngs):
+    """
+    Координаты точек на сетке ячеек MAX_ZOOM (Web Mercator); ячейка и
+    тайл зума z - сдвиг вправо на MAX_ZOOM - z и еще на GRID_BITS бит.
+    """
+    scale = (1 << MAX_ZOOM) * CLUSTER_GRID
+    lngs = np.asarray(lngs, dtype=np.float64)
+    lats = np.clip(np.asarray(lats, dtype=np.float64), -MAX_LATITUDE, MAX_LATITUDE)
+    sin_lat = np.sin(np.radians(lats))
+    u = (lngs + 180.0) / 360.0
+    v = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return (
+        np.clip((u * scale).astype(np.int64), 0, scale - 1),
+        np.clip((v * scale).astype(np.int64), 0, scale - 1),
+    )
+
+
+def tile_bounds(zoom, x, y):
+    """(min_lat, min_lng, max_lat, max_lng) тайла"""
+    size = 1 << zoom
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / size))))
+
+    return latitude(y + 1), x / size * 360.0 - 180.0, latitude(y), (x + 1) / size * 360.0 - 180.0
+
+
+@dataclass
+class Points:
+    ids: np.ndarray
+    lats: np.ndarray
+    lngs: np.ndarray
+    scores: np.ndarray
+    slugs: list
+    titles: list
+    u: np.ndarray
+    v: np.ndarray
+
+    def select(self, mask):
+        indexes = np.flatnonzero(mask)
+        return Points(
+            self.ids[indexes], self.lats[indexes], self.lngs[indexes], self.scores[indexes],
+            [self.slugs[i] for i in indexes], [self.titles[i] for i in indexes],
+            self.u[indexes], self.v[indexes]
+        )
+
+
+def geotagged_posts():
+    return Post.objects.filter(status='published', geo_cell__isnull=False)
+
+
+def load_points(queryset):
+    rows = list(queryset.order_by().values_list(
+        'id', 'latitude', 'longitude', 'trending_score', 'slug', 'title'
+    ))
+    columns = [list(column) for column in zip(*rows)] if rows else [[]] * 6
+    ids, lats, lngs, scores, slugs, titles = columns
+    lats = np.array(lats, dtype=np.float64)
+    lngs = np.array(lngs, dtype=np.float64)
+    u, v = grid_positions(lats, lngs)
+    return Points(
+        np.array(ids, dtype=np.int64), lats, lngs, np.array(scores, dtype=np.float64),
+        slugs, titles, u, v
+    )
+
+
+def aggregate(zoom, points):
+    """{(x, y): кластеры} непустых тайлов зума zoom"""
+    if not len(points.ids):
+        return {}
+    shift = MAX_ZOOM - zoom
+    width = (1 << zoom) * CLUSTER_GRID
+    cells, inverse, counts = np.unique(
+        (points.v >> shift) * width + (points.u >> shift),
+        return_inverse=True, return_counts=True
+    )
+    inverse = inverse.ravel()
+    lat_sums = np.bincount(inverse, weights=points.lats, minlength=len(cells))
+    lng_sums = np.bincount(inverse, weights=points.lngs, minlength=len(cells))
+    # Представитель ячейки - наибольший счет, при равенстве меньший id
+    order = np.lexsort((points.ids, -points.scores, inverse))
+    grouped = inverse[order]
+    representatives = order[np.r_[True, grouped[1:] != grouped[:-1]]]
+
+    tiles = defaultdict(list)
+    for index, cell in enumerate(cells.tolist()):
+        y, x = divmod(cell, width)
+        count = int(counts[index])
+        post = representatives[index]
+        tiles[(x >> GRID_BITS, y >> GRID_BITS)].append([
+            (y & GRID_MASK) * CLUSTER_GRID + (x & GRID_MASK),
+            count,
+            round(lat_sums[index] / count, 6),
+            round(lng_sums[index] / count, 6),
+            float(points.scores[post]),
+            int(points.ids[post]),
+            points.slugs[post],
+            points.titles[post],
+        ])
+    return dict(tiles)
+
+
+def merge_children(x, y, children):
+    """Кластеры тайла (x, y) из {(x, y): кластеры} дочерних тайлов следующего зума"""
+    cells = {}
+    for (child_x, child_y), clusters in children.items():
+        offset_x = (child_x - 2 * x) * CLUSTER_GRID
+        offset_y = (child_y - 2 * y) * CLUSTER_GRID
+        for cluster in clusters:
+            row, column = divmod(cluster[CELL], CLUSTER_GRID)
+            cell = ((offset_y + row) >> 1) * CLUSTER_GRID + ((offset_x + column) >> 1)
+            count = cluster[COUNT]
+            merged = cells.get(cell)
+            if merged is None:
+                cells[cell] = [
+                    cell, count, cluster[LAT] * count, cluster[LNG] * count, *cluster[SCORE:]
+                ]
+                continue
+            merged[COUNT] += count
+            merged[LAT] += cluster[LAT] * count
+            merged[LNG] += cluster[LNG] * count
+            if (cluster[SCORE], -cluster[POST_ID]) > (merged[SCORE], -merged[POST_ID]):
+                merged[SCORE:] = cluster[SCORE:]
+
+    clusters = sorted(cells.values())
+    for cluster in clusters:
+        cluster[LAT] = round(cluster[LAT] / cluster[COUNT], 6)
+        cluster[LNG] = round(cluster[LNG] / cluster[COUNT], 6)
+    return clusters
+
+
+def leaf_clusters(x, y):
+    """Кластеры тайла MAX_ZOOM по постам внутри него (отбор по geo_cell)"""
+    min_lat, min_lng, max_lat, max_lng = tile_bounds(MAX_ZOOM, x, y)
+    # Точки за пределами широт Web Mercator попадают в крайние ряды тайлов
+    if y == 0:
+        max_lat = 90.0
+    if y == (1 << MAX_ZOOM) - 1:
+        min_lat = -90.0
+    condition = Q()
+    for low, high in geo.bbox_ranges(min_lat, min_lng, max_lat, max_lng):
+        condition |= Q(geo_cell__gte=low, geo_cell__lt=high)
+    points = load_points(geotagged_posts().filter(condition))
+    points = points.select(((points.u >> GRID_BITS) == x) & ((points.v >> GRID_BITS) == y))
+    return aggregate(MAX_ZOOM, points).get((x, y), [])
+
+
+def point_tiles(lat, lng):
+    """(zoom, x, y) тайлов всех зумов, содержащих точку"""
+    u, v = (int(values[0]) for values in grid_positions([lat], [lng]))
+    return [
+        (zoom, u >> (MAX_ZOOM - zoom + GRID_BITS), v >> (MAX_ZOOM - zoom + GRID_BITS))
+        for zoom in range(MAX_ZOOM + 1)
+    ]
+
+
+def mark_dirty(points):
+    """Помечает к пересборке тайлы с точками [(широта, долгота)] на всех зумах"""
+    tiles = {
+        tile for lat, lng in points if lat is not None and lng is not None
+        for tile in point_tiles(lat, lng)
+    }
+    if not tiles:
+        return
+    now = timezone.now()
+    MapTile.objects.bulk_create(
+        [MapTile(zoom=zoom, x=x, y=y, dirty_at=now) for zoom, x, y in sorted(tiles)],
+        update_conflicts=True,
+        unique_fields=['zoom', 'x', 'y'],
+        update_fields=['dirty_at']
+    )
+    schedule_rebuild()
+
+
+def schedule_rebuild():
+    """
+    Планирует пересборку помеченных тайлов через MAP_DEBOUNCE секунд после
+    коммита. Пока пересборка запланирована, новые изменения ее не дублируют.
+    """
+    def enqueue():
+        if cache.add(PENDING_KEY, 1, MAP_DEBOUNCE * 10):
+            from .tasks import rebuild_dirty_map_tiles
+
+            rebuild_dirty_map_tiles.apply_async(countdown=MAP_DEBOUNCE)
+
+    transaction.on_commit(enqueue)
+
+
+def _cache_on_commit(tiles):
+    """Кладет {(zoom, x, y): кластеры} в кэш после коммита"""
+    values = {tile_cache_key(*tile): clusters for tile, clusters in tiles.items()}
+    if values:
+        transaction.on_commit(lambda: cache.set_many(values, TILE_CACHE_TIMEOUT))
+
+
+def rebuild_dirty():
+    """Пересчитывает помеченные тайлы, от MAX_ZOOM к нулевому. Возвращает их число"""
+    started = timezone.now()
+    dirty = {
+        (zoom, x, y): pk for pk, zoom, x, y in MapTile.objects.filter(
+            dirty_at__isnull=False, dirty_at__lte=started
+        ).values_list('pk', 'zoom', 'x', 'y')
+    }
+    if not dirty:
+        return 0
+
+    rebuilt = {}
+    for zoom in range(MAX_ZOOM, -1, -1):
+        tiles = [(x, y) for tile_zoom, x, y in dirty if tile_zoom == zoom]
+        if not tiles:
+            continue
+        if zoom == MAX_ZOOM:
+            for x, y in tiles:
+                rebuilt[(zoom, x, y)] = leaf_clusters(x, y)
+            continue
+
+        child_zoom = zoom + 1
+        wanted = {
+            (2 * x + dx, 2 * y + dy) for x, y in tiles for dx in (0, 1) for dy in (0, 1)
+        }
+        stored = MapTile.objects.filter(
+            zoom=child_zoom,
+            x__in={x for x, _ in wanted},
+            y__in={y for _, y in wanted}
+        ).values_list('x', 'y', 'clusters')
+        children = {(x, y): clusters for x, y, clusters in stored if (x, y) in wanted}
+        children.update({
+            (x, y): clusters for (tile_zoom, x, y), clusters in rebuilt.items()
+            if tile_zoom == child_zoom
+        })
+        for x, y in tiles:
+            rebuilt[(zoom, x, y)] = merge_children(x, y, {
+                (2 * x + dx, 2 * y + dy): children.get((2 * x + dx, 2 * y + dy), [])
+                for dx in (0, 1) for dy in (0, 1)
+            })
+
+    with transaction.atomic():
+        MapTile.objects.bulk_update(
+            [
+                MapTile(pk=dirty[tile], clusters=clusters,
+                        count=sum(cluster[COUNT] for cluster in clusters))
+                for tile, clusters in rebuilt.items()
+            ],
+            ['clusters', 'count'],
+            batch_size=500
+        )
+        # Тайлы, помеченные во время пересчета, останутся в очереди
+        pks = list(dirty.values())
+        MapTile.objects.filter(pk__in=pks, dirty_at__lte=started).update(dirty_at=None)
+        MapTile.objects.filter(pk__in=pks, count=0, dirty_at__isnull=True).delete()
+        _cache_on_commit(rebuilt)
+    return len(rebuilt)
+
+
+def build_all():
+    """
+    Полный пересчет кластеров всех зумов по опубликованным постам.
+    Переписываются только изменившиеся тайлы. Возвращает число изменений.
+    """
+    started = timezone.now()
+    points = load_points(geotagged_posts())
+    changes = 0
+    for zoom in range(MAX_ZOOM + 1):
+        tiles = aggregate(zoom, points)
+        with transaction.atomic():
+            changes += _replace_zoom(zoom, tiles, started)
+    return changes
+
+
+def _replace_zoom(zoom, tiles, started):
+    existing = {
+        (x, y): (pk, clusters, dirty_at)
+        for pk, x, y, clusters, dirty_at in MapTile.objects.filter(zoom=zoom).values_list(
+            'pk', 'x', 'y', 'clusters', 'dirty_at'
+        ).iterator(chunk_size=2000)
+    }
+    created, updated, deleted = [], [], []
+    changed = {}
+    for (x, y), clusters in tiles.items():
+        count = sum(cluster[COUNT] for cluster in clusters)
+        current = existing.get((x, y))
+        if current is None:
+            created.append(MapTile(zoom=zoom, x=x, y=y, clusters=clusters, count=count))
+        elif current[1] != clusters:
+            updated.append(MapTile(pk=current[0], clusters=clusters, count=count))
+        else:
+            continue
+        changed[(zoom, x, y)] = clusters
+    for (x, y), (pk, _, dirty_at) in existing.items():
+        # Тайлы, помеченные после начала пересчета, пересоберет rebuild_dirty
+        if (x, y) not in tiles and (dirty_at is None or dirty_at <= started):
+            deleted.append(pk)
+            changed[(zoom, x, y)] = []
+
+    MapTile.objects.bulk_create(created, batch_size=500)
+    MapTile.objects.bulk_update(updated, ['clusters', 'count'], batch_size=500)
+    MapTile.objects.filter(pk__in=deleted).delete()
+    MapTile.objects.filter(zoom=zoom, dirty_at__lte=started).update(dirty_at=None)
+    _cache_on_commit(changed)
+    return len(changed)
+
+
+def tile_range(min_lng, min_lat, max_lng, max_lat, zoom):
+    """
+    (x, y) тайлов зума, пересекающих bbox; min_lng > max_lng - bbox
+    пересекает 180-й меридиан. ValueError - тайлов больше MAX_TILES.
+    """
+    size = 1 << zoom
+    shift = MAX_ZOOM - zoom + GRID_BITS
+    u, v = grid_positions([max_lat, min_lat], [min_lng, max_lng])
+    (west, east), (north, south) = (u >> shift).tolist(), (v >> shift).tolist()
+    columns = list(range(west, east + 1)) if west <= east else (
+        list(range(west, size)) + list(range(0, east + 1))
+    )
+    rows = range(north, south + 1)
+    if len(columns) * len(rows) > MAX_TILES:
+        raise ValueError(f'The bbox covers more than {MAX_TILES} tiles at this zoom')
+    return [(x, y) for y in rows for x in columns]
+
+
+def get_tiles(zoom, coordinates):
+    """{(x, y): кластеры} тайлов: одно чтение кэша, промахи - одним запросом к БД"""
+    keys = {tile_cache_key(zoom, x, y): (x, y) for x, y in coordinates}
+    found = cache.get_many(list(keys))
+    missing = [key for key in keys if key not in found]
+    if missing:
+        stored = {
+            (x, y): clusters for x, y, clusters in MapTile.objects.filter(
+                zoom=zoom,
+                x__in={keys[key][0] for key in missing},
+                y__in={keys[key][1] for key in missing}
+            ).values_list('x', 'y', 'clusters')
+        }
+        loaded = {key: stored.get(keys[key], []) for key in missing}
+        # add, а не set: пересборка, закоммиченная после чтения из БД, уже
+        # положила в кэш новые кластеры, и старые не должны их затереть
+        for key, clusters in loaded.items():
+            cache.add(key, clusters, TILE_CACHE_TIMEOUT)
+        found.update(loaded)
+    return {keys[key]: clusters for key, clusters in found.items()}
+
+
+def cluster_data(cluster):
+    """Кластер в ответе API"""
+    return {
+        'count': cluster[COUNT],
+        'lat': cluster[LAT],
+        'lng': cluster[LNG],
+        'post': {
+            'id': cluster[POST_ID],
+            'slug': cluster[SLUG],
+            'title': cluster[TITLE],
+        },
+    }
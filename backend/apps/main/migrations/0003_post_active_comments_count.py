@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_post_unique_views'),
+        ('comments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='active_comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE posts SET active_comments_count = (
+                    SELECT COUNT(*) FROM comments
+                    WHERE comments.post_id = posts.id AND comments.is_active
+                )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
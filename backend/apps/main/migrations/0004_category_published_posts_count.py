@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_post_active_comments_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='published_posts_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE categories SET published_posts_count = (
+                    SELECT COUNT(*) FROM posts
+                    WHERE posts.category_id = categories.id AND posts.status = 'published'
+                )
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0006_trigram_indexes'),
+        ('subscribe', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='feed_pinned_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='is_effectively_pinned',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-is_effectively_pinned', 'feed_pinned_at', '-created_at', '-id'], name='posts_feed_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['category', '-is_effectively_pinned', 'feed_pinned_at', '-created_at', '-id'], name='posts_category_feed_idx'),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE posts
+                SET is_effectively_pinned = TRUE, feed_pinned_at = pinned_posts.pinned_at
+                FROM pinned_posts
+                JOIN subscriptions ON subscriptions.user_id = pinned_posts.user_id
+                WHERE pinned_posts.post_id = posts.id
+                  AND subscriptions.status = 'active'
+                  AND subscriptions.end_date > CURRENT_TIMESTAMP
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_post_materialized_pin_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=203),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE posts SET excerpt = CASE
+                    WHEN LENGTH(content) > 200 THEN SUBSTR(content, 1, 200) || '...'
+                    ELSE content
+                END
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0008_post_excerpt'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostEngagement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('comments', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Post Engagement',
+                'verbose_name_plural': 'Post Engagement',
+                'db_table': 'post_engagement',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-trending_score'], name='posts_status_ca12bf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['category', 'status', '-trending_score'], name='posts_categor_40bc01_idx'),
+        ),
+        migrations.AddField(
+            model_name='postengagement',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='engagement', to='main.post'),
+        ),
+        migrations.AddIndex(
+            model_name='postengagement',
+            index=models.Index(fields=['bucket'], name='post_engage_bucket_1c8195_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postengagement',
+            constraint=models.UniqueConstraint(fields=('post', 'bucket'), name='post_engagement_post_bucket'),
+        ),
+    ]
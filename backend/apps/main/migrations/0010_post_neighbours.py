@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_post_trending_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostNeighbours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('content', 'Similar content')], max_length=20)),
+                ('neighbours', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='main.post')),
+            ],
+            options={
+                'verbose_name': 'Post Neighbours',
+                'verbose_name_plural': 'Post Neighbours',
+                'db_table': 'post_neighbours',
+                'constraints': [models.UniqueConstraint(fields=('post', 'kind'), name='post_neighbours_post_kind')],
+            },
+        ),
+    ]
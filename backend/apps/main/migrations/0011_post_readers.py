@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_post_neighbours'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='postneighbours',
+            name='kind',
+            field=models.CharField(choices=[('content', 'Similar content'), ('co_engagement', 'Readers also engaged with')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='PostReader',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_seen_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='readers', to='main.post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_posts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Post Reader',
+                'verbose_name_plural': 'Post Readers',
+                'db_table': 'post_readers',
+                'indexes': [models.Index(fields=['first_seen_at'], name='post_reader_first_s_06d8d8_idx')],
+                'constraints': [models.UniqueConstraint(fields=('post', 'user'), name='post_readers_post_user')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:45
+
+import apps.media.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=apps.media.storage.content_addressed_storage, upload_to='posts/'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0015_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('file', models.FileField(upload_to='bundles/')),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('sha256', models.CharField(max_length=64)),
+                ('manifest', models.JSONField(default=dict)),
+                ('built_at', models.DateTimeField()),
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='bundle', to='main.category')),
+            ],
+            options={
+                'verbose_name': 'Category bundle',
+                'verbose_name_plural': 'Category bundles',
+                'db_table': 'category_bundles',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0017_post_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapTile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('x', models.PositiveIntegerField()),
+                ('y', models.PositiveIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('clusters', models.JSONField(default=list)),
+                ('dirty_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Map tile',
+                'verbose_name_plural': 'Map tiles',
+                'db_table': 'map_tiles',
+                'indexes': [models.Index(condition=models.Q(('dirty_at__isnull', False)), fields=['dirty_at'], name='map_tiles_dirty_idx')],
+                'constraints': [models.UniqueConstraint(fields=('zoom', 'x', 'y'), name='map_tiles_zoom_x_y')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0018_map_tiles'),
+        ('subscribe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='pin_expires_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            sql="""
+                UPDATE posts
+                SET pin_expires_at = subscriptions.end_date
+                FROM pinned_posts
+                JOIN subscriptions ON subscriptions.user_id = pinned_posts.user_id
+                WHERE pinned_posts.post_id = posts.id
+                  AND posts.is_effectively_pinned
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
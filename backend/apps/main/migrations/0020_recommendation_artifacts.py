@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0019_post_pin_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('file', models.FileField(upload_to='recommendations/')),
+                ('built_at', models.DateTimeField()),
+                ('state', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Recommendation artifact',
+                'verbose_name_plural': 'Recommendation artifacts',
+                'db_table': 'recommendation_artifacts',
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedPostUpdate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_id', models.PositiveBigIntegerField(unique=True)),
+                ('queued_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Related post update',
+                'verbose_name_plural': 'Related post updates',
+                'db_table': 'related_post_updates',
+            },
+        ),
+    ]
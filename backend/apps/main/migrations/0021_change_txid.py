@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Номер транзакции, последней изменившей строку. TG_ARGV - колонки,
+# изменение которых номер не обновляет (счетчики, служебные отметки).
+STAMP_FUNCTION = """
+    CREATE FUNCTION stamp_change_txid() RETURNS trigger AS $$
+    DECLARE
+        ignored text[] := TG_ARGV || ARRAY['change_txid'];
+    BEGIN
+        IF TG_OP = 'INSERT'
+           OR (to_jsonb(NEW) - ignored) IS DISTINCT FROM (to_jsonb(OLD) - ignored) THEN
+            NEW.change_txid := pg_current_xact_id()::text::bigint;
+        ELSE
+            NEW.change_txid := OLD.change_txid;
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0020_recommendation_artifacts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postreader',
+            name='change_txid',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='postreader',
+            index=models.Index(fields=['change_txid'], name='post_readers_txid_idx'),
+        ),
+        migrations.RunSQL(
+            sql=STAMP_FUNCTION,
+            reverse_sql='DROP FUNCTION stamp_change_txid()',
+        ),
+        migrations.RunSQL(
+            sql="""
+                CREATE TRIGGER post_readers_change_txid
+                BEFORE INSERT OR UPDATE ON post_readers
+                FOR EACH ROW EXECUTE FUNCTION stamp_change_txid('last_seen_at')
+            """,
+            reverse_sql='DROP TRIGGER post_readers_change_txid ON post_readers',
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0021_change_txid'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='category',
+            name='categories_sync_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='post',
+            name='posts_sync_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tombstone',
+            name='sync_tombstones_idx',
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='change_txid',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='change_txid',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='tombstone',
+            name='change_txid',
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['change_txid', 'id'], name='categories_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['change_txid', 'id'], name='posts_sync_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['deleted_at'], name='sync_tombstones_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['change_txid', 'id'], name='sync_tombstones_idx'),
+        ),
+        # Существующие строки читает первая синхронизация (позиция 0)
+        migrations.RunSQL(
+            sql=[
+                'UPDATE posts SET change_txid = 0',
+                'UPDATE categories SET change_txid = 0',
+                'UPDATE sync_tombstones SET change_txid = 0',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            sql="""
+                CREATE TRIGGER posts_change_txid
+                BEFORE INSERT OR UPDATE ON posts
+                FOR EACH ROW EXECUTE FUNCTION stamp_change_txid(
+                    'views_count', 'unique_views', 'unique_views_7d',
+                    'active_comments_count', 'trending_score', 'search_vector'
+                )
+            """,
+            reverse_sql='DROP TRIGGER posts_change_txid ON posts',
+        ),
+        migrations.RunSQL(
+            sql="""
+                CREATE TRIGGER categories_change_txid
+                BEFORE INSERT OR UPDATE ON categories
+                FOR EACH ROW EXECUTE FUNCTION stamp_change_txid()
+            """,
+            reverse_sql='DROP TRIGGER categories_change_txid ON categories',
+        ),
+        migrations.RunSQL(
+            sql="""
+                CREATE TRIGGER sync_tombstones_change_txid
+                BEFORE INSERT OR UPDATE ON sync_tombstones
+                FOR EACH ROW EXECUTE FUNCTION stamp_change_txid()
+            """,
+            reverse_sql='DROP TRIGGER sync_tombstones_change_txid ON sync_tombstones',
+        ),
+    ]
@@ -1,7 +1,67 @@
-from django.db import models
+from collections import Counter
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, When, F, Q, Value, IntegerField
+from django.db.models.functions import Greatest, Now
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.utils.text import slugify
 from django.urls import reverse
+from django.utils import timezone
+
+from apps.media.storage import content_addressed_storage
+
+from . import geo
+
+
+def adjust_counter(queryset, field, deltas, **updates):
+    """
+    Применяет {id: дельта} к счетчику field одним UPDATE
+    (SET field = GREATEST(field + CASE id WHEN ... END, 0)).
+    updates - другие колонки, обновляемые тем же UPDATE.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+    if not deltas:
+        return 0
+    return queryset.filter(id__in=deltas).update(**updates, **{
+        field: Greatest(
+            F(field) + Case(
+                *[When(id=pk, then=Value(delta)) for pk, delta in deltas.items()],
+                default=Value(0),
+                output_field=IntegerField()
+            ),
+            Value(0)
+        )
+    })
+
+
+EXCERPT_LENGTH = 200
+# Снятие закреплений, истекающих раньше, планируется на точное время;
+# остальные подхватит следующий запуск ежечасной check_expired_subscriptions
+PIN_EXPIRY_LOOKAHEAD = timedelta(hours=2)
+
+
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    """Краткий текст поста для списков"""
+    if len(content) > length:
+        return content[:length] + '...'
+    return content
+
+
+class CategoryManager(models.Manager):
+    """Менеджер для модели Category"""
+
+    def adjust_published_posts_count(self, deltas):
+        """
+        Применяет {category_id: дельта} к published_posts_count. updated_at
+        меняется, чтобы новое число постов попало в синхронизацию клиентов.
+        """
+        return adjust_counter(
+            self.get_queryset(), 'published_posts_count', deltas, updated_at=Now()
+        )
 
 
 class Category(models.Model):
@@ -12,12 +72,23 @@ class Category(models.Model):
     slug = models.SlugField(max_length=100, unique=True, blank=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Поддерживается Post.save и сигналом pre_delete поста
+    published_posts_count = models.PositiveIntegerField(default=0)
+    # Транзакция, последней изменившая категорию (триггер, apps.main.watermarks)
+    change_txid = models.BigIntegerField(null=True, editable=False)
+
+    objects = CategoryManager()
 
     class Meta:
         db_table = 'categories'
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
         ordering = ['name']
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='categories_name_trgm'),
+            models.Index(fields=['change_txid', 'id'], name='categories_sync_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -31,47 +102,120 @@ class Category(models.Model):
 class PostManager(models.Manager):
     """Менеджер для модели Post с дополнительными методами"""
 
+    def get_queryset(self):
+        # Поисковый вектор нужен только в WHERE/ORDER BY, не загружаем его
+        return super().get_queryset().defer('search_vector')
+
     def published(self):
         return self.filter(status='published')
+
+    def visible_to(self, user):
+        """Опубликованные посты и черновики самого пользователя"""
+        if not user.is_authenticated:
+            return self.filter(status='published')
+        return self.filter(Q(status='published') | Q(author=user))
+
+    def adjust_comments_count(self, deltas):
+        """
+        Применяет {post_id: дельта} к active_comments_count одним UPDATE.
+        Вызывается в транзакции, изменяющей комментарии.
+        """
+        from .response_cache import bump_scope_versions, SCOPE_COMMENTS
+
+        updated = adjust_counter(self.get_queryset(), 'active_comments_count', deltas)
+        if updated:
+            bump_scope_versions(SCOPE_COMMENTS)
+        return updated
     
     def pinned_posts(self):
         """Возвращает закрепленные посты в порядке закрепления"""
         return self.filter(
-            pin_info__isnull=False,
-            pin_info__user__subscription__status='active',
-            pin_info__user__subscription__end_date__gt=models.functions.Now(),
+            is_effectively_pinned=True,
             status='published'
-        ).select_related(
-            'pin_info', 'pin_info__user', 'pin_info__user__subscription'
-        ).order_by('pin_info__pinned_at')
+        ).select_related('author', 'category').defer('content').order_by('feed_pinned_at')
     
     def regular_posts(self):
         """Возвращает обычные (незакрепленные) посты"""
-        return self.filter(pin_info__isnull=True, status='published')
+        return self.filter(is_effectively_pinned=False, status='published')
     
     def with_subscription_info(self):
         """Добавляет информацию о подписке автора"""
         return self.select_related(
             'author', 'author__subscription', 'category'
-        ).prefetch_related('pin_info')
+        )
         
     def get_posts_for_feed(self):
-        """Возвращает посты с закрепленными первыми"""
-        from django.db.models import Case, When, Value, BooleanField
-        from django.utils import timezone
-        
-        return self.annotate(
-            is_pinned_flag=Case(
-                When(
-                    pin_info__isnull=False,
-                    pin_info__user__subscription__status='active',
-                    pin_info__user__subscription__end_date__gt=timezone.now(),
-                    then=Value(True)
-                ),
-                default=Value(False),
-                output_field=BooleanField()
+        """
+        Возвращает посты с закрепленными первыми (в порядке закрепления),
+        затем остальные по -created_at. Порядок совпадает с
+        apps.main.pagination.FeedCursorPagination.ordering и индексом
+        posts_feed_order_idx.
+        """
+        return self.order_by(
+            '-is_effectively_pinned', F('feed_pinned_at').asc(nulls_last=True), '-created_at', '-id'
+        )
+
+    def sync_pin_state(self, post_ids=None):
+        """
+        Пересчитывает is_effectively_pinned / feed_pinned_at / pin_expires_at:
+        пост закреплен, если у него есть PinnedPost и активная подписка
+        закрепившего. post_ids=None - проверяет все посты (задача истечения
+        подписок). Для закреплений, истекающих до следующего запуска этой
+        задачи, планирует снятие флага точно в момент окончания подписки.
+        """
+        queryset = self.get_queryset()
+        if post_ids is not None:
+            post_ids = list(post_ids)
+            if not post_ids:
+                return 0
+            queryset = queryset.filter(id__in=post_ids)
+
+        pinned = {
+            post_id: (pinned_at, expires_at)
+            for post_id, pinned_at, expires_at in queryset.filter(
+                pin_info__isnull=False,
+                pin_info__user__subscription__status='active',
+                pin_info__user__subscription__end_date__gt=Now(),
+            ).values_list('id', 'pin_info__pinned_at', 'pin_info__user__subscription__end_date')
+        }
+        stale = list(
+            queryset.filter(is_effectively_pinned=True)
+            .exclude(id__in=list(pinned))
+            .values_list('id', flat=True)
+        )
+        changed = [
+            self.model(
+                id=post_id, is_effectively_pinned=False, feed_pinned_at=None,
+                pin_expires_at=None
             )
-        ).order_by('-is_pinned_flag', '-created_at')
+            for post_id in stale
+        ]
+        stored = queryset.filter(id__in=list(pinned)).values_list(
+            'id', 'is_effectively_pinned', 'feed_pinned_at', 'pin_expires_at'
+        )
+        for post_id, stored_flag, stored_at, stored_expires in stored:
+            if not stored_flag or (stored_at, stored_expires) != pinned[post_id]:
+                changed.append(self.model(
+                    id=post_id, is_effectively_pinned=True,
+                    feed_pinned_at=pinned[post_id][0], pin_expires_at=pinned[post_id][1]
+                ))
+        self.bulk_update(changed, ['is_effectively_pinned', 'feed_pinned_at', 'pin_expires_at'])
+
+        horizon = timezone.now() + PIN_EXPIRY_LOOKAHEAD
+        expiring = {}
+        for post_id, (_, expires_at) in pinned.items():
+            if expires_at < horizon:
+                expiring.setdefault(expires_at, []).append(post_id)
+        if expiring:
+            from .tasks import expire_post_pins
+
+            def schedule():
+                for expires_at, ids in expiring.items():
+                    # Запас на расхождение часов воркера и БД
+                    expire_post_pins.apply_async((ids,), eta=expires_at + timedelta(seconds=1))
+
+            transaction.on_commit(schedule)
+        return len(changed)
 
 
 class Post(models.Model):
@@ -86,7 +230,14 @@ class Post(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True, blank=True)
     content = models.TextField()
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    # Вычисляется при сохранении, списки читают его вместо content
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH + 3, blank=True, editable=False)
+    # Хранится по SHA-256 содержимого (upload_to задает только исходное имя)
+    image = models.ImageField(
+        upload_to='posts/', blank=True, null=True, storage=content_addressed_storage
+    )
+    # Карта уменьшенных копий image (см. apps.media.variants)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(
         Category,
         on_delete=models.SET_NULL,
@@ -107,6 +258,31 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     views_count = models.PositiveIntegerField(default=0)
+    unique_views = models.PositiveIntegerField(default=0)
+    unique_views_7d = models.PositiveIntegerField(default=0)
+    # Поддерживается Comment.save / CommentQuerySet.set_active / post_delete
+    active_comments_count = models.PositiveIntegerField(default=0)
+    # Материализованное состояние закрепления (см. PostManager.sync_pin_state)
+    is_effectively_pinned = models.BooleanField(default=False)
+    feed_pinned_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Окончание подписки закрепившего: после него пост не считается
+    # закрепленным, даже если флаг еще не снят
+    pin_expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Взвешенный tsvector (title - A, content - B), см. apps.main.search
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Вовлеченность с затуханием, пересчитывается задачей update_trending_scores
+    trending_score = models.FloatField(default=0, editable=False)
+    # Необязательное место поста; geo_cell - ячейка Z-order координат (apps.main.geo)
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    geo_cell = models.BigIntegerField(null=True, blank=True, editable=False)
+    # Транзакция, последней изменившая пост (триггер, apps.main.watermarks);
+    # счетчики, trending_score и search_vector его не меняют
+    change_txid = models.BigIntegerField(null=True, editable=False)
 
     objects = PostManager()
 
@@ -120,28 +296,136 @@ class Post(models.Model):
             models.Index(fields=['status', '-created_at']),
             models.Index(fields=['category', '-created_at']),
             models.Index(fields=['author', '-created_at']),
+            models.Index(fields=['status', '-unique_views']),
+            models.Index(fields=['status', '-unique_views_7d']),
+            models.Index(fields=['status', '-trending_score']),
+            models.Index(fields=['category', 'status', '-trending_score']),
+            # Дополнение трендов популярными (trending_posts, fallback_order='-views_count')
+            models.Index(
+                fields=['-views_count', '-id'],
+                name='posts_popular_idx',
+                condition=Q(status='published')
+            ),
+            models.Index(
+                fields=['category', '-views_count', '-id'],
+                name='posts_category_popular_idx',
+                condition=Q(status='published')
+            ),
+            models.Index(
+                fields=['status', '-is_effectively_pinned', 'feed_pinned_at', '-created_at', '-id'],
+                name='posts_feed_order_idx'
+            ),
+            models.Index(
+                fields=['category', '-is_effectively_pinned', 'feed_pinned_at', '-created_at', '-id'],
+                name='posts_category_feed_idx'
+            ),
+            models.Index(fields=['change_txid', 'id'], name='posts_sync_idx'),
+            # Покрывающий индекс: кандидаты поиска рядом читаются без обращения к таблице
+            models.Index(
+                fields=['geo_cell'],
+                name='posts_geo_cell_idx',
+                include=['id', 'latitude', 'longitude', 'category'],
+                condition=Q(status='published', geo_cell__isnull=False)
+            ),
+            GinIndex(fields=['search_vector'], name='posts_search_vector_gin'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='posts_title_trgm'),
         ]
 
     def __str__(self):
         return self.title
 
+    # Поля, загруженное значение которых запоминается для обработки изменений
+    TRACKED_FIELDS = ('category_id', 'status', 'title', 'slug', 'content', 'latitude', 'longitude')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self):
+        deferred = self.get_deferred_fields()
+        return {
+            field: getattr(self, field)
+            for field in self.TRACKED_FIELDS if field not in deferred
+        }
+
+    def get_loaded_values(self, *fields):
+        """Значения отслеживаемых полей на момент загрузки из БД"""
+        if self._state.adding:
+            return {}
+        loaded = getattr(self, '_loaded_values', {})
+        missing = [field for field in fields if field not in loaded]
+        if missing:
+            loaded.update(
+                type(self).objects.filter(pk=self.pk).values(*missing).first() or {}
+            )
+        return loaded
+
+    def has_changed(self, field):
+        """Изменилось ли поле с момента загрузки (отложенное поле - нет)"""
+        if self._state.adding:
+            return True
+        if field in self.get_deferred_fields():
+            return False
+        return self.get_loaded_values(field).get(field) != getattr(self, field)
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.title)
-        super().save(*args, **kwargs)
+
+        previous = self.get_loaded_values('category_id', 'status')
+        category_deltas = Counter()
+        if previous.get('status') == 'published':
+            category_deltas[previous.get('category_id')] -= 1
+        if self.status == 'published':
+            category_deltas[self.category_id] += 1
+        update_search_vector = self.has_changed('title') or self.has_changed('content')
+        if self.has_changed('content'):
+            self.excerpt = make_excerpt(self.content)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'content' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'excerpt'}
+
+        if not {'latitude', 'longitude'} & self.get_deferred_fields():
+            if self.latitude is not None and self.longitude is not None:
+                self.geo_cell = geo.cell_id(self.latitude, self.longitude)
+            else:
+                self.geo_cell = None
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+                kwargs['update_fields'] = set(update_fields) | {'geo_cell'}
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Category.objects.adjust_published_posts_count(category_deltas)
+            if update_search_vector:
+                from .search import update_search_vectors
+
+                update_search_vectors(type(self).objects.filter(pk=self.pk))
+        self._loaded_values = self._snapshot_tracked_fields()
 
     def get_absolute_url(self):
         return reverse('post-detail', kwargs={'slug': self.slug})
 
     @property
     def comments_count(self):
-        """Количество комментариев к посту"""
-        return self.comments.filter(is_active=True).count()
+        """Количество активных комментариев к посту (денормализовано)"""
+        return self.active_comments_count
     
     @property
     def is_pinned(self):
-        """Проверяет, закреплен ли пост"""
-        return hasattr(self, 'pin_info') and self.pin_info is not None
+        """
+        Проверяет, закреплен ли пост (закрепление с активной подпиской).
+        Окончание подписки проверяется при чтении - флаг снимается задачей
+        expire_post_pins с задержкой до секунды.
+        """
+        return self.is_effectively_pinned and self.has_active_pin_subscription
+
+    @property
+    def has_active_pin_subscription(self):
+        """Подписка закрепившего еще не закончилась"""
+        return self.pin_expires_at is None or self.pin_expires_at > timezone.now()
     
     @property
     def can_be_pinned_by_user(self):
@@ -174,23 +458,270 @@ class Post(models.Model):
         
         return True
 
-    def increment_views(self):
-        """Увеличивает счетчик просмотров"""
-        self.views_count += 1
-        self.save(update_fields=['views_count'])
+    def increment_views(self, visitor=None, reader_id=None):
+        """
+        Учитывает просмотр в буфере счетчиков без записи в БД.
+        Накопленные просмотры сбрасываются задачей flush_view_counts,
+        уникальные посетители (visitor) - задачей flush_unique_views,
+        авторизованные читатели (reader_id) - задачей flush_post_readers.
+        """
+        from .counters import get_view_counter
+
+        counter = get_view_counter()
+        counter.incr(self.pk)
+        if visitor:
+            counter.add_visitor(self.pk, visitor)
+        if reader_id:
+            counter.add_reader(self.pk, reader_id)
 
     def get_pinned_info(self):
         """Возвращает информацию о закреплении поста"""
         if self.is_pinned:
+            # PinnedPost.save разрешает закреплять только свои посты
             return {
                 'is_pinned': True,
-                'pinned_at': self.pin_info.pinned_at,
+                'pinned_at': self.feed_pinned_at,
                 'pinned_by': {
-                    'id': self.pin_info.user.id,
-                    'username': self.pin_info.user.username,
-                    'has_active_subscription': self.pin_info.user.subscription.is_active
-                }
+                    'id': self.author.id,
+                    'username': self.author.username,
+                    'has_active_subscription': self.has_active_pin_subscription
+                },
+                'expires_at': self.pin_expires_at,
             }
         return {'is_pinned': False}
 
-    
\ No newline at end of file
+    
+
+
+class PostEngagement(models.Model):
+    """
+    Почасовая вовлеченность поста (просмотры и новые комментарии).
+    Заполняется apps.main.trending.record_engagement, читается при
+    пересчете trending_score.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='engagement'
+    )
+    bucket = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+    comments = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'post_engagement'
+        verbose_name = 'Post Engagement'
+        verbose_name_plural = 'Post Engagement'
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'bucket'], name='post_engagement_post_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket']),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} @ {self.bucket:%Y-%m-%d %H:00}'
+
+
+class PostNeighbours(models.Model):
+    """
+    Предрассчитанные соседи поста для рекомендаций: список
+    [[post_id, score], ...] по убыванию score. Одна строка на (пост, вид),
+    эндпоинт читает ее по ключу.
+    """
+    KIND_CONTENT = 'content'
+    KIND_CO_ENGAGEMENT = 'co_engagement'
+    KIND_CHOICES = [
+        (KIND_CONTENT, 'Similar content'),
+        (KIND_CO_ENGAGEMENT, 'Readers also engaged with'),
+    ]
+
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='neighbours'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    neighbours = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'post_neighbours'
+        verbose_name = 'Post Neighbours'
+        verbose_name_plural = 'Post Neighbours'
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'kind'], name='post_neighbours_post_kind'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} neighbours of {self.post_id}'
+
+
+class PostReader(models.Model):
+    """
+    Авторизованный пользователь, читавший пост. Вместе с комментариями
+    используется рекомендациями "читатели этого поста также читали".
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='readers'
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='read_posts'
+    )
+    first_seen_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField()
+    # Транзакция, добавившая строку (триггер, apps.main.watermarks);
+    # обновление last_seen_at его не меняет
+    change_txid = models.BigIntegerField(null=True, editable=False)
+
+    class Meta:
+        db_table = 'post_readers'
+        verbose_name = 'Post Reader'
+        verbose_name_plural = 'Post Readers'
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'user'], name='post_readers_post_user'),
+        ]
+        indexes = [
+            models.Index(fields=['first_seen_at']),
+            models.Index(fields=['change_txid'], name='post_readers_txid_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} read {self.post_id}'
+
+
+class RecommendationArtifact(models.Model):
+    """
+    Текущая версия файла рекомендательного индекса в общем хранилище
+    (apps.main.artifacts): все воркеры читают одну версию. Новая версия
+    пишется под новым именем, строка переключается в транзакции.
+    state - служебные отметки сборки (например, водяные знаки).
+    """
+    name = models.CharField(max_length=50, unique=True)
+    file = models.FileField(upload_to='recommendations/')
+    built_at = models.DateTimeField()
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'recommendation_artifacts'
+        verbose_name = 'Recommendation artifact'
+        verbose_name_plural = 'Recommendation artifacts'
+
+    def __str__(self):
+        return self.name
+
+
+class RelatedPostUpdate(models.Model):
+    """
+    Очередь постов на инкрементальный пересчет похожих постов
+    (apps.main.related.process_queue). Без внешнего ключа: удаленный пост
+    тоже нужно убрать из индекса.
+    """
+    post_id = models.PositiveBigIntegerField(unique=True)
+    queued_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'related_post_updates'
+        verbose_name = 'Related post update'
+        verbose_name_plural = 'Related post updates'
+
+    def __str__(self):
+        return str(self.post_id)
+
+
+class Tombstone(models.Model):
+    """
+    Запись об удаленном объекте для синхронизации клиентов (apps.main.sync).
+    Создается сигналами post_delete постов, категорий и комментариев.
+    """
+    KIND_POST = 'post'
+    KIND_CATEGORY = 'category'
+    KIND_COMMENT = 'comment'
+    KIND_CHOICES = [
+        (KIND_POST, 'Post'),
+        (KIND_CATEGORY, 'Category'),
+        (KIND_COMMENT, 'Comment'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    # Транзакция удаления (триггер, apps.main.watermarks)
+    change_txid = models.BigIntegerField(null=True, editable=False)
+
+    class Meta:
+        db_table = 'sync_tombstones'
+        verbose_name = 'Tombstone'
+        verbose_name_plural = 'Tombstones'
+        indexes = [
+            models.Index(fields=['deleted_at'], name='sync_tombstones_deleted_idx'),
+            models.Index(fields=['change_txid', 'id'], name='sync_tombstones_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} #{self.object_id} deleted at {self.deleted_at}'
+
+
+class CategoryBundle(models.Model):
+    """
+    Офлайн-пакет категории (apps.main.bundles): zip-архив с постами,
+    изображениями и комментариями. manifest - манифест текущей версии с
+    отпечатками постов для инкрементальной пересборки.
+    """
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        related_name='bundle'
+    )
+    version = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to='bundles/')
+    size = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64)
+    manifest = models.JSONField(default=dict)
+    built_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'category_bundles'
+        verbose_name = 'Category bundle'
+        verbose_name_plural = 'Category bundles'
+
+    def __str__(self):
+        return f'{self.category_id} v{self.version}'
+
+
+class MapTile(models.Model):
+    """
+    Кластеры геотегированных постов тайла карты (apps.main.map_tiles).
+    clusters - компактный список [ячейка, число постов, широта, долгота,
+    счет, id, slug, заголовок представителя].
+    """
+    zoom = models.PositiveSmallIntegerField()
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    clusters = models.JSONField(default=list)
+    # Время пометки к пересборке, None - тайл актуален
+    dirty_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'map_tiles'
+        verbose_name = 'Map tile'
+        verbose_name_plural = 'Map tiles'
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'x', 'y'], name='map_tiles_zoom_x_y'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['dirty_at'],
+                name='map_tiles_dirty_idx',
+                condition=Q(dirty_at__isnull=False)
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.zoom}/{self.x}/{self.y}'
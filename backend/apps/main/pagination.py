@@ -0,0 +1,173 @@
+"""
+Keyset (cursor) пагинация ленты постов с закрепленными постами первыми.
+
+В отличие от PageNumberPagination не выполняет COUNT(*) и OFFSET:
+каждая страница - это WHERE (позиция) > (курсор) ORDER BY ... LIMIT n.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class FeedCursorPagination(BasePagination):
+    """
+    Курсорная пагинация в порядке ленты: сначала закрепленные посты по
+    времени закрепления, затем остальные по -created_at.
+
+    Непрозрачный курсор кодирует позицию последней строки страницы:
+    (is_effectively_pinned, ключ сортировки, id), где ключ сортировки -
+    время закрепления и время создания поста.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor'
+
+    # (поле, по убыванию, NULL в конце)
+    ordering = (
+        ('is_effectively_pinned', True, False),
+        ('feed_pinned_at', False, True),
+        ('created_at', True, False),
+        ('id', True, False),
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(request)
+
+        if position is not None:
+            queryset = queryset.filter(self._after(position, reverse))
+        queryset = queryset.order_by(*self._order_by(reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def _order_by(self, reverse):
+        expressions = []
+        for field, descending, nulls_last in self.ordering:
+            descending = descending != reverse
+            nulls = {'nulls_last': True} if nulls_last != reverse else {'nulls_first': True}
+            expression = F(field).desc(**nulls) if descending else F(field).asc(**nulls)
+            expressions.append(expression)
+        return expressions
+
+    def _after(self, position, reverse):
+        """Условие "строка идет после позиции" для (обратного) порядка"""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (field, descending, nulls_last), value in zip(self.ordering, position):
+            descending = descending != reverse
+            nulls_last = nulls_last != reverse
+            if value is None:
+                beyond = Q(**{f'{field}__isnull': False}) if not nulls_last else Q(pk__in=[])
+                same = Q(**{f'{field}__isnull': True})
+            else:
+                lookup = 'lt' if descending else 'gt'
+                beyond = Q(**{f'{field}__{lookup}': value})
+                if nulls_last:
+                    beyond |= Q(**{f'{field}__isnull': True})
+                same = Q(**{field: value})
+            condition |= equal & beyond
+            equal &= same
+        return condition
+
+    def _position(self, instance):
+        return [getattr(instance, field) for field, _, _ in self.ordering]
+
+    def encode_cursor(self, position, reverse):
+        payload = {
+            'p': [value.isoformat() if isinstance(value, datetime) else value for value in position],
+        }
+        if reverse:
+            payload['r'] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, separators=(',', ':')).encode()
+        ).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode())
+            raw = payload['p']
+            if len(raw) != len(self.ordering):
+                raise ValueError
+            flag, pinned_at, created_at, pk = raw
+            position = [
+                bool(flag),
+                parse_datetime(pinned_at) if pinned_at else None,
+                parse_datetime(created_at),
+                int(pk),
+            ]
+            if position[2] is None:
+                raise ValueError
+        except (TypeError, ValueError, KeyError, UnicodeDecodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(payload.get('r'))
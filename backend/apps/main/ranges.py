@@ -0,0 +1,110 @@
+"""
+Отдача файлов с поддержкой HTTP Range: клиент докачивает прерванную
+загрузку с нужного байта.
+
+Поддерживается один диапазон - bytes=a-b, bytes=a- или bytes=-n; запрос
+нескольких диапазонов получает файл целиком (это допускает RFC 9110).
+If-Range сравнивается с сильным ETag или Last-Modified: если файл
+сменился, диапазон игнорируется и отдается новая версия целиком.
+"""
+import re
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+RANGE_CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    (start, end) включительно для заголовка Range или None, если диапазон
+    не задан или не поддерживается. RangeNotSatisfiable - диапазон за
+    пределами файла.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-n - последние n байт
+        length = int(last)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - length, 0), size - 1
+    start = int(first)
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = min(int(last), size - 1) if last else size - 1
+    if end < start:
+        return None
+    return start, end
+
+
+def range_applies(request, etag, last_modified):
+    """Можно ли отдать диапазон: If-Range отсутствует или совпадает с файлом"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith('W/'):
+        # Для If-Range допустимо только сильное сравнение
+        return False
+    return if_range == etag or if_range == http_date(last_modified)
+
+
+def iter_file(fileobj, start, length, chunk_size=RANGE_CHUNK_SIZE):
+    """Байты файла от start длиной length; файл закрывается в конце"""
+    try:
+        fileobj.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fileobj.read(min(chunk_size, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def ranged_file_response(request, fileobj, size, etag, last_modified, content_type):
+    """
+    Ответ 200 / 206 / 304 / 416 для открытого файла fileobj размером size.
+    etag - сильный ETag файла, last_modified - timestamp. Файл закрывается,
+    если тело не отдается, иначе - после отдачи.
+    """
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        try:
+            byte_range = None
+            if range_applies(request, etag, last_modified):
+                byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        else:
+            start, end = byte_range or (0, size - 1)
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                iter_file(fileobj, start, length),
+                content_type=content_type,
+                status=206 if byte_range else 200
+            )
+            response['Content-Length'] = length
+            if byte_range:
+                response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    if not response.streaming:
+        fileobj.close()
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,373 @@
+"""
+Похожие посты ("ещё по теме") на TF-IDF векторах.
+
+Пакетная сборка (build_related_posts / задача rebuild_related_posts)
+строит разреженную матрицу TF-IDF по заголовку, тексту и категории
+опубликованных постов, находит top-k соседей каждого поста и сохраняет
+их в post_neighbours (kind='content'). Словарь, idf, векторы и соседи
+сохраняются артефактом в общем хранилище (apps.main.artifacts), чтобы
+после изменения постов пересчитывать только их строки и строки
+затронутых ими постов. Новые слова попадают в словарь при следующей
+полной сборке.
+
+Измененные посты ставятся в очередь related_post_updates, задача
+update_related_posts обрабатывает ее пачками через RELATED_DEBOUNCE секунд:
+индекс читается и записывается один раз на пачку, а не на каждую правку.
+"""
+import math
+import re
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import artifacts
+from .models import Post, PostNeighbours, RelatedPostUpdate
+from .similarity import l2_normalize, top_k_similar
+
+
+KIND = PostNeighbours.KIND_CONTENT
+ARTIFACT_NAME = 'content_index'
+PENDING_KEY = 'related-posts:pending'
+# Задержка пересчета после изменения поста, секунды
+RELATED_DEBOUNCE = 60
+# Постов из очереди за один запуск задачи
+UPDATE_BATCH_SIZE = 1000
+
+TITLE_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+# Ограничения словаря применяются, начиная с этого числа постов
+MIN_CORPUS_FOR_DF_LIMITS = 100
+MIN_DF = 2
+MAX_DF_RATIO = 0.5
+MAX_FEATURES = 100_000
+STORE_BATCH_SIZE = 500
+
+TOKEN_RE = re.compile(r'[^\W\d_]{2,}')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def post_terms(title, content, category_id):
+    """Взвешенные частоты термов поста; категория - отдельный терм"""
+    counts = Counter()
+    for token in tokenize(title):
+        counts[token] += TITLE_WEIGHT
+    counts.update(tokenize(content))
+    if category_id is not None:
+        counts[f'category:{category_id}'] += CATEGORY_WEIGHT
+    return counts
+
+
+class ContentIndex:
+    """
+    Словарь, idf, нормализованные векторы постов и их соседи.
+    neighbours/scores хранят номера строк (-1 - пусто): строки не
+    сдвигаются при инкрементальных обновлениях, снятый с публикации пост
+    получает нулевой вектор.
+    """
+
+    def __init__(self, post_ids, vectors, terms, idf, neighbours, scores):
+        self.post_ids = np.asarray(post_ids, dtype=np.int64)
+        self.vectors = sparse.csr_matrix(vectors, dtype=np.float32)
+        self.terms = np.asarray(terms, dtype=str)
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.neighbours = np.asarray(neighbours, dtype=np.int64)
+        self.scores = np.asarray(scores, dtype=np.float32)
+        self.positions = {int(post_id): row for row, post_id in enumerate(self.post_ids)}
+        self.vocabulary = {term: column for column, term in enumerate(self.terms)}
+
+    @property
+    def k(self):
+        return self.neighbours.shape[1]
+
+    def vectorize(self, counts):
+        """Нормализованный вектор 1 x V; термы вне словаря игнорируются"""
+        columns, values = [], []
+        for term, count in counts.items():
+            column = self.vocabulary.get(term)
+            if column is not None:
+                columns.append(column)
+                values.append((1 + math.log(count)) * self.idf[column])
+        vector = sparse.csr_matrix(
+            (values, ([0] * len(columns), columns)),
+            shape=(1, len(self.terms)),
+            dtype=np.float32
+        )
+        return l2_normalize(vector)
+
+    def set_vectors(self, vectors):
+        """
+        Заменяет (или добавляет) векторы постов {post_id: вектор 1 x V}
+        одной перестройкой матрицы, возвращает номера их строк.
+        """
+        added = [post_id for post_id in vectors if post_id not in self.positions]
+        if added:
+            start = len(self.post_ids)
+            self.post_ids = np.append(self.post_ids, added)
+            self.neighbours = np.vstack([self.neighbours, np.full((len(added), self.k), -1)])
+            self.scores = np.vstack([
+                self.scores, np.zeros((len(added), self.k), dtype=np.float32)
+            ])
+            for offset, post_id in enumerate(added):
+                self.positions[post_id] = start + offset
+            self.vectors = sparse.vstack([
+                self.vectors,
+                sparse.csr_matrix((len(added), len(self.terms)), dtype=np.float32)
+            ], format='csr')
+
+        rows = np.array([self.positions[post_id] for post_id in vectors], dtype=np.int64)
+        keep = np.ones(len(self.post_ids), dtype=np.float32)
+        keep[rows] = 0
+        # Строка i матрицы placement берет i-ю строку replacement
+        placement = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, np.arange(len(rows)))),
+            shape=(len(self.post_ids), len(rows))
+        )
+        replacement = sparse.vstack(list(vectors.values()), format='csr')
+        self.vectors = (sparse.diags(keep) @ self.vectors + placement @ replacement).tocsr()
+        self.vectors.eliminate_zeros()
+        return rows
+
+    def refresh_rows(self, rows):
+        """Пересчитывает соседей для строк rows"""
+        rows = np.asarray(sorted(rows), dtype=np.int64)
+        if len(rows):
+            neighbours, scores = top_k_similar(self.vectors, self.k, rows)
+            self.neighbours[rows] = neighbours
+            self.scores[rows] = scores
+        return rows
+
+    def neighbour_lists(self, rows):
+        """{post_id: [[post_id, score], ...]} для строк rows"""
+        result = {}
+        for row in rows:
+            result[int(self.post_ids[row])] = [
+                [int(self.post_ids[neighbour]), round(float(score), 4)]
+                for neighbour, score in zip(self.neighbours[row], self.scores[row])
+                if neighbour >= 0
+            ]
+        return result
+
+    def save(self, built_at=None):
+        """Сохраняет индекс новой версией артефакта"""
+        artifacts.save(ARTIFACT_NAME, {
+            'post_ids': self.post_ids,
+            'data': self.vectors.data,
+            'indices': self.vectors.indices,
+            'indptr': self.vectors.indptr,
+            'shape': np.asarray(self.vectors.shape),
+            'terms': self.terms,
+            'idf': self.idf,
+            'neighbours': self.neighbours,
+            'scores': self.scores,
+        }, built_at or timezone.now())
+
+    @classmethod
+    def load(cls):
+        """Загружает индекс или возвращает None, если он еще не собран"""
+        data, _ = artifacts.load(ARTIFACT_NAME)
+        if data is None:
+            return None
+        vectors = sparse.csr_matrix(
+            (data['data'], data['indices'], data['indptr']),
+            shape=tuple(data['shape'])
+        )
+        return cls(
+            data['post_ids'], vectors, data['terms'], data['idf'],
+            data['neighbours'], data['scores']
+        )
+
+
+def build_index(k=None):
+    """Строит индекс по всем опубликованным постам"""
+    k = k or settings.RELATED_POSTS_K
+    post_ids, documents = [], []
+    document_frequency = Counter()
+    rows = Post.objects.filter(status='published').order_by('id').values_list(
+        'id', 'title', 'content', 'category_id'
+    )
+    for post_id, title, content, category_id in rows.iterator(chunk_size=1000):
+        counts = post_terms(title, content, category_id)
+        post_ids.append(post_id)
+        documents.append(counts)
+        document_frequency.update(counts.keys())
+
+    total = len(documents)
+    candidates = document_frequency.items()
+    if total >= MIN_CORPUS_FOR_DF_LIMITS:
+        max_df = MAX_DF_RATIO * total
+        candidates = [
+            (term, df) for term, df in candidates
+            if df >= MIN_DF and (df <= max_df or term.startswith('category:'))
+        ]
+    terms = sorted(
+        term for term, _ in sorted(candidates, key=lambda item: -item[1])[:MAX_FEATURES]
+    )
+    vocabulary = {term: column for column, term in enumerate(terms)}
+    idf = np.array([
+        math.log((1 + total) / (1 + document_frequency[term])) + 1 for term in terms
+    ], dtype=np.float32)
+
+    row_ids, columns, values = [], [], []
+    for row, counts in enumerate(documents):
+        for term, count in counts.items():
+            column = vocabulary.get(term)
+            if column is not None:
+                row_ids.append(row)
+                columns.append(column)
+                values.append(1 + math.log(count))
+    vectors = sparse.csr_matrix(
+        (values, (row_ids, columns)), shape=(total, len(terms)), dtype=np.float32
+    ) @ sparse.diags(idf)
+    vectors = l2_normalize(vectors)
+
+    neighbours, scores = top_k_similar(vectors, k)
+    return ContentIndex(post_ids, vectors, terms, idf, neighbours, scores)
+
+
+def store_neighbours(neighbour_lists, kind=KIND):
+    """Сохраняет {post_id: [[post_id, score], ...]} в post_neighbours"""
+    PostNeighbours.objects.bulk_create(
+        [
+            PostNeighbours(post_id=post_id, kind=kind, neighbours=neighbours)
+            for post_id, neighbours in neighbour_lists.items()
+        ],
+        batch_size=STORE_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['post', 'kind'],
+        update_fields=['neighbours', 'updated_at']
+    )
+
+
+def rebuild(k=None):
+    """Полная сборка индекса и таблицы соседей"""
+    started = timezone.now()
+    index = build_index(k)
+    with transaction.atomic():
+        store_neighbours(index.neighbour_lists(range(len(index.post_ids))))
+        PostNeighbours.objects.filter(kind=KIND).exclude(
+            post_id__in=index.post_ids.tolist()
+        ).delete()
+        # Изменения до начала сборки уже учтены
+        RelatedPostUpdate.objects.filter(queued_at__lt=started).delete()
+    index.save(started)
+    return index
+
+
+def update_posts(post_ids):
+    """
+    Инкрементально обновляет соседей после сохранения/удаления постов:
+    строки самих постов, строки, в списках которых они были, и строки,
+    в которые они теперь проходят по score. Возвращает число обновленных
+    постов или None, если индекс еще не собран.
+    """
+    index = ContentIndex.load()
+    if index is None:
+        return None
+
+    published = {
+        post_id: (title, content, category_id)
+        for post_id, title, content, category_id in Post.objects.filter(
+            pk__in=list(post_ids), status='published'
+        ).values_list('id', 'title', 'content', 'category_id')
+    }
+    targets = sorted(
+        post_id for post_id in set(post_ids)
+        if post_id in published or post_id in index.positions
+    )
+    if not targets:
+        return 0
+    rows = index.set_vectors({
+        post_id: index.vectorize(post_terms(*published[post_id]) if post_id in published else {})
+        for post_id in targets
+    })
+
+    # Сходство всех строк с измененными - разреженное n x len(rows)
+    similarities = (index.vectors @ index.vectors[rows].T).tocoo()
+    threshold = index.scores[:, -1] if index.k else np.ones(len(index.post_ids))
+    passes = (similarities.data > threshold[similarities.row]) & (
+        similarities.row != rows[similarities.col]
+    )
+    affected = set(similarities.row[passes].tolist())
+    affected |= set(np.flatnonzero(np.isin(index.neighbours, rows).any(axis=1)).tolist())
+    affected |= set(rows.tolist())
+    refreshed = index.refresh_rows(affected)
+
+    lists = index.neighbour_lists(refreshed)
+    removed = [post_id for post_id in targets if post_id not in published]
+    with transaction.atomic():
+        for post_id in removed:
+            lists.pop(post_id, None)
+        PostNeighbours.objects.filter(post_id__in=removed, kind=KIND).delete()
+        existing = set(Post.objects.filter(id__in=list(lists)).values_list('id', flat=True))
+        store_neighbours({
+            neighbour_post_id: neighbours
+            for neighbour_post_id, neighbours in lists.items()
+            if neighbour_post_id in existing
+        })
+    index.save()
+    return len(lists)
+
+
+def queue_update(post_id):
+    """
+    Ставит пост в очередь пересчета (в текущей транзакции) и планирует
+    задачу через RELATED_DEBOUNCE секунд после коммита.
+    """
+    RelatedPostUpdate.objects.bulk_create(
+        [RelatedPostUpdate(post_id=post_id, queued_at=timezone.now())],
+        update_conflicts=True,
+        unique_fields=['post_id'],
+        update_fields=['queued_at']
+    )
+    schedule_update()
+
+
+def schedule_update(countdown=RELATED_DEBOUNCE):
+    """Планирует обработку очереди; пока она запланирована, не дублирует ее"""
+    def enqueue():
+        if cache.add(PENDING_KEY, 1, RELATED_DEBOUNCE * 10):
+            from .tasks import update_related_posts
+
+            update_related_posts.apply_async(countdown=countdown)
+
+    transaction.on_commit(enqueue)
+
+
+def process_queue(limit=UPDATE_BATCH_SIZE):
+    """
+    Пересчитывает до limit постов из очереди.
+    Возвращает (число обновленных постов или None, осталось ли что-то в очереди).
+    """
+    queued = list(
+        RelatedPostUpdate.objects.order_by('queued_at').values_list('post_id', 'queued_at')[:limit]
+    )
+    if not queued:
+        return 0, False
+    updated = update_posts([post_id for post_id, _ in queued])
+    if updated is None:
+        # Индекс еще не собран - очередь разберет полная сборка
+        return None, False
+    # Посты, снова измененные во время пересчета, остаются в очереди
+    RelatedPostUpdate.objects.filter(
+        post_id__in=[post_id for post_id, _ in queued],
+        queued_at__lte=max(queued_at for _, queued_at in queued)
+    ).delete()
+    return updated, RelatedPostUpdate.objects.exists()
+
+
+def get_neighbour_posts(post_id, queryset, limit, kind=KIND):
+    """Опубликованные соседи поста из post_neighbours в порядке score"""
+    neighbours = PostNeighbours.objects.filter(
+        post_id=post_id, kind=kind
+    ).values_list('neighbours', flat=True).first() or []
+    ids = [neighbour_id for neighbour_id, _ in neighbours][:limit]
+    found = queryset.filter(status='published').in_bulk(ids)
+    return [found[neighbour_id] for neighbour_id in ids if neighbour_id in found]
@@ -0,0 +1,204 @@
+"""
+Версионированный кэш ответов для публичных лент и списков.
+
+Ключ ответа включает имя эндпоинта, схему и хост запроса (в ответах
+абсолютные ссылки - курсоры next/previous, изображения), параметры
+запроса и текущие версии областей (scope), от которых зависит ответ.
+Сохранение Post, PinnedPost, Category или Subscription увеличивает
+версию своей области (см.
+apps.main.signals), поэтому устаревшие записи больше никогда не читаются
+и просто вытесняются по таймауту.
+
+Счетчики просмотров меняются каждую минуту у многих постов, поэтому у
+каждого поста своя версия счетчиков (post_counter_scope). Сериализаторы
+отмечают в запросе посты, счетчики которых попали в ответ
+(track_counter_posts); кэш ответов хранит их вместе с данными, а
+валидаторы условных запросов (apps.main.conditional) учитывают версии
+только этих постов.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+
+SCOPE_POSTS = 'posts'
+SCOPE_PINS = 'pins'
+SCOPE_CATEGORIES = 'categories'
+SCOPE_SUBSCRIPTIONS = 'subscriptions'
+# Пересчет трендовых счетов (задача update_trending_scores)
+SCOPE_TRENDING = 'trending'
+# Пересчет похожих постов и рекомендаций (post_neighbours)
+SCOPE_RELATED = 'related'
+# Счетчики просмотров (сброс буфера) и число комментариев. Кэш ответов от
+# них не зависит (он живет DEFAULT_TIMEOUT), их учитывают валидаторы
+# условных запросов (apps.main.conditional). SCOPE_COUNTERS меняется при
+# любом изменении просмотров - от нее зависят только списки, отсортированные
+# по ним; остальные ответы - от версий счетчиков своих постов
+SCOPE_COUNTERS = 'counters'
+SCOPE_COMMENTS = 'comments'
+# Заголовки, слаги и статус постов, названия категорий - подсказки
+# автодополнения (apps.main.suggest). Не меняется при сбросе счетчиков и
+# прочих сохранениях поста
+SCOPE_TITLES = 'titles'
+
+# Области, от которых зависит любой список постов
+POST_LIST_SCOPES = (SCOPE_POSTS, SCOPE_PINS, SCOPE_CATEGORIES, SCOPE_SUBSCRIPTIONS)
+TRENDING_LIST_SCOPES = POST_LIST_SCOPES + (SCOPE_TRENDING,)
+RELATED_LIST_SCOPES = POST_LIST_SCOPES + (SCOPE_RELATED,)
+
+DEFAULT_TIMEOUT = 60
+
+
+def _version_key(scope):
+    return f'scope-version:{scope}'
+
+
+def _initial_version():
+    # Если ключ версии вытеснен, новая версия не совпадет ни с одной старой
+    return time.time_ns() // 1000
+
+
+def get_scope_versions(scopes):
+    """Возвращает {scope: версия}, инициализируя отсутствующие версии"""
+    keys = {_version_key(scope): scope for scope in scopes}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for key, scope in keys.items():
+        if key not in found:
+            cache.add(key, _initial_version(), None)
+            found[key] = cache.get(key)
+        versions[scope] = found[key]
+    return versions
+
+
+def post_counter_scope(post_id):
+    """Область счетчиков просмотров одного поста"""
+    return f'{SCOPE_COUNTERS}:{post_id}'
+
+
+def bump_post_counters(post_ids):
+    """
+    Меняет версии счетчиков постов post_ids и SCOPE_COUNTERS после
+    коммита: одна запись set_many вместо incr на каждый пост
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return
+
+    def bump():
+        version = _initial_version()
+        cache.set_many(
+            {_version_key(post_counter_scope(post_id)): version for post_id in post_ids},
+            None
+        )
+
+    transaction.on_commit(bump)
+    bump_scope_versions(SCOPE_COUNTERS)
+
+
+def track_counter_posts(request, post_ids):
+    """Отмечает посты, счетчики которых попали в ответ на request"""
+    request = getattr(request, '_request', request)
+    if not hasattr(request, 'counter_post_ids'):
+        request.counter_post_ids = set()
+    request.counter_post_ids.update(post_ids)
+
+
+def tracked_counter_posts(request):
+    """Посты, отмеченные track_counter_posts при подготовке ответа"""
+    return getattr(getattr(request, '_request', request), 'counter_post_ids', set())
+
+
+def bump_scope_versions(*scopes):
+    """Увеличивает версии областей после коммита текущей транзакции"""
+    def bump():
+        for scope in scopes:
+            key = _version_key(scope)
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, _initial_version(), None)
+
+    transaction.on_commit(bump)
+
+
+def build_cache_key(name, request, scopes, extra=None):
+    """Ключ ответа: эндпоинт + хост + параметры запроса + версии областей"""
+    versions = get_scope_versions(scopes)
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    raw = repr((
+        request.scheme, request.get_host(), params,
+        sorted((extra or {}).items()), sorted(versions.items())
+    ))
+    # v2 - записи вида {'data', 'counter_posts'}
+    return f'response:v2:{name}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def _cache_set(key, request, response, timeout):
+    # Вместе с данными - посты со счетчиками для валидаторов ответа из кэша
+    cache.set(key, {
+        'data': response.data,
+        'counter_posts': sorted(tracked_counter_posts(request)),
+    }, timeout)
+
+
+def _cached_response(request, cached):
+    track_counter_posts(request, cached['counter_posts'])
+    return Response(cached['data'])
+
+
+def cache_response(scopes, timeout=DEFAULT_TIMEOUT, anonymous_only=False):
+    """
+    Декоратор для функций-представлений DRF (ставится под @api_view).
+    anonymous_only=True - аутентифицированные пользователи идут мимо кэша.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET' or (
+                anonymous_only and request.user.is_authenticated
+            ):
+                return view_func(request, *args, **kwargs)
+
+            key = build_cache_key(view_func.__name__, request, scopes, kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                return _cached_response(request, cached)
+
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                _cache_set(key, request, response, timeout)
+            return response
+        return wrapper
+    return decorator
+
+
+class CachedListMixin:
+    """
+    Кэширование list() для generic-представлений.
+    Аутентифицированные пользователи (видят свои черновики) идут мимо кэша.
+    """
+    cache_scopes = POST_LIST_SCOPES
+    cache_timeout = DEFAULT_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+
+        key = build_cache_key(type(self).__name__, request, self.cache_scopes, kwargs)
+        cached = cache.get(key)
+        if cached is not None:
+            return _cached_response(request, cached)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            _cache_set(key, request, response, self.cache_timeout)
+        return response
@@ -0,0 +1,93 @@
+"""
+Полнотекстовый поиск по постам на PostgreSQL.
+
+posts.search_vector хранит взвешенный tsvector (заголовок - вес A,
+текст - вес B) и индексируется GIN-индексом. Вектор обновляется в
+Post.save, для старых записей - командой rebuild_search_vectors.
+"""
+from django.conf import settings
+from django.db.models import F
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+
+
+def search_vector_expression():
+    """Выражение для вычисления posts.search_vector"""
+    return (
+        SearchVector('title', weight='A', config=settings.SEARCH_CONFIG)
+        + SearchVector('content', weight='B', config=settings.SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset):
+    """Пересчитывает search_vector для постов queryset одним UPDATE"""
+    return queryset.update(search_vector=search_vector_expression())
+
+
+def build_search_query(text):
+    """Запрос в синтаксисе веб-поиска: слова, "фразы", -исключения, or"""
+    return SearchQuery(text, search_type='websearch', config=settings.SEARCH_CONFIG)
+
+
+def ranked_search(queryset, text):
+    """Посты, подходящие под запрос, по убыванию релевантности"""
+    query = build_search_query(text)
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-created_at', '-id')
+
+
+def attach_highlights(posts, text):
+    """
+    Добавляет постам страницы title_highlight и snippet.
+    ts_headline дорогой, поэтому считается только для выбранной страницы.
+    """
+    posts = list(posts)
+    if not posts:
+        return posts
+    query = build_search_query(text)
+    options = {
+        'config': settings.SEARCH_CONFIG,
+        'start_sel': HIGHLIGHT_START,
+        'stop_sel': HIGHLIGHT_STOP,
+    }
+    model = type(posts[0])
+    highlights = {
+        row['id']: row for row in model._default_manager.filter(
+            id__in=[post.id for post in posts]
+        ).annotate(
+            title_highlight=SearchHeadline('title', query, highlight_all=True, **options),
+            snippet=SearchHeadline(
+                'content', query, min_words=15, max_words=35, max_fragments=2, **options
+            )
+        ).values('id', 'title_highlight', 'snippet')
+    }
+    for post in posts:
+        row = highlights.get(post.id, {})
+        post.title_highlight = row.get('title_highlight', post.title)
+        post.snippet = row.get('snippet', '')
+    return posts
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    Замена rest_framework.filters.SearchFilter для постов: ?search=
+    ищет по search_vector (GIN-индекс) вместо ILIKE '%term%'.
+    """
+    search_param = api_settings.SEARCH_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return queryset.filter(search_vector=build_search_query(text))
@@ -1,26 +1,56 @@
 from rest_framework import serializers
+from django.db import models
 from django.utils.text import slugify
 from .models import Category, Post
- 
+from .counters import apply_pending_views
+from .response_cache import track_counter_posts
+from .sparse import SparseFieldsMixin
+from apps.media.fields import ImageVariantsField, image_variants
+
+
+class PostListWithViewsSerializer(serializers.ListSerializer):
+    """Список постов с учетом еще не сброшенных просмотров"""
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        apply_pending_views(posts)
+        return super().to_representation(posts)
+
+
+class TrackedCountersMixin:
+    """
+    Отмечает в запросе посты, счетчики просмотров которых попали в ответ
+    (валидаторы apps.main.conditional)
+    """
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        if request is not None:
+            track_counter_posts(request, (instance.pk,))
+        return super().to_representation(instance)
+
 
 class CategorySerializer(serializers.ModelSerializer):
     """Сериализатор для категорий"""
-    posts_count = serializers.SerializerMethodField()
+    posts_count = serializers.ReadOnlyField(source='published_posts_count')
 
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug', 'description', 'posts_count', 'created_at']
         read_only_fields = ['slug', 'created_at']
 
-    def get_posts_count(self, obj):
-        return obj.posts.filter(status='published').count()
-    
     def create(self, validated_data):
         validated_data['slug'] = slugify(validated_data['name'])
         return super().create(validated_data)
     
-class PostListSerializer(serializers.ModelSerializer):
-    """Сериализатор для списка постов"""
+class PostListSerializer(TrackedCountersMixin, SparseFieldsMixin, serializers.ModelSerializer):
+    """
+    Сериализатор для списка постов.
+    content - сохраненный отрывок (excerpt), полный текст отдается только
+    PostDetailSerializer, поэтому списки загружают посты с defer('content').
+    """
+    content = serializers.CharField(source='excerpt', read_only=True)
+    image_variants = ImageVariantsField('image')
     author = serializers.StringRelatedField()
     category = serializers.StringRelatedField()
     comments_count = serializers.ReadOnlyField()
@@ -30,25 +60,56 @@ class PostListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = [
-            'id', 'title', 'slug', 'content', 'image', 'category',
-            'author', 'status', 'created_at', 'updated_at',
-            'views_count', 'comments_count', 'is_pinned', 'pinned_info'
+            'id', 'title', 'slug', 'content', 'image', 'image_variants', 'category',
+            'author', 'status', 'latitude', 'longitude', 'created_at', 'updated_at',
+            'views_count', 'unique_views', 'unique_views_7d', 'trending_score',
+            'comments_count', 'is_pinned', 'pinned_info'
+        ]
+        read_only_fields = [
+            'slug', 'author', 'views_count', 'unique_views', 'unique_views_7d',
+            'trending_score'
         ]
-        read_only_fields = ['slug', 'author', 'views_count']
+        list_serializer_class = PostListWithViewsSerializer
+        # Колонки для вычисляемых полей (см. apps.main.sparse)
+        sparse_sources = {
+            'content': ('excerpt',),
+            'image_variants': ('image', 'image_variants'),
+            'author': ('author__email',),
+            'category': ('category__name',),
+            'comments_count': ('active_comments_count',),
+            'is_pinned': ('is_effectively_pinned', 'pin_expires_at'),
+            'pinned_info': (
+                'is_effectively_pinned', 'feed_pinned_at', 'pin_expires_at',
+                'author__id', 'author__username'
+            ),
+        }
 
     def get_pinned_info(self, obj):
         """Возвращает информацию о закреплении"""
         return obj.get_pinned_info()
-
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        # Обрезаем контент для списка
-        if len(data['content']) > 200:
-            data['content'] = data['content'][:200] + '...'
-        return data
     
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostSearchResultSerializer(PostListSerializer):
+    """Результат полнотекстового поиска с релевантностью и подсветкой"""
+    rank = serializers.FloatField(read_only=True)
+    title_highlight = serializers.CharField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta(PostListSerializer.Meta):
+        fields = PostListSerializer.Meta.fields + ['rank', 'title_highlight', 'snippet']
+
+
+class PostNearbySerializer(PostListSerializer):
+    """Пост рядом с точкой: расстояние до нее в километрах"""
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(PostListSerializer.Meta):
+        fields = PostListSerializer.Meta.fields + ['distance_km']
+        sparse_sources = {**PostListSerializer.Meta.sparse_sources, 'distance_km': ()}
+
+
+class PostDetailSerializer(TrackedCountersMixin, SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для детального просмотра поста"""
+    image_variants = ImageVariantsField('image')
     author_info = serializers.SerializerMethodField()
     category_info = serializers.SerializerMethodField()
     comments_count = serializers.ReadOnlyField()
@@ -59,12 +120,29 @@ class PostDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
         fields = [
-            'id', 'title', 'slug', 'content', 'image', 'category',
-            'category_info', 'author', 'author_info', 'status',
-            'created_at', 'updated_at', 'views_count', 'comments_count',
-            'is_pinned', 'pinned_info', 'can_pin'
+            'id', 'title', 'slug', 'content', 'image', 'image_variants', 'category',
+            'category_info', 'author', 'author_info', 'status', 'latitude', 'longitude',
+            'created_at', 'updated_at', 'views_count', 'unique_views',
+            'unique_views_7d', 'comments_count', 'is_pinned', 'pinned_info', 'can_pin'
+        ]
+        read_only_fields = [
+            'slug', 'author', 'views_count', 'unique_views', 'unique_views_7d'
         ]
-        read_only_fields = ['slug', 'author', 'views_count']
+        sparse_sources = {
+            'image_variants': ('image', 'image_variants'),
+            'author_info': (
+                'author__id', 'author__username', 'author__first_name',
+                'author__last_name', 'author__avatar', 'author__avatar_variants'
+            ),
+            'category_info': ('category__id', 'category__name', 'category__slug'),
+            'comments_count': ('active_comments_count',),
+            'is_pinned': ('is_effectively_pinned', 'pin_expires_at'),
+            'pinned_info': (
+                'is_effectively_pinned', 'feed_pinned_at', 'pin_expires_at',
+                'author__id', 'author__username'
+            ),
+            'can_pin': ('author__id', 'status'),
+        }
 
     def get_author_info(self, obj):
         author = obj.author
@@ -72,7 +150,8 @@ class PostDetailSerializer(serializers.ModelSerializer):
             'id': author.id,
             'username': author.username,
             'full_name': author.full_name,
-            'avatar': author.avatar.url if author.avatar else None
+            'avatar': author.avatar.url if author.avatar else None,
+            'avatar_variants': image_variants(author, 'avatar')
         }
     
     def get_category_info(self, obj):
@@ -95,12 +174,46 @@ class PostDetailSerializer(serializers.ModelSerializer):
         return obj.can_be_pinned_by(request.user)
 
 
+class PostBundleSerializer(PostDetailSerializer):
+    """Пост для офлайн-пакета категории: полный текст без счетчиков"""
+
+    class Meta(PostDetailSerializer.Meta):
+        fields = [
+            'id', 'title', 'slug', 'content', 'category', 'author_info',
+            'latitude', 'longitude', 'created_at', 'updated_at'
+        ]
+
+
+class PostSyncSerializer(PostDetailSerializer):
+    """
+    Пост для синхронизации клиентов (apps.main.sync): без счетчиков -
+    их изменения не попадают в поток изменений
+    """
+
+    class Meta(PostDetailSerializer.Meta):
+        fields = [
+            'id', 'title', 'slug', 'content', 'image', 'image_variants', 'category',
+            'category_info', 'author', 'author_info', 'status', 'latitude', 'longitude',
+            'created_at', 'updated_at', 'is_pinned', 'pinned_info', 'can_pin'
+        ]
+
+
 class PostCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания и обновления постов"""
     
     class Meta:
         model = Post
-        fields = ['title', 'content', 'image', 'category', 'status']
+        fields = ['title', 'content', 'image', 'category', 'status', 'latitude', 'longitude']
+
+    def validate(self, attrs):
+        # Координаты задаются и сбрасываются только парой
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError(
+                'Both latitude and longitude must be set, or neither.'
+            )
+        return attrs
 
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
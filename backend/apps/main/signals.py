@@ -0,0 +1,171 @@
+from django.db import transaction
+from django.db.models.signals import pre_delete, post_save, post_delete
+from django.db.models import Q
+from django.dispatch import receiver
+from .bundles import schedule_rebuild as schedule_bundle_rebuild
+from .home import schedule_rebuild as schedule_home_rebuild
+from .map_tiles import mark_dirty as mark_map_tiles_dirty
+from .related import queue_update as queue_related_update
+from .models import Category, CategoryBundle, Post, Tombstone
+from .response_cache import (
+    bump_scope_versions,
+    SCOPE_POSTS,
+    SCOPE_PINS,
+    SCOPE_CATEGORIES,
+    SCOPE_SUBSCRIPTIONS,
+    SCOPE_TITLES,
+)
+
+
+@receiver(pre_delete, sender=Post)
+def post_pre_delete(sender, instance, **kwargs):
+    """Уменьшает счетчик опубликованных постов категории при удалении поста"""
+    if instance.status == 'published' and instance.category_id:
+        Category.objects.adjust_published_posts_count({instance.category_id: -1})
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed(sender, **kwargs):
+    """Инвалидирует кэш ответов, зависящих от постов"""
+    bump_scope_versions(SCOPE_POSTS)
+
+
+# Поля поста, которые попадают в подсказки автодополнения
+SUGGEST_FIELDS = ('title', 'slug', 'status')
+
+
+@receiver(post_save, sender=Post)
+def post_saved_for_suggest(sender, instance, created, **kwargs):
+    """Инвалидирует подсказки, если изменились заголовок, слаг или статус"""
+    if created or any(instance.has_changed(field) for field in SUGGEST_FIELDS):
+        bump_scope_versions(SCOPE_TITLES)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_for_suggest(sender, instance, **kwargs):
+    bump_scope_versions(SCOPE_TITLES)
+
+
+@receiver(post_save, sender=Post)
+def post_saved_for_related(sender, instance, created, **kwargs):
+    """Обновляет похожие посты, если изменилось то, по чему они считаются"""
+    if created or any(
+        instance.has_changed(field) for field in ('title', 'content', 'category_id', 'status')
+    ):
+        queue_related_update(instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_for_related(sender, instance, **kwargs):
+    """Убирает удаленный пост из списков похожих постов"""
+    queue_related_update(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    """Инвалидирует кэш ответов, зависящих от категорий, и подсказки"""
+    bump_scope_versions(SCOPE_CATEGORIES, SCOPE_TITLES)
+
+
+@receiver(post_save, sender='subscribe.PinnedPost')
+@receiver(post_delete, sender='subscribe.PinnedPost')
+def pinned_post_changed(sender, instance, **kwargs):
+    """Обновляет флаг закрепления поста и инвалидирует кэш ответов"""
+    Post.objects.sync_pin_state([instance.post_id])
+    bump_scope_versions(SCOPE_PINS, SCOPE_POSTS)
+
+
+@receiver(post_save, sender='subscribe.Subscription')
+@receiver(post_delete, sender='subscribe.Subscription')
+def subscription_changed(sender, instance, **kwargs):
+    """
+    Активация, отмена или истечение подписки меняет состояние закрепления
+    постов пользователя.
+    """
+    post_ids = Post.objects.filter(
+        Q(pin_info__user_id=instance.user_id)
+        | Q(author_id=instance.user_id, is_effectively_pinned=True)
+    ).values_list('id', flat=True)
+    if Post.objects.sync_pin_state(post_ids):
+        bump_scope_versions(SCOPE_POSTS)
+    bump_scope_versions(SCOPE_SUBSCRIPTIONS)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender='subscribe.PinnedPost')
+@receiver(post_delete, sender='subscribe.PinnedPost')
+@receiver(post_save, sender='subscribe.Subscription')
+@receiver(post_delete, sender='subscribe.Subscription')
+def home_snapshot_changed(sender, **kwargs):
+    """Планирует пересборку снимка главной страницы"""
+    schedule_home_rebuild()
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender='comments.Comment')
+def create_tombstone(sender, instance, **kwargs):
+    """Запоминает удаление для синхронизации клиентов (apps.main.sync)"""
+    Tombstone.objects.create(kind=sender._meta.model_name, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_changed_for_bundles(sender, instance, created=False, **kwargs):
+    """Планирует пересборку офлайн-пакетов категорий опубликованного поста"""
+    previous = {} if created else instance.get_loaded_values('category_id', 'status')
+    if instance.status == 'published' or previous.get('status') == 'published':
+        schedule_bundle_rebuild(instance.category_id, previous.get('category_id'))
+
+
+@receiver(post_save, sender='comments.Comment')
+@receiver(post_delete, sender='comments.Comment')
+def comment_changed_for_bundles(sender, instance, **kwargs):
+    """В пакеты входят только комментарии верхнего уровня"""
+    if instance.parent_id is None:
+        schedule_bundle_rebuild(
+            Post.objects.filter(pk=instance.post_id).values_list('category_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Category)
+def category_changed_for_bundles(sender, instance, **kwargs):
+    schedule_bundle_rebuild(instance.pk)
+
+
+@receiver(post_delete, sender=CategoryBundle)
+def category_bundle_deleted(sender, instance, **kwargs):
+    """Удаляет файл пакета после удаления записи (вместе с категорией)"""
+    if instance.file:
+        storage, name = instance.file.storage, instance.file.name
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+# Поля поста, которые попадают в кластеры карты
+MAP_TILE_FIELDS = ('latitude', 'longitude', 'status', 'title')
+
+
+@receiver(post_save, sender=Post)
+def post_saved_for_map(sender, instance, created, **kwargs):
+    """Помечает тайлы карты со старым и новым положением поста"""
+    if not created and not any(instance.has_changed(field) for field in MAP_TILE_FIELDS):
+        return
+    points = []
+    if instance.status == 'published':
+        points.append((instance.latitude, instance.longitude))
+    if not created:
+        previous = instance.get_loaded_values('latitude', 'longitude', 'status')
+        if previous.get('status') == 'published':
+            points.append((previous.get('latitude'), previous.get('longitude')))
+    mark_map_tiles_dirty(points)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted_for_map(sender, instance, **kwargs):
+    if instance.status == 'published':
+        mark_map_tiles_dirty([(instance.latitude, instance.longitude)])
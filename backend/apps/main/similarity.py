@@ -0,0 +1,72 @@
+"""
+Общие функции для рекомендаций на разреженных векторах (NumPy/SciPy).
+
+Строки матриц нормализованы по L2, поэтому скалярное произведение строк
+равно косинусному сходству.
+"""
+import numpy as np
+from scipy import sparse
+
+
+DEFAULT_CHUNK_SIZE = 256
+
+
+def l2_normalize(matrix):
+    """Нормализует строки разреженной матрицы (нулевые строки остаются нулевыми)"""
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags((1 / norms).astype(np.float32)) @ matrix
+
+
+def top_k_rows(scores, k, exclude_columns=None):
+    """
+    Для плотной матрицы scores (строки x столбцы) возвращает
+    (индексы, значения) k лучших столбцов каждой строки по убыванию.
+    exclude_columns[i] - столбец, исключаемый для строки i (сам объект).
+    Пустые позиции: индекс -1, значение 0.
+    """
+    rows, columns = scores.shape
+    if exclude_columns is not None:
+        valid = exclude_columns >= 0
+        scores[np.arange(rows)[valid], exclude_columns[valid]] = 0
+    k = min(k, columns)
+    if k == 0:
+        return (
+            np.full((rows, 0), -1, dtype=np.int64),
+            np.zeros((rows, 0), dtype=np.float32),
+        )
+
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    values = np.take_along_axis(values, order, axis=1)
+    top[values <= 0] = -1
+    values[values <= 0] = 0
+    return top, values.astype(np.float32)
+
+
+def top_k_similar(matrix, k, rows=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    k ближайших соседей (косинус) для строк rows нормализованной
+    матрицы matrix среди всех ее строк, без самой строки.
+    Считается блоками по chunk_size строк, чтобы плотный блок сходств
+    (chunk_size x n) помещался в память.
+    Возвращает (индексы, значения) формы len(rows) x k; если строк
+    меньше k, хвост заполнен индексом -1 и значением 0.
+    """
+    matrix = sparse.csr_matrix(matrix)
+    rows = np.arange(matrix.shape[0]) if rows is None else np.asarray(rows, dtype=np.int64)
+    transposed = matrix.T.tocsc()
+
+    indices = np.full((len(rows), k), -1, dtype=np.int64)
+    values = np.zeros((len(rows), k), dtype=np.float32)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        scores = (matrix[chunk] @ transposed).toarray()
+        top, top_values = top_k_rows(scores, k, exclude_columns=chunk)
+        found = top.shape[1]
+        indices[start:start + len(chunk), :found] = top
+        values[start:start + len(chunk), :found] = top_values
+    return indices, values
@@ -0,0 +1,112 @@
+"""
+Разреженные наборы полей: ?fields=id,title,slug и ?exclude=pinned_info.
+
+SparseFieldsMixin убирает из сериализатора поля, которые клиент не
+запросил, до сериализации - SerializerMethodField и вычисляемые свойства
+невостребованных полей не вызываются. Параметры действуют на GET-запросы
+и на все сериализаторы ответа с этим миксином, в том числе вложенные
+(например, ответы на комментарий).
+
+Meta.sparse_sources сериализатора описывает, какие колонки модели нужны
+каждому полю ('author__username' - колонка связанной модели, пустой
+кортеж - полю не нужны колонки). Поля без описания читают одноименную
+колонку. По запрошенным полям sparse_queryset() сужает queryset: only()
+нужных колонок и select_related только нужных связей.
+"""
+from django.core.exceptions import FieldDoesNotExist
+
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def _param_names(request, name):
+    if name not in request.query_params:
+        return None
+    names = set()
+    for raw in request.query_params.getlist(name):
+        names.update(value.strip() for value in raw.split(',') if value.strip())
+    return names
+
+
+def select_field_names(request, available):
+    """
+    Имена полей из available, оставшиеся после ?fields= / ?exclude=, в
+    исходном порядке; None - запрос не ограничивает поля.
+    """
+    if request is None or request.method not in ('GET', 'HEAD'):
+        return None
+    fields = _param_names(request, FIELDS_PARAM)
+    exclude = _param_names(request, EXCLUDE_PARAM)
+    if fields is None and exclude is None:
+        return None
+    return [
+        name for name in available
+        if (fields is None or name in fields) and name not in (exclude or ())
+    ]
+
+
+class SparseFieldsMixin:
+    """Сериализатор с поддержкой ?fields= / ?exclude= (ставится перед ModelSerializer)"""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = select_field_names(self.context.get('request'), fields)
+        if selected is None:
+            return fields
+        return {name: fields[name] for name in selected}
+
+
+def _column_paths(model, serializer_class, field_names):
+    sources = getattr(serializer_class.Meta, 'sparse_sources', {})
+    paths = set()
+    for name in field_names:
+        if name in sources:
+            paths.update(sources[name])
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Аннотации и свойства без описания не требуют колонок
+            continue
+        if field.concrete:
+            paths.add(name)
+    return paths
+
+
+def sparse_queryset(queryset, serializer_class, request, extra_fields=()):
+    """
+    Сужает queryset до колонок и связей, нужных запрошенным полям
+    serializer_class. extra_fields - колонки, нужные самому представлению
+    (валидаторы, курсор пагинации). Без ?fields= / ?exclude= queryset не
+    меняется.
+    """
+    selected = select_field_names(request, list(serializer_class().fields))
+    if selected is None:
+        return queryset
+
+    paths = _column_paths(queryset.model, serializer_class, selected)
+    paths.update(extra_fields)
+    paths.add(queryset.model._meta.pk.name)
+    relations = {path.rsplit('__', 1)[0] for path in paths if '__' in path}
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*paths)
+
+
+class SparseQuerysetMixin:
+    """
+    Для generic-представлений: queryset сужается под ?fields= / ?exclude=
+    сериализатора ответа. sparse_extra_fields - колонки, которые нужны
+    представлению независимо от запрошенных полей.
+    """
+    sparse_extra_fields = ()
+
+    def filter_queryset(self, queryset):
+        return sparse_queryset(
+            super().filter_queryset(queryset),
+            self.get_serializer_class(),
+            self.request,
+            self.sparse_extra_fields
+        )
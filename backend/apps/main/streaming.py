@@ -0,0 +1,43 @@
+"""
+Потоковая выдача больших списков в формате NDJSON (объект JSON в строке).
+
+Записи читаются серверным курсором (QuerySet.iterator) и сериализуются
+пачками по chunk_size, поэтому память процесса не зависит от размера
+выборки. Ответ не кэшируется (см. apps.main.response_cache) и отдается
+без ETag / Last-Modified (см. apps.main.conditional).
+"""
+import json
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+STREAM_CHUNK_SIZE = 500
+
+
+def wants_stream(request):
+    """Клиент запросил потоковую выдачу: ?stream=ndjson"""
+    return request.query_params.get('stream') == 'ndjson'
+
+
+def iter_ndjson(queryset, serializer_class, context, chunk_size=STREAM_CHUNK_SIZE):
+    """Строки NDJSON для записей queryset"""
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        data = serializer_class(chunk, many=True, context=context).data
+        yield ''.join(
+            json.dumps(item, cls=JSONEncoder, ensure_ascii=False) + '\n' for item in data
+        )
+
+
+def ndjson_response(queryset, serializer_class, request, chunk_size=STREAM_CHUNK_SIZE):
+    """StreamingHttpResponse со всеми записями queryset"""
+    return StreamingHttpResponse(
+        iter_ndjson(queryset, serializer_class, {'request': request}, chunk_size),
+        content_type=NDJSON_CONTENT_TYPE
+    )
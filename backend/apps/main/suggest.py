@@ -0,0 +1,82 @@
+"""
+Автодополнение заголовков постов и названий категорий.
+
+Поиск идет по GIN-индексам pg_trgm (оператор %> - word similarity),
+поэтому находит и префиксы, и слова с опечатками. Результаты кэшируются
+по нормализованному префиксу и общие для всех пользователей; ключ
+включает версию SCOPE_TITLES, которая меняется только при изменении
+заголовка, слага или статуса поста и категорий, поэтому снятые с
+публикации и удаленные посты пропадают из подсказок сразу, а сброс
+счетчиков и другие сохранения кэш не сбрасывают. Массовые update() в
+обход сигналов устаревают не дольше SUGGEST_CACHE_TIMEOUT.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.core.cache import cache
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import Category, Post
+from .response_cache import get_scope_versions, SCOPE_TITLES
+
+
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 100
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+SUGGEST_SCOPES = (SCOPE_TITLES,)
+
+
+def normalize_prefix(text):
+    """Нижний регистр, схлопнутые пробелы, ограничение длины"""
+    return ' '.join(text.lower().split())[:MAX_PREFIX_LENGTH]
+
+
+def _cache_key(prefix, limit):
+    versions = get_scope_versions(SUGGEST_SCOPES)
+    raw = repr((prefix, sorted(versions.items())))
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return f'suggest:{limit}:{digest}'
+
+
+def _ranked(queryset, field, prefix, limit):
+    return queryset.filter(**{f'{field}__trigram_word_similar': prefix}).annotate(
+        is_prefix=Case(
+            When(**{f'{field}__istartswith': prefix}, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField()
+        ),
+        similarity=TrigramWordSimilarity(prefix, field)
+    ).order_by('-is_prefix', '-similarity')[:limit]
+
+
+def suggest(text, limit=DEFAULT_LIMIT):
+    """Подсказки для строки поиска: {'query', 'posts', 'categories'}"""
+    prefix = normalize_prefix(text)
+    limit = max(1, min(limit, MAX_LIMIT))
+    if len(prefix) < MIN_PREFIX_LENGTH:
+        return {'query': prefix, 'posts': [], 'categories': []}
+
+    key = _cache_key(prefix, limit)
+    result = cache.get(key)
+    if result is None:
+        result = lookup(prefix, limit)
+        cache.set(key, result, settings.SUGGEST_CACHE_TIMEOUT)
+    return result
+
+
+def lookup(prefix, limit):
+    """Подсказки для нормализованного префикса без кэша"""
+    posts = _ranked(
+        Post.objects.filter(status='published'), 'title', prefix, limit
+    ).values('id', 'title', 'slug')
+    categories = _ranked(
+        Category.objects.all(), 'name', prefix, limit
+    ).values('id', 'name', 'slug')
+
+    return {
+        'query': prefix,
+        'posts': list(posts),
+        'categories': list(categories),
+    }
@@ -0,0 +1,223 @@
+"""
+Инкрементальная синхронизация для офлайн-клиентов (/api/v1/sync/).
+
+Изменения читаются четырьмя потоками - посты, категории, комментарии и
+надгробия (Tombstone, записи об удаленных объектах) - keyset-пагинацией
+по (change_txid, id) с индексом на этих колонках. change_txid - номер
+транзакции, последней изменившей строку (apps.main.watermarks); его
+ставит триггер при любом изменении, в том числе через update() и
+bulk_update. Счетчики просмотров и комментариев номер не меняют и в
+ответ не входят. Токен синхронизации хранит позицию каждого потока;
+клиент передает его в ?since= и повторяет запрос, пока has_more = true.
+
+Посты не в статусе published и неактивные комментарии отдаются как
+удаленные - клиент удаляет их, если они у него есть. Комментарии
+удаленных постов клиент удаляет вместе с постом.
+
+Строки транзакций, не завершенных к началу запроса, не отдаются: поток
+читается до snapshot_xmin(), все транзакции с меньшим номером уже
+закоммичены или отменены, и строка с меньшим номером позже не появится.
+Если изменений нет, ответ стоит одного запроса (UNION по индексам
+потоков с LIMIT 1).
+
+Надгробия хранятся TOMBSTONE_RETENTION. Токен помнит, когда клиент
+последний раз дочитал поток надгробий (tombstones_at); если с тех пор
+прошло больше срока хранения без TOMBSTONE_MARGIN, часть удалений уже
+стерта и нужна полная синхронизация.
+"""
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from apps.comments.models import Comment
+from apps.comments.serializers import CommentSyncSerializer
+
+from .models import Category, Post, Tombstone
+from .serializers import CategorySerializer, PostSyncSerializer
+from .watermarks import snapshot_xmin
+
+
+TOMBSTONE_RETENTION = timedelta(days=30)
+# Запас на транзакции, закоммитившие надгробие позже его deleted_at
+TOMBSTONE_MARGIN = timedelta(hours=1)
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 500
+
+POSTS = 'posts'
+CATEGORIES = 'categories'
+COMMENTS = 'comments'
+TOMBSTONES = 'tombstones'
+STREAMS = (POSTS, CATEGORIES, COMMENTS, TOMBSTONES)
+
+TOMBSTONE_STREAMS = {
+    Tombstone.KIND_POST: POSTS,
+    Tombstone.KIND_CATEGORY: CATEGORIES,
+    Tombstone.KIND_COMMENT: COMMENTS,
+}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class ExpiredToken(Exception):
+    """Надгробия после позиции токена уже удалены - нужна полная синхронизация"""
+
+
+def stream_queryset(name):
+    if name == POSTS:
+        return Post.objects.select_related('author', 'category')
+    if name == CATEGORIES:
+        return Category.objects.all()
+    if name == COMMENTS:
+        return Comment.objects.select_related('author')
+    return Tombstone.objects.all()
+
+
+def encode_token(positions, tombstones_at):
+    payload = {
+        name: list(position)
+        for name, position in positions.items() if position is not None
+    }
+    payload['tombstones_at'] = tombstones_at.isoformat()
+    return base64.urlsafe_b64encode(
+        json.dumps(payload, separators=(',', ':')).encode()
+    ).decode('ascii')
+
+
+def decode_token(token):
+    """
+    ({поток: (txid, id) или None}, время последнего дочитывания надгробий);
+    пустой токен - первая синхронизация (None, None)
+    """
+    if not token:
+        return None, None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode())
+        tombstones_at = parse_datetime(payload.pop('tombstones_at'))
+        if tombstones_at is None:
+            raise ValueError
+        positions = {name: None for name in STREAMS}
+        for name, (txid, pk) in payload.items():
+            if name not in positions:
+                raise ValueError
+            positions[name] = (int(txid), int(pk))
+    except KeyError:
+        # Токен прежнего формата (позиции по updated_at)
+        raise ExpiredToken
+    except (TypeError, ValueError, AttributeError, UnicodeDecodeError, binascii.Error):
+        raise InvalidToken
+    if positions[TOMBSTONES] is None:
+        raise InvalidToken
+    return positions, tombstones_at
+
+
+def initial_positions(until):
+    """
+    Первая синхронизация читает все текущие строки; надгробия удалений,
+    закоммиченных до нее, клиенту не нужны.
+    """
+    positions = {name: None for name in STREAMS}
+    positions[TOMBSTONES] = (until, 0)
+    return positions
+
+
+def window(name, position, until):
+    """
+    Строки потока после позиции, измененные транзакциями с номером
+    меньше until, в порядке (change_txid, id)
+    """
+    queryset = stream_queryset(name).filter(change_txid__lt=until)
+    if position is not None:
+        txid, pk = position
+        queryset = queryset.filter(
+            Q(change_txid__gt=txid) | Q(change_txid=txid, id__gt=pk)
+        )
+    return queryset.order_by('change_txid', 'id')
+
+
+def has_changes(positions, until):
+    """Есть ли изменения хотя бы в одном потоке - один запрос"""
+    first, *rest = [
+        window(name, positions[name], until).order_by().values_list('id')
+        for name in STREAMS
+    ]
+    return bool(list(first.union(*rest, all=True)[:1]))
+
+
+def _empty_changes():
+    return {name: {'updated': [], 'deleted': []} for name in (POSTS, CATEGORIES, COMMENTS)}
+
+
+def changes(token, limit=DEFAULT_LIMIT, request=None):
+    """
+    Изменения после токена: {'posts': {'updated', 'deleted'}, 'categories',
+    'comments', 'next', 'has_more', 'synced_until'}.
+    """
+    now = timezone.now()
+    until = snapshot_xmin()
+    positions, tombstones_at = decode_token(token)
+    if positions is None:
+        positions, tombstones_at = initial_positions(until), now
+    elif tombstones_at < now - TOMBSTONE_RETENTION + TOMBSTONE_MARGIN:
+        raise ExpiredToken
+
+    result = _empty_changes()
+    has_more = False
+    if has_changes(positions, until):
+        context = {'request': request}
+        for name in STREAMS:
+            rows = list(window(name, positions[name], until)[:limit + 1])
+            if len(rows) > limit:
+                has_more = True
+                rows = rows[:limit]
+                positions[name] = (rows[-1].change_txid, rows[-1].id)
+            else:
+                # Поток дочитан до until: следующий запрос начнется с него
+                positions[name] = (until, 0)
+                if name == TOMBSTONES:
+                    tombstones_at = now
+            if rows:
+                _collect(name, rows, result, context)
+    else:
+        positions = {name: (until, 0) for name in STREAMS}
+        tombstones_at = now
+
+    return {
+        **result,
+        'next': encode_token(positions, tombstones_at),
+        'has_more': has_more,
+        'synced_until': now,
+    }
+
+
+def _collect(name, rows, result, context):
+    if name == TOMBSTONES:
+        for tombstone in rows:
+            result[TOMBSTONE_STREAMS[tombstone.kind]]['deleted'].append(tombstone.object_id)
+        return
+
+    if name == POSTS:
+        live = [post for post in rows if post.status == 'published']
+        serializer_class = PostSyncSerializer
+    elif name == COMMENTS:
+        live = [comment for comment in rows if comment.is_active]
+        serializer_class = CommentSyncSerializer
+    else:
+        live = rows
+        serializer_class = CategorySerializer
+
+    live_ids = {row.id for row in live}
+    result[name]['updated'] = serializer_class(live, many=True, context=context).data
+    result[name]['deleted'].extend(row.id for row in rows if row.id not in live_ids)
+
+
+def prune_tombstones(retention=TOMBSTONE_RETENTION):
+    """Удаляет надгробия старше retention (токены старше получают 410)"""
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=timezone.now() - retention).delete()
+    return deleted
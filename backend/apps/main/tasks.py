@@ -0,0 +1,310 @@
+from celery import shared_task
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, When, F, Value, IntegerField
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from .counters import get_view_counter, window_days
+from .models import Category, Post, PostReader
+from . import bundles, co_engagement, home, locks, map_tiles, related, sync, trending
+
+
+RELATED_LOCK_KEY = 'related-posts:lock'
+RELATED_LOCK_TIMEOUT = 30 * 60
+# Пауза перед повтором, пока индекс занят другой задачей, секунды
+RELATED_RETRY_DELAY = 30
+CO_ENGAGEMENT_LOCK_KEY = 'co-engagement:lock'
+
+
+FLUSH_BATCH_SIZE = 500
+
+
+@shared_task
+def flush_view_counts():
+    """Периодический сброс накопленных просмотров в posts.views_count"""
+    from .response_cache import bump_post_counters
+
+    counter = get_view_counter()
+    deltas = {post_id: delta for post_id, delta in counter.drain().items() if delta}
+    if not deltas:
+        return {'flushed_posts': 0, 'flushed_views': 0}
+
+    post_ids = sorted(deltas)
+    try:
+        with transaction.atomic():
+            # UPDATE posts SET views_count = views_count + CASE id WHEN ... END
+            for start in range(0, len(post_ids), FLUSH_BATCH_SIZE):
+                batch = post_ids[start:start + FLUSH_BATCH_SIZE]
+                Post.objects.filter(id__in=batch).update(
+                    views_count=F('views_count') + Case(
+                        *[When(id=post_id, then=Value(deltas[post_id])) for post_id in batch],
+                        default=Value(0),
+                        output_field=IntegerField()
+                    )
+                )
+            trending.record_engagement(views=deltas)
+            bump_post_counters(post_ids)
+    except Exception:
+        # Возвращаем дельты в буфер, чтобы не потерять просмотры
+        counter.restore(deltas)
+        raise
+
+    return {
+        'flushed_posts': len(post_ids),
+        'flushed_views': sum(deltas.values())
+    }
+
+
+@shared_task
+def flush_unique_views(full=False):
+    """
+    Записывает оценки уникальных посетителей из HyperLogLog-скетчей в
+    posts.unique_views / unique_views_7d.
+    full=True дополнительно пересчитывает все посты с ненулевым окном за
+    7 дней, чтобы старые дни выпадали из окна и без новых визитов.
+    """
+    from .response_cache import bump_post_counters
+
+    counter = get_view_counter()
+    dirty = counter.drain_dirty_visitors()
+    post_ids = set(dirty)
+    if full:
+        post_ids.update(
+            Post.objects.filter(unique_views_7d__gt=0).values_list('id', flat=True)
+        )
+    if not post_ids:
+        return {'updated_posts': 0}
+
+    try:
+        today = window_days()[0]
+        counts = counter.unique_counts_many(post_ids, today)
+        current = {
+            post_id: (total, last_week)
+            for post_id, total, last_week in Post.objects.filter(id__in=counts).values_list(
+                'id', 'unique_views', 'unique_views_7d'
+            )
+        }
+        # Записываются и меняют версии счетчиков только изменившиеся оценки
+        posts = [
+            Post(id=post_id, unique_views=total, unique_views_7d=last_week)
+            for post_id, (total, last_week) in counts.items()
+            if post_id in current and current[post_id] != (total, last_week)
+        ]
+        with transaction.atomic():
+            Post.objects.bulk_update(
+                posts, ['unique_views', 'unique_views_7d'], batch_size=FLUSH_BATCH_SIZE
+            )
+            bump_post_counters(post.id for post in posts)
+    except Exception:
+        # Посты остаются в наборе измененных до следующего сброса
+        counter.mark_dirty_visitors(dirty)
+        raise
+    return {'updated_posts': len(posts)}
+
+
+@shared_task
+def expire_post_pins(post_ids):
+    """Снятие флага закрепления в момент окончания подписки закрепившего"""
+    from .response_cache import bump_scope_versions, SCOPE_PINS, SCOPE_POSTS
+
+    updated = Post.objects.sync_pin_state(post_ids)
+    if updated:
+        bump_scope_versions(SCOPE_PINS, SCOPE_POSTS)
+    return {'updated_posts': updated}
+
+
+@shared_task
+def update_trending_scores():
+    """
+    Пересчет posts.trending_score по почасовой вовлеченности и обновление
+    кэшированных top-N списков (общего и по категориям).
+    """
+    from .response_cache import bump_scope_versions, SCOPE_TRENDING
+
+    with transaction.atomic():
+        updated = trending.update_scores()
+    top = trending.build_top_lists()
+    # Версия меняется только когда готовы и счета, и top-N списки: ответ,
+    # закэшированный под новой версией, не может содержать старые списки
+    bump_scope_versions(SCOPE_TRENDING)
+    pruned = trending.prune_engagement()
+    return {
+        'updated_posts': updated,
+        'trending_posts': len(top.get(trending.ALL_CATEGORIES, [])),
+        'pruned_buckets': pruned
+    }
+
+
+@shared_task
+def rebuild_home_snapshot():
+    """Пересборка снимка главной страницы (apps.main.home)"""
+    # Изменения во время сборки запланируют следующую пересборку
+    cache.delete(home.PENDING_KEY)
+    snapshot = home.build_snapshot()
+    return {
+        'built_at': snapshot['built_at'].isoformat(),
+        'bytes': len(snapshot['body']),
+        'gzip_bytes': len(snapshot['gzip'])
+    }
+
+
+@shared_task
+def prune_sync_tombstones():
+    """Удаление старых надгробий синхронизации"""
+    return {'deleted_tombstones': sync.prune_tombstones()}
+
+
+@shared_task(bind=True, max_retries=10)
+def build_category_bundle(self, category_id, force=False):
+    """Пересборка офлайн-пакета категории (apps.main.bundles)"""
+    if not cache.add(bundles.lock_key(category_id), 1, bundles.BUNDLE_LOCK_TIMEOUT):
+        raise self.retry(countdown=30)
+    try:
+        # Изменения во время сборки запланируют следующую пересборку
+        cache.delete(bundles.pending_key(category_id))
+        return bundles.build(category_id, force)
+    finally:
+        cache.delete(bundles.lock_key(category_id))
+
+
+@shared_task
+def refresh_category_bundles():
+    """
+    Проверка пакетов всех категорий: пакет пересобирается, только если
+    изменились посты, комментарии или категория.
+    """
+    category_ids = list(Category.objects.values_list('id', flat=True))
+    for category_id in category_ids:
+        build_category_bundle.delay(category_id)
+    return {'categories': len(category_ids)}
+
+
+@shared_task
+def build_map_tiles():
+    """Полный пересчет кластеров карты (apps.main.map_tiles)"""
+    if not cache.add(map_tiles.LOCK_KEY, 1, map_tiles.LOCK_TIMEOUT):
+        return {'skipped': 'locked'}
+    try:
+        return {'changed_tiles': map_tiles.build_all()}
+    finally:
+        cache.delete(map_tiles.LOCK_KEY)
+
+
+@shared_task(bind=True, max_retries=10)
+def rebuild_dirty_map_tiles(self):
+    """Пересчет тайлов карты, помеченных после изменения постов"""
+    if not cache.add(map_tiles.LOCK_KEY, 1, map_tiles.LOCK_TIMEOUT):
+        raise self.retry(countdown=30)
+    try:
+        # Изменения во время пересчета запланируют следующий
+        cache.delete(map_tiles.PENDING_KEY)
+        return {'rebuilt_tiles': map_tiles.rebuild_dirty()}
+    finally:
+        cache.delete(map_tiles.LOCK_KEY)
+
+
+@shared_task(bind=True, max_retries=None)
+def rebuild_related_posts(self, k=None):
+    """Полная пересборка TF-IDF индекса похожих постов"""
+    from .response_cache import bump_scope_versions, SCOPE_RELATED
+
+    token = locks.acquire(RELATED_LOCK_KEY, RELATED_LOCK_TIMEOUT)
+    if token is None:
+        raise self.retry(countdown=RELATED_RETRY_DELAY)
+    try:
+        index = related.rebuild(k)
+    finally:
+        locks.release(RELATED_LOCK_KEY, token)
+    bump_scope_versions(SCOPE_RELATED)
+    return {'indexed_posts': len(index.post_ids), 'terms': len(index.terms)}
+
+
+@shared_task(bind=True, max_retries=None)
+def update_related_posts(self):
+    """
+    Инкрементальное обновление похожих постов для постов из очереди
+    related_post_updates. Индекс - один артефакт, поэтому обновления
+    выполняются по одному; пока он занят, задача повторяется - очередь
+    хранится в БД и не теряется.
+    """
+    from .response_cache import bump_scope_versions, SCOPE_RELATED
+
+    token = locks.acquire(RELATED_LOCK_KEY, RELATED_LOCK_TIMEOUT)
+    if token is None:
+        raise self.retry(countdown=RELATED_RETRY_DELAY)
+    try:
+        # Изменения во время пересчета запланируют следующий
+        cache.delete(related.PENDING_KEY)
+        updated, remaining = related.process_queue()
+    finally:
+        locks.release(RELATED_LOCK_KEY, token)
+    if updated:
+        bump_scope_versions(SCOPE_RELATED)
+    if remaining:
+        related.schedule_update(countdown=0)
+    return {'updated_posts': updated, 'remaining': remaining}
+
+
+@shared_task
+def flush_post_readers():
+    """Сброс накопленных пар (пост, читатель) в post_readers"""
+    counter = get_view_counter()
+    readers = counter.drain_readers()
+    if not readers:
+        return {'flushed_readers': 0}
+
+    try:
+        post_ids = set(Post.objects.filter(
+            id__in={post_id for post_id, _ in readers}
+        ).values_list('id', flat=True))
+        user_ids = set(get_user_model().objects.filter(
+            id__in={user_id for _, user_id in readers}
+        ).values_list('id', flat=True))
+        # Пары удаленных постов и пользователей пропускаются
+        now = timezone.now()
+        rows = [
+            PostReader(post_id=post_id, user_id=user_id, last_seen_at=now)
+            for post_id, user_id in sorted(readers)
+            if post_id in post_ids and user_id in user_ids
+        ]
+        with transaction.atomic():
+            PostReader.objects.bulk_create(
+                rows,
+                batch_size=FLUSH_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['post', 'user'],
+                update_fields=['last_seen_at']
+            )
+    except Exception:
+        # Возвращаем пары в буфер, чтобы не потерять читателей
+        counter.restore_readers(readers)
+        raise
+
+    return {'flushed_readers': len(rows)}
+
+
+def _run_co_engagement(build, k):
+    from .response_cache import bump_scope_versions, SCOPE_RELATED
+
+    token = locks.acquire(CO_ENGAGEMENT_LOCK_KEY, RELATED_LOCK_TIMEOUT)
+    if token is None:
+        return {'skipped': 'locked'}
+    try:
+        interactions, updated = build(k)
+    finally:
+        locks.release(CO_ENGAGEMENT_LOCK_KEY, token)
+    if updated:
+        bump_scope_versions(SCOPE_RELATED)
+    return {'interactions': len(interactions), 'updated_posts': updated}
+
+
+@shared_task
+def rebuild_co_engagement(k=None):
+    """Полная пересборка рекомендаций по совместному чтению"""
+    return _run_co_engagement(co_engagement.rebuild, k)
+
+
+@shared_task
+def refresh_co_engagement(k=None):
+    """Пересчет рекомендаций для постов с новыми читателями и комментариями"""
+    return _run_co_engagement(co_engagement.refresh, k)
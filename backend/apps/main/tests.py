@@ -1,3 +1,1339 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+
+from apps.comments.models import Comment
+from apps.subscribe.models import PinnedPost, Subscription, SubscriptionPlan
+
+from . import (
+    artifacts, bundles, co_engagement, counters, geo, home, map_tiles, related, suggest,
+    sync, trending, views
+)
+from .conditional import conditional_response, make_etag
+from .ranges import RangeNotSatisfiable, parse_range, ranged_file_response
+from .response_cache import bump_scope_versions, get_scope_versions, SCOPE_POSTS
+from .hll import HyperLogLog
+from .models import (
+    EXCERPT_LENGTH, Category, MapTile, Post, PostEngagement, PostNeighbours, PostReader,
+    RecommendationArtifact, RelatedPostUpdate
+)
+from .tasks import (
+    build_map_tiles, expire_post_pins, flush_post_readers, flush_unique_views,
+    flush_view_counts, rebuild_dirty_map_tiles, rebuild_home_snapshot, refresh_co_engagement,
+    update_related_posts, update_trending_scores
+)
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    VIEW_COUNTER_BACKEND='apps.main.counters.LocMemViewCounter',
+    TRUSTED_PROXY_COUNT=0,
+)
+class PostTestCase(TestCase):
+    """Кэш и буфер просмотров в памяти, автор и категория для постов"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        counters._counter = None
+        self.addCleanup(setattr, counters, '_counter', None)
+        # Задачи, которые сигналы ставят после коммита, в тестах не нужны
+        patcher = mock.patch('celery.app.task.Task.apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = get_user_model().objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+        self.category = Category.objects.create(name='Europe', slug='europe')
+
+    def create_post(self, title, **kwargs):
+        kwargs.setdefault('status', 'published')
+        kwargs.setdefault('category', self.category)
+        kwargs.setdefault('content', 'Text')
+        return Post.objects.create(title=title, author=self.author, **kwargs)
+
+    def use_temp_media_root(self):
+        """Файлы (артефакты, варианты изображений, пакеты) - во временном каталоге"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+
+class ViewCounterTests(PostTestCase):
+    def test_drain_empties_buffer(self):
+        counter = counters.get_view_counter()
+        counter.incr(1)
+        counter.incr(1, 2)
+        counter.incr(2)
+
+        self.assertEqual(counter.pending([1, 2, 3]), {1: 3, 2: 1})
+        self.assertEqual(counter.drain(), {1: 3, 2: 1})
+        self.assertEqual(counter.drain(), {})
+
+    def test_detail_view_buffers_view_without_writing_row(self):
+        post = self.create_post('Post')
+
+        response = self.client.get(f'/api/v1/posts/{post.slug}/')
+
+        self.assertEqual(response.json()['views_count'], 1)
+        self.assertEqual(counters.get_view_counter().pending([post.pk]), {post.pk: 1})
+        post.refresh_from_db()
+        self.assertEqual(post.views_count, 0)
+
+    def test_flush_adds_deltas_to_views_count(self):
+        first = self.create_post('First')
+        second = self.create_post('Second')
+        Post.objects.filter(pk=first.pk).update(views_count=10)
+        counter = counters.get_view_counter()
+        counter.incr(first.pk, 3)
+        counter.incr(second.pk)
+
+        self.assertEqual(flush_view_counts(), {'flushed_posts': 2, 'flushed_views': 4})
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.views_count, second.views_count), (13, 1))
+        self.assertEqual(flush_view_counts(), {'flushed_posts': 0, 'flushed_views': 0})
+
+    def test_failed_flush_restores_deltas(self):
+        post = self.create_post('Post')
+        counter = counters.get_view_counter()
+        counter.incr(post.pk, 5)
+
+        with mock.patch('apps.main.tasks.trending.record_engagement', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_view_counts()
+
+        self.assertEqual(counter.pending([post.pk]), {post.pk: 5})
+        post.refresh_from_db()
+        self.assertEqual(post.views_count, 0)
+
+    def test_pending_views_are_added_to_loaded_posts(self):
+        post = self.create_post('Post')
+        counters.get_view_counter().incr(post.pk, 4)
+
+        counters.apply_pending_views([post])
+
+        self.assertEqual(post.views_count, 4)
+
+
+class HyperLogLogTests(SimpleTestCase):
+    def test_estimate_and_union(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for index in range(20000):
+            first.add(f'visitor-{index}')
+        for index in range(10000, 30000):
+            second.add(f'visitor-{index}')
+
+        self.assertAlmostEqual(first.count(), 20000, delta=20000 * 0.03)
+        self.assertAlmostEqual(HyperLogLog.union([first, second]).count(), 30000, delta=30000 * 0.03)
+
+
+class UniqueViewsTests(PostTestCase):
+    def test_flush_unique_views(self):
+        post = self.create_post('Post')
+        counter = counters.get_view_counter()
+        for visitor in ('a', 'b', 'a'):
+            counter.add_visitor(post.pk, visitor)
+
+        self.assertEqual(flush_unique_views(), {'updated_posts': 1})
+        post.refresh_from_db()
+        self.assertEqual((post.unique_views, post.unique_views_7d), (2, 2))
+        self.assertEqual(flush_unique_views(), {'updated_posts': 0})
+
+    def test_failed_flush_keeps_posts_dirty(self):
+        post = self.create_post('Post')
+        counter = counters.get_view_counter()
+        counter.add_visitor(post.pk, 'a')
+
+        with mock.patch.object(Post.objects, 'bulk_update', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_unique_views()
+
+        self.assertEqual(flush_unique_views(), {'updated_posts': 1})
+        post.refresh_from_db()
+        self.assertEqual(post.unique_views, 1)
+
+    def test_window_drops_old_days(self):
+        post = self.create_post('Post')
+        counter = counters.get_view_counter()
+        today = timezone.now().date()
+        counter.add_visitor(post.pk, 'old', day=today - timedelta(days=counters.UNIQUE_WINDOW_DAYS))
+        counter.add_visitor(post.pk, 'new', day=today)
+
+        self.assertEqual(counter.unique_counts(post.pk, today), (2, 1))
+
+    def test_forwarded_header_ignored_without_trusted_proxy(self):
+        request = RequestFactory().get(
+            '/', HTTP_X_FORWARDED_FOR='1.1.1.1, 2.2.2.2', REMOTE_ADDR='10.0.0.1'
+        )
+
+        self.assertEqual(counters.get_client_ip(request), '10.0.0.1')
+        with self.settings(TRUSTED_PROXY_COUNT=1):
+            self.assertEqual(counters.get_client_ip(request), '2.2.2.2')
+        with self.settings(TRUSTED_PROXY_COUNT=2):
+            self.assertEqual(counters.get_client_ip(request), '1.1.1.1')
+
+    def test_spoofed_header_does_not_add_visitors(self):
+        post = self.create_post('Post')
+
+        for address in ('1.1.1.1', '2.2.2.2', '3.3.3.3'):
+            self.client.get(f'/api/v1/posts/{post.slug}/', HTTP_X_FORWARDED_FOR=address)
+        flush_unique_views()
+
+        post.refresh_from_db()
+        self.assertEqual(post.unique_views, 1)
+
+
+class CategoryPostsCountTests(PostTestCase):
+    def assertCount(self, category, expected):
+        category.refresh_from_db()
+        self.assertEqual(category.published_posts_count, expected)
+
+    def test_status_category_and_delete_adjust_count(self):
+        other = Category.objects.create(name='Asia', slug='asia')
+        post = self.create_post('Post')
+        self.create_post('Draft', status='draft')
+        self.assertCount(self.category, 1)
+
+        post.category = other
+        post.save()
+        self.assertCount(self.category, 0)
+        self.assertCount(other, 1)
+
+        post.status = 'draft'
+        post.save()
+        self.assertCount(other, 0)
+
+        post.status = 'published'
+        post.save()
+        post.delete()
+        self.assertCount(other, 0)
+
+    def test_category_list_reads_stored_count(self):
+        self.create_post('One')
+        self.create_post('Two')
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/v1/posts/categories/').json()
+
+        self.assertFalse([query for query in queries if '"posts"' in query['sql']])
+        categories = data['results'] if isinstance(data, dict) else data
+        self.assertEqual(categories[0]['posts_count'], 2)
+
+    def test_recompute_fixes_drift(self):
+        self.create_post('Post')
+        Category.objects.update(published_posts_count=5)
+
+        call_command('recompute_category_counts', stdout=StringIO())
+
+        self.assertCount(self.category, 1)
+
+
+class FeedCursorPaginationTests(PostTestCase):
+    url = '/api/v1/posts/'
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        self.posts = [self.create_post(f'Post {index}') for index in range(7)]
+        for index, post in enumerate(self.posts):
+            Post.objects.filter(pk=post.pk).update(created_at=now - timedelta(hours=index))
+        # Два поста с одинаковым временем создания - порядок по id
+        Post.objects.filter(pk=self.posts[4].pk).update(created_at=now - timedelta(hours=3))
+        Post.objects.filter(pk=self.posts[5].pk).update(
+            is_effectively_pinned=True, feed_pinned_at=now - timedelta(days=2)
+        )
+        Post.objects.filter(pk=self.posts[6].pk).update(
+            is_effectively_pinned=True, feed_pinned_at=now - timedelta(days=1)
+        )
+        self.expected = [
+            self.posts[5].pk, self.posts[6].pk, self.posts[0].pk, self.posts[1].pk,
+            self.posts[2].pk, *sorted([self.posts[3].pk, self.posts[4].pk], reverse=True),
+        ]
+
+    def _pages(self, url, link):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([post['id'] for post in data['results']])
+            url = data[link]
+        return pages
+
+    def test_pages_follow_feed_order(self):
+        pages = self._pages(f'{self.url}?pagination=cursor&page_size=3', 'next')
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+    def test_previous_links_return_same_pages(self):
+        url = f'{self.url}?pagination=cursor&page_size=3'
+        forward = self._pages(url, 'next')
+        last = self.client.get(url).json()
+        while last['next']:
+            last = self.client.get(last['next']).json()
+
+        backward = self._pages(last['previous'], 'previous')
+
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', base64.urlsafe_b64encode(b'{"p":[1]}').decode()):
+            response = self.client.get(self.url, {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SEARCH_CONFIG='english')
+class FullTextSearchTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.title_match = self.create_post('Hiking in the Alps')
+        self.content_match = Post.objects.create(
+            title='Mountain weekend', content='We went hiking near the lake',
+            author=self.author, category=self.category, status='published'
+        )
+        self.create_post('Hiking draft', status='draft')
+        self.create_post('Beaches of Portugal')
+
+    def search(self, query):
+        return self.client.get('/api/v1/posts/search/', {'q': query}).json()['results']
+
+    def test_title_matches_rank_first(self):
+        results = self.search('hike')
+
+        self.assertEqual(
+            [post['id'] for post in results], [self.title_match.pk, self.content_match.pk]
+        )
+        self.assertIn('<mark>Hiking</mark>', results[0]['title_highlight'])
+        self.assertIn('<mark>hiking</mark>', results[1]['snippet'])
+
+    def test_websearch_syntax(self):
+        self.assertEqual([post['id'] for post in self.search('hiking -lake')], [self.title_match.pk])
+        self.assertEqual(len(self.search('"alps hiking"')), 0)
+
+    def test_vector_follows_title_changes(self):
+        self.title_match.title = 'Skiing in the Alps'
+        self.title_match.save()
+
+        self.assertEqual([post['id'] for post in self.search('skiing')], [self.title_match.pk])
+        self.assertEqual([post['id'] for post in self.search('hiking')], [self.content_match.pk])
+
+    def test_list_filter_uses_search_vector(self):
+        data = self.client.get('/api/v1/posts/', {'search': 'portugal'}).json()
+
+        self.assertEqual([post['title'] for post in data['results']], ['Beaches of Portugal'])
+
+    def test_query_is_required(self):
+        self.assertEqual(self.client.get('/api/v1/posts/search/').status_code, 400)
+
+
+class SuggestTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Lisbon old town walk')
+        self.create_post('Lisbon draft', status='draft')
+
+    def suggest(self, query):
+        return self.client.get('/api/v1/posts/suggest/', {'q': query}).json()
+
+    def test_prefix_and_typo_matches(self):
+        self.assertEqual([post['slug'] for post in self.suggest('lisb')['posts']], [self.post.slug])
+        self.assertEqual([post['slug'] for post in self.suggest('lisboa')['posts']], [self.post.slug])
+        self.assertEqual([category['slug'] for category in self.suggest('euro')['categories']], ['europe'])
+        self.assertEqual(self.suggest('l')['posts'], [])
+
+    def test_counter_flush_keeps_cached_suggestions(self):
+        self.suggest('lisbon')
+        counters.get_view_counter().incr(self.post.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            flush_view_counts()
+            self.post.views_count = 10
+            self.post.save()
+        with self.assertNumQueries(0):
+            suggest.suggest('lisbon')
+
+    def test_title_and_status_changes_invalidate(self):
+        self.suggest('lisbon')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Porto old town walk'
+            self.post.save()
+        self.assertEqual(self.suggest('lisbon')['posts'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(
+                title='Lisbon trams', content='Text', author=self.author, status='published'
+            )
+        self.assertEqual([post['title'] for post in self.suggest('lisbon')['posts']], ['Lisbon trams'])
+
+
+class ResponseCacheTests(PostTestCase):
+    url = '/api/v1/posts/'
+
+    def post_queries(self, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(*args, **kwargs)
+        return response, [query for query in queries if 'FROM "posts"' in query['sql']]
+
+    def test_scope_version_changes_after_commit(self):
+        before = get_scope_versions([SCOPE_POSTS])
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            bump_scope_versions(SCOPE_POSTS)
+        self.assertEqual(get_scope_versions([SCOPE_POSTS]), before)
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(get_scope_versions([SCOPE_POSTS])[SCOPE_POSTS], before[SCOPE_POSTS] + 1)
+
+    def test_lost_version_does_not_reuse_old_values(self):
+        before = get_scope_versions([SCOPE_POSTS])[SCOPE_POSTS]
+        cache.clear()
+
+        self.assertGreater(get_scope_versions([SCOPE_POSTS])[SCOPE_POSTS], before)
+
+    def test_anonymous_list_is_served_from_cache_until_posts_change(self):
+        self.create_post('First')
+        self.post_queries(self.url)
+
+        response, queries = self.post_queries(self.url)
+        self.assertEqual(queries, [])
+        self.assertEqual(len(response.json()['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_post('Second')
+        response, queries = self.post_queries(self.url)
+        self.assertTrue(queries)
+        self.assertEqual(len(response.json()['results']), 2)
+
+    @override_settings(ALLOWED_HOSTS=['one.example.com', 'two.example.com'])
+    def test_key_includes_scheme_and_host(self):
+        self.create_post('Post', image='posts/photo.jpg')
+
+        first = self.client.get(self.url, HTTP_HOST='one.example.com').json()
+        second = self.client.get(self.url, HTTP_HOST='two.example.com').json()
+        secure = self.client.get(self.url, HTTP_HOST='one.example.com', secure=True).json()
+
+        self.assertEqual(first['results'][0]['image'], 'http://one.example.com/media/posts/photo.jpg')
+        self.assertEqual(second['results'][0]['image'], 'http://two.example.com/media/posts/photo.jpg')
+        self.assertEqual(secure['results'][0]['image'], 'https://one.example.com/media/posts/photo.jpg')
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.create_post('Post')
+        self.client.get(self.url)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+        _, queries = self.post_queries(self.url)
+
+        self.assertTrue(queries)
+
+
+class PinStateTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        plan = SubscriptionPlan.objects.create(name='Pro', price=5, stripe_price_id='price_pro')
+        now = timezone.now()
+        self.subscription = Subscription.objects.create(
+            user=self.author, plan=plan, status='active',
+            start_date=now, end_date=now + timedelta(days=30)
+        )
+        self.post = self.create_post('Pinned')
+        self.other = self.create_post('Regular')
+
+    def pin(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PinnedPost.objects.create(user=self.author, post=self.post)
+        self.post.refresh_from_db()
+
+    def test_pinning_materializes_flag(self):
+        self.pin()
+
+        self.assertTrue(self.post.is_effectively_pinned)
+        self.assertEqual(self.post.feed_pinned_at, PinnedPost.objects.get().pinned_at)
+        self.assertEqual(self.post.pin_expires_at, self.subscription.end_date)
+        self.assertEqual(list(Post.objects.pinned_posts()), [self.post])
+        results = self.client.get('/api/v1/posts/?pagination=cursor').json()['results']
+        self.assertEqual([post['id'] for post in results], [self.post.pk, self.other.pk])
+        self.assertTrue(results[0]['is_pinned'])
+
+    def test_unpin_and_cancel_clear_flag(self):
+        self.pin()
+        PinnedPost.objects.all().delete()
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.is_effectively_pinned)
+
+        self.pin()
+        self.subscription.cancel()
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.is_effectively_pinned)
+        self.assertIsNone(self.post.feed_pinned_at)
+
+    def test_expiry_is_scheduled_and_checked_on_read(self):
+        end_date = timezone.now() + timedelta(minutes=30)
+        Subscription.objects.filter(pk=self.subscription.pk).update(end_date=end_date)
+
+        self.pin()
+
+        self.apply_async.assert_any_call(([self.post.pk],), eta=end_date + timedelta(seconds=1))
+        self.assertTrue(self.post.is_pinned)
+        # Подписка закончилась, задача снятия флага еще не выполнилась
+        Post.objects.filter(pk=self.post.pk).update(pin_expires_at=timezone.now())
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.is_pinned)
+
+        Subscription.objects.filter(pk=self.subscription.pk).update(end_date=timezone.now())
+        self.assertEqual(expire_post_pins([self.post.pk]), {'updated_posts': 1})
+        self.post.refresh_from_db()
+        self.assertFalse(self.post.is_effectively_pinned)
+
+
+class ExcerptTests(PostTestCase):
+    def test_excerpt_follows_content(self):
+        post = self.create_post('Post')
+        self.assertEqual(post.excerpt, 'Text')
+
+        post.content = 'x' * (EXCERPT_LENGTH + 10)
+        post.save(update_fields=['content'])
+
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'x' * EXCERPT_LENGTH + '...')
+
+    def test_list_does_not_load_content(self):
+        self.create_post('Post')
+
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get('/api/v1/posts/').json()['results']
+
+        self.assertEqual(results[0]['content'], 'Text')
+        post_queries = [query['sql'] for query in queries if 'FROM "posts"' in query['sql']]
+        self.assertTrue(post_queries)
+        self.assertFalse([sql for sql in post_queries if '"posts"."content"' in sql])
+
+    def test_rebuild_fixes_stale_excerpts(self):
+        post = self.create_post('Post')
+        self.create_post('Other')
+        Post.objects.filter(pk=post.pk).update(excerpt='stale')
+
+        out = StringIO()
+        call_command('rebuild_post_excerpts', chunk_size=1, stdout=out)
+
+        post.refresh_from_db()
+        self.assertEqual(post.excerpt, 'Text')
+        self.assertIn('Rebuilt excerpts for 1 posts', out.getvalue())
+
+
+class TrendingTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.fresh = self.create_post('Fresh', views_count=1)
+        self.commented = self.create_post('Commented', views_count=2)
+        self.old = self.create_post('Old', views_count=100)
+
+    def test_scores_decay_and_rank(self):
+        now = timezone.now()
+        trending.record_engagement(views={self.fresh.pk: 10})
+        trending.record_engagement(comments={self.commented.pk: 1})
+        trending.record_engagement(
+            views={self.old.pk: 30}, bucket=trending.current_bucket(now - timedelta(hours=48))
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = update_trending_scores()
+
+        self.assertEqual(result['updated_posts'], 3)
+        results = self.client.get('/api/v1/posts/trending/').json()
+        self.assertEqual(
+            [post['id'] for post in results], [self.fresh.pk, self.commented.pk, self.old.pk]
+        )
+
+    def test_scores_reset_when_engagement_leaves_window(self):
+        trending.record_engagement(views={self.fresh.pk: 10})
+        update_trending_scores()
+        PostEngagement.objects.update(bucket=timezone.now() - timedelta(hours=trending.RETENTION_HOURS + 2))
+
+        result = update_trending_scores()
+
+        self.fresh.refresh_from_db()
+        self.assertEqual(self.fresh.trending_score, 0)
+        self.assertEqual(result['pruned_buckets'], 1)
+
+    def test_fallback_by_views_within_category(self):
+        other = Category.objects.create(name='Asia', slug='asia')
+        self.create_post('Elsewhere', views_count=500, category=other)
+        trending.record_engagement(views={self.fresh.pk: 1})
+        update_trending_scores()
+
+        posts = trending.trending_posts(Post.objects.all(), 3, category_id=self.category.pk)
+
+        self.assertEqual([post.pk for post in posts], [self.fresh.pk, self.old.pk, self.commented.pk])
+
+    def test_fallback_order_uses_partial_index(self):
+        queryset = Post.objects.filter(status='published').order_by('-views_count', '-id')[:10]
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        self.assertIn('posts_popular_idx', queryset.explain())
+
+
+class RelatedPostsTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+        self.lisbon = self.create_post('Lisbon trams', content='Old trams climb the hills of Lisbon')
+        self.porto = self.create_post('Porto trams', content='Old trams cross the bridges of Porto')
+        self.tokyo = self.create_post(
+            'Tokyo sushi', content='Fresh sushi at the fish market',
+            category=Category.objects.create(name='Asia', slug='asia')
+        )
+
+    def related_ids(self, post):
+        return [item['id'] for item in self.client.get(f'/api/v1/posts/{post.slug}/related/').json()]
+
+    def test_build_stores_nearest_posts(self):
+        out = StringIO()
+        call_command('build_related_posts', stdout=out)
+
+        self.assertIn('Indexed 3 posts', out.getvalue())
+        self.assertEqual(self.related_ids(self.lisbon)[0], self.porto.pk)
+        self.assertEqual(
+            PostNeighbours.objects.filter(kind=PostNeighbours.KIND_CONTENT).count(), 3
+        )
+
+    def test_changes_are_applied_from_queue(self):
+        related.rebuild()
+        with self.captureOnCommitCallbacks(execute=True):
+            sintra = self.create_post('Sintra trams from Lisbon', content='Old trams of Lisbon and Porto')
+            self.porto.status = 'draft'
+            self.porto.save()
+
+        self.assertEqual(update_related_posts(), {'updated_posts': 3, 'remaining': False})
+        neighbours = PostNeighbours.objects.get(
+            post=self.lisbon, kind=PostNeighbours.KIND_CONTENT
+        ).neighbours
+        self.assertEqual(neighbours[0][0], sintra.pk)
+        self.assertNotIn(self.porto.pk, [post_id for post_id, _ in neighbours])
+        self.assertFalse(PostNeighbours.objects.filter(post=self.porto).exists())
+
+    def test_queue_waits_for_first_build(self):
+        self.assertEqual(update_related_posts(), {'updated_posts': None, 'remaining': False})
+        self.assertEqual(RelatedPostUpdate.objects.count(), 3)
+
+
+class PostReadersTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Post')
+        self.reader = get_user_model().objects.create_user(
+            username='reader', email='reader@example.com', password='password'
+        )
+
+    def test_flush_writes_existing_pairs(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        client.get(f'/api/v1/posts/{self.post.slug}/')
+        counters.get_view_counter().add_reader(self.post.pk + 100, self.reader.pk)
+
+        self.assertEqual(flush_post_readers(), {'flushed_readers': 1})
+        self.assertEqual(
+            list(PostReader.objects.values_list('post', 'user')), [(self.post.pk, self.reader.pk)]
+        )
+        self.assertEqual(flush_post_readers(), {'flushed_readers': 0})
+
+    def test_failed_flush_restores_readers(self):
+        counter = counters.get_view_counter()
+        counter.add_reader(self.post.pk, self.reader.pk)
+
+        with mock.patch.object(PostReader.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                flush_post_readers()
+
+        self.assertEqual(counter.drain_readers(), {(self.post.pk, self.reader.pk)})
+
+
+class ArtifactsTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+
+    def test_append_and_replace(self):
+        artifacts.save('test', {'values': np.arange(3)}, timezone.now(), state={'txid': 1})
+        artifacts.append('test', {'values': np.arange(3, 5)}, timezone.now(), state={'txid': 2})
+
+        arrays, artifact = artifacts.load('test')
+        self.assertEqual(arrays['values'].tolist(), [0, 1, 2])
+        self.assertEqual([delta['values'].tolist() for delta in artifacts.load_deltas(artifact)], [[3, 4]])
+        self.assertEqual(artifact.state['txid'], 2)
+
+        storage = artifact.file.storage
+        stale = [artifact.file.name, *artifact.state['deltas']]
+        with self.captureOnCommitCallbacks(execute=True):
+            artifacts.save('test', {'values': np.arange(2)}, timezone.now())
+        self.assertFalse([name for name in stale if storage.exists(name)])
+        _, artifact = artifacts.load('test')
+        self.assertEqual(artifacts.load_deltas(artifact), [])
+
+    def test_append_requires_saved_version(self):
+        with self.assertRaises(RecommendationArtifact.DoesNotExist):
+            artifacts.append('missing', {'values': np.arange(1)}, timezone.now())
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES, VIEW_COUNTER_BACKEND='apps.main.counters.LocMemViewCounter'
+)
+class CoEngagementTests(TransactionTestCase):
+    """
+    refresh дочитывает строки до snapshot_xmin(), поэтому взаимодействия
+    должны быть закоммичены - тесты работают без общей транзакции.
+    """
+
+    def setUp(self):
+        cache.clear()
+        counters._counter = None
+        self.addCleanup(setattr, counters, '_counter', None)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        # Задачи, которые сигналы ставят после коммита, в тестах не нужны
+        patcher = mock.patch('celery.app.task.Task.apply_async')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users = [
+            get_user_model().objects.create_user(
+                username=f'user{index}', email=f'user{index}@example.com', password='password'
+            )
+            for index in range(3)
+        ]
+        self.posts = [
+            Post.objects.create(title=title, content='Text', author=self.users[0], status='published')
+            for title in ('First', 'Second', 'Third')
+        ]
+
+    def read(self, user, post):
+        PostReader.objects.create(post=post, user=user, last_seen_at=timezone.now())
+
+    def also_read(self, post):
+        return [item['id'] for item in self.client.get(f'/api/v1/posts/{post.slug}/also-read/').json()]
+
+    def test_rebuild_then_refresh_appends_delta(self):
+        first, second, third = self.posts
+        for user in self.users[:2]:
+            self.read(user, first)
+            self.read(user, second)
+        self.read(self.users[2], third)
+
+        interactions, updated = co_engagement.rebuild()
+        self.assertEqual((len(interactions), updated), (5, 3))
+        self.assertEqual(self.also_read(first), [second.pk])
+
+        self.read(self.users[2], first)
+        self.assertEqual(refresh_co_engagement(), {'interactions': 6, 'updated_posts': 1})
+
+        self.assertEqual(self.also_read(first), [second.pk, third.pk])
+        _, artifact = co_engagement.load_stored()
+        self.assertEqual(len(artifact.state['deltas']), 1)
+
+
+class ConditionalGetTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.post = self.create_post('Post')
+
+    def test_counter_flush_invalidates_detail_etag(self):
+        url = f'/api/v1/posts/{self.post.slug}/'
+        # Первый ответ запоминает пост ответа, ETag отдается со второго
+        self.assertNotIn('ETag', self.client.get(url))
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            flush_view_counts()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # 3 сброшенных просмотра + текущий из буфера
+        self.assertEqual(response.json()['views_count'], 4)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_change_invalidates_etag(self):
+        url = '/api/v1/posts/categories/'
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Asia', slug='asia')
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_streaming_response_has_no_validators(self):
+        request = Request(RequestFactory().get('/'))
+        response = conditional_response(
+            request, make_etag('stream'), timezone.now(),
+            lambda: StreamingHttpResponse(iter([b'{}\n']))
+        )
+
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+
+class BatchPostsTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_post('First')
+        self.second = self.create_post('Second')
+        self.draft = self.create_post('Draft', status='draft')
+
+    def test_posts_in_request_order_with_missing(self):
+        data = self.client.get('/api/v1/posts/batch/', {
+            'ids': f'{self.second.pk},{self.draft.pk},{self.first.pk}',
+            'slugs': f'{self.second.slug},unknown',
+        }).json()
+
+        self.assertEqual([post['id'] for post in data['results']], [self.second.pk, self.first.pk])
+        self.assertEqual(data['missing'], {'ids': [self.draft.pk], 'slugs': ['unknown']})
+
+    def test_author_sees_own_draft(self):
+        client = APIClient()
+        client.force_authenticate(self.author)
+
+        data = client.get('/api/v1/posts/batch/', {'slugs': self.draft.slug}).json()
+
+        self.assertEqual([post['id'] for post in data['results']], [self.draft.pk])
+
+    def test_invalid_requests(self):
+        url = '/api/v1/posts/batch/'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'ids': '1,x'}).status_code, 400)
+        too_many = ','.join(str(index) for index in range(views.BATCH_LIMIT + 1))
+        self.assertEqual(self.client.get(url, {'ids': too_many}).status_code, 400)
+
+    def test_single_query_for_posts(self):
+        ids = f'{self.first.pk},{self.second.pk}'
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/v1/posts/batch/', {'ids': ids})
+
+        self.assertEqual(len([query for query in queries if 'FROM "posts"' in query['sql']]), 1)
+
+
+class SparseFieldsTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.first = self.create_post('First')
+        self.second = self.create_post('Second')
+
+    def test_fields_limit_response_and_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get('/api/v1/posts/', {'fields': 'id,title'}).json()['results']
+
+        self.assertEqual([set(post) for post in results], [{'id', 'title'}] * 2)
+        post_queries = [query['sql'] for query in queries if 'FROM "posts"' in query['sql']]
+        self.assertTrue(post_queries)
+        for sql in post_queries:
+            self.assertNotIn('"excerpt"', sql)
+            self.assertNotIn('JOIN', sql)
+
+    def test_exclude_and_detail(self):
+        results = self.client.get(
+            '/api/v1/posts/', {'exclude': 'pinned_info,author'}
+        ).json()['results']
+        self.assertNotIn('author', results[0])
+        self.assertIn('title', results[0])
+
+        data = self.client.get(f'/api/v1/posts/{self.first.slug}/', {'fields': 'id,slug'}).json()
+        self.assertEqual(data, {'id': self.first.pk, 'slug': self.first.slug})
+
+    def test_cursor_pages_with_sparse_fields(self):
+        page = self.client.get(
+            '/api/v1/posts/', {'pagination': 'cursor', 'page_size': 1, 'fields': 'id'}
+        ).json()
+        self.assertEqual(page['results'], [{'id': self.second.pk}])
+
+        page = self.client.get(page['next']).json()
+        self.assertEqual(page['results'], [{'id': self.first.pk}])
+
+
+class CategoryPostsTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/v1/posts/categories/{self.category.slug}/posts/'
+        self.first = self.create_post('First')
+        self.second = self.create_post('Second')
+        self.create_post('Elsewhere', category=Category.objects.create(name='Asia', slug='asia'))
+
+    def stream(self, **params):
+        response = self.client.get(self.url, {'stream': 'ndjson', **params})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        body = b''.join(response.streaming_content).decode()
+        return response, [json.loads(line) for line in body.splitlines()]
+
+    def test_cursor_pages(self):
+        data = self.client.get(self.url, {'page_size': 1}).json()
+        self.assertEqual([post['id'] for post in data['posts']], [self.second.pk])
+        self.assertEqual(data['category']['slug'], self.category.slug)
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([post['id'] for post in data['posts']], [self.first.pk])
+        self.assertIsNone(data['next'])
+
+    def test_stream_has_all_posts_without_validators(self):
+        self.stream(fields='id')
+        # Посты потока отмечаются уже после возврата ответа: ETag второго
+        # ответа не учитывал бы их счетчики
+        response, rows = self.stream(fields='id')
+
+        self.assertEqual(rows, [{'id': self.second.pk}, {'id': self.first.pk}])
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    def test_stream_is_not_cached(self):
+        self.stream()
+        # Версии областей не меняются (нет коммита) - кэш ответа был бы устаревшим
+        third = self.create_post('Third')
+
+        _, rows = self.stream(fields='id')
+        self.assertEqual(rows[0], {'id': third.pk})
+
+    def test_unknown_category(self):
+        url = '/api/v1/posts/categories/unknown/posts/'
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(url, {'stream': 'ndjson'}).status_code, 404)
+
+
+class HomeSnapshotTests(PostTestCase):
+    def home(self, **headers):
+        return json.loads(self.client.get('/api/v1/home/', **headers).content)
+
+    def test_gzip_only_when_accepted(self):
+        for header, encoding in [
+            ('gzip, deflate', 'gzip'), ('gzip;q=0', None), ('br, *', 'gzip'), ('identity', None),
+        ]:
+            response = self.client.get('/api/v1/home/', HTTP_ACCEPT_ENCODING=header)
+            self.assertEqual(response.get('Content-Encoding'), encoding, header)
+
+    def test_image_urls_are_absolute(self):
+        self.create_post('Post', image='posts/photo.jpg')
+
+        with self.settings(SITE_URL='https://api.example.com'):
+            post = self.home()['recent_posts'][0]
+
+        self.assertEqual(post['image'], 'https://api.example.com/media/posts/photo.jpg')
+
+    def test_changes_schedule_one_rebuild(self):
+        self.assertEqual(self.home()['recent_posts'], [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_post('First')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_post('Second')
+
+        rebuilds = [
+            call for call in self.apply_async.call_args_list
+            if call == mock.call(countdown=home.HOME_DEBOUNCE)
+        ]
+        self.assertEqual(len(rebuilds), 1)
+        self.assertEqual(self.home()['recent_posts'], [])
+        rebuild_home_snapshot()
+        self.assertEqual(
+            [post['title'] for post in self.home()['recent_posts']], ['Second', 'First']
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SyncTests(TransactionTestCase):
+    """
+    Потоки читаются до snapshot_xmin(), поэтому изменения должны быть
+    закоммичены - тесты работают без общей транзакции.
+    """
+
+    def setUp(self):
+        cache.clear()
+        # Задачи, которые сигналы ставят после коммита, в тестах не нужны
+        patcher = mock.patch('celery.app.task.Task.apply_async')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.author = get_user_model().objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+        self.category = Category.objects.create(name='Europe', slug='europe')
+        self.post = Post.objects.create(
+            title='Published', content='Text', author=self.author,
+            category=self.category, status='published'
+        )
+        self.draft = Post.objects.create(
+            title='Draft', content='Text', author=self.author,
+            category=self.category, status='draft'
+        )
+        self.comment = Comment.objects.create(post=self.post, author=self.author, content='Hi')
+
+    def _ids(self, data, name):
+        return [row['id'] for row in data[name]['updated']]
+
+    def test_initial_sync_then_no_changes(self):
+        data = sync.changes(None)
+
+        self.assertEqual(self._ids(data, 'posts'), [self.post.pk])
+        self.assertEqual(data['posts']['deleted'], [self.draft.pk])
+        self.assertEqual(self._ids(data, 'categories'), [self.category.pk])
+        self.assertEqual(self._ids(data, 'comments'), [self.comment.pk])
+        self.assertFalse(data['has_more'])
+
+        data = sync.changes(data['next'])
+        self.assertEqual(data['posts'], {'updated': [], 'deleted': []})
+        self.assertEqual(data['comments'], {'updated': [], 'deleted': []})
+
+    def test_queryset_update_is_synced(self):
+        token = sync.changes(None)['next']
+
+        Post.objects.filter(pk=self.post.pk).update(title='Renamed')
+        data = sync.changes(token)
+
+        self.assertEqual([row['title'] for row in data['posts']['updated']], ['Renamed'])
+
+    def test_counter_updates_are_not_synced(self):
+        token = sync.changes(None)['next']
+
+        Post.objects.filter(pk=self.post.pk).update(views_count=F('views_count') + 5)
+        data = sync.changes(token)
+
+        self.assertEqual(data['posts']['updated'], [])
+
+    def test_deletions_come_from_tombstones(self):
+        token = sync.changes(None)['next']
+        post_id, comment_id = self.post.pk, self.comment.pk
+
+        self.comment.delete()
+        self.post.delete()
+        data = sync.changes(token)
+
+        self.assertEqual(data['posts']['deleted'], [post_id])
+        self.assertEqual(data['comments']['deleted'], [comment_id])
+        # Позиция надгробий сдвинулась - повторно не отдаются
+        data = sync.changes(data['next'])
+        self.assertEqual(data['posts']['deleted'], [])
+
+    def test_limit_continues_from_token(self):
+        token = sync.changes(None)['next']
+        Category.objects.bulk_create([
+            Category(name=f'Category {index}', slug=f'category-{index}') for index in range(3)
+        ])
+
+        first = sync.changes(token, limit=2)
+        second = sync.changes(first['next'], limit=2)
+
+        self.assertTrue(first['has_more'])
+        self.assertFalse(second['has_more'])
+        self.assertEqual(
+            [row['slug'] for row in first['categories']['updated'] + second['categories']['updated']],
+            ['category-0', 'category-1', 'category-2']
+        )
+
+    def test_invalid_and_expired_tokens(self):
+        with self.assertRaises(sync.InvalidToken):
+            sync.changes('garbage')
+
+        positions = sync.initial_positions(0)
+        expired = sync.encode_token(positions, timezone.now() - sync.TOMBSTONE_RETENTION)
+        with self.assertRaises(sync.ExpiredToken):
+            sync.changes(expired)
+
+        response = self.client.get('/api/v1/sync/', {'since': expired})
+        self.assertEqual(response.status_code, 410)
+
+
+class CategoryBundleTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+        self.url = f'/api/v1/posts/categories/{self.category.slug}/bundle/'
+        self.first = self.create_post('First')
+        self.second = self.create_post('Second')
+
+    def archive(self, **headers):
+        response = self.client.get(self.url, **headers)
+        return response, b''.join(response.streaming_content)
+
+    def test_missing_bundle_schedules_build(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], str(bundles.BUNDLE_DEBOUNCE))
+        self.apply_async.assert_any_call((self.category.pk,), countdown=bundles.BUNDLE_DEBOUNCE)
+        self.assertEqual(self.client.get('/api/v1/posts/categories/unknown/bundle/').status_code, 404)
+
+    def test_rebuild_reuses_unchanged_posts(self):
+        self.assertEqual(bundles.build(self.category.pk)['rebuilt_posts'], 2)
+        self.assertTrue(bundles.build(self.category.pk)['unchanged'])
+
+        self.first.title = 'Renamed'
+        self.first.save()
+        result = bundles.build(self.category.pk)
+
+        self.assertEqual((result['version'], result['rebuilt_posts']), (2, 1))
+        _, body = self.archive()
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            manifest = json.loads(archive.read(bundles.MANIFEST_NAME))
+            first = json.loads(archive.read(bundles.post_path(self.first.pk)))
+            second = json.loads(archive.read(bundles.post_path(self.second.pk)))
+        self.assertEqual(manifest['version'], 2)
+        self.assertEqual([post['id'] for post in manifest['posts']], [self.second.pk, self.first.pk])
+        self.assertEqual(first['post']['title'], 'Renamed')
+        self.assertEqual(second['post']['content'], 'Text')
+
+    def test_resume_download_and_manifest_validators(self):
+        bundles.build(self.category.pk)
+        response, body = self.archive()
+
+        partial, chunk = self.archive(HTTP_RANGE='bytes=10-', HTTP_IF_RANGE=response['ETag'])
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(chunk, body[10:])
+
+        manifest_url = self.url + 'manifest/'
+        manifest = self.client.get(manifest_url)
+        self.assertEqual(f'"{manifest.json()["sha256"]}"', response['ETag'])
+        etag = manifest['ETag']
+        self.assertEqual(self.client.get(manifest_url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class RangeTests(SimpleTestCase):
+    body = bytes(range(256)) * 4
+    etag = '"bundle-1"'
+    last_modified = 1_700_000_000
+
+    def _response(self, **headers):
+        request = RequestFactory().get('/', **headers)
+        return ranged_file_response(
+            request, io.BytesIO(self.body), len(self.body), self.etag,
+            self.last_modified, 'application/octet-stream'
+        )
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+        self.assertEqual(parse_range('bytes=990-2000', 1000), (990, 999))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(parse_range('items=0-1', 1000))
+        self.assertIsNone(parse_range(None, 1000))
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=1000-', 1000)
+        with self.assertRaises(RangeNotSatisfiable):
+            parse_range('bytes=-0', 1000)
+
+    def test_partial_content(self):
+        response = self._response(HTTP_RANGE='bytes=10-19')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.body)}')
+        self.assertEqual(b''.join(response.streaming_content), self.body[10:20])
+
+    def test_full_content_without_range(self):
+        response = self._response()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.body)
+
+    def test_unsatisfiable_range(self):
+        response = self._response(HTTP_RANGE='bytes=5000-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+    def test_if_range(self):
+        matching = self._response(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=self.etag)
+        by_date = self._response(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=http_date(self.last_modified))
+        changed = self._response(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"bundle-2"')
+        weak = self._response(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='W/' + self.etag)
+
+        self.assertEqual([matching.status_code, by_date.status_code], [206, 206])
+        self.assertEqual([changed.status_code, weak.status_code], [200, 200])
+
+    def test_not_modified(self):
+        response = self._response(HTTP_IF_NONE_MATCH=self.etag, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, 304)
+
+
+class GeoRangesTests(SimpleTestCase):
+    def _in_ranges(self, cells, ranges):
+        return np.array([any(low <= cell < high for low, high in ranges) for cell in cells])
+
+    def test_covering_ranges_contain_every_point_in_radius(self):
+        rng = np.random.default_rng(1)
+        for lat, lng, radius in [
+            (55.75, 37.62, 10.0), (-33.9, 151.2, 50.0), (0.0, 179.99, 25.0),
+            (78.2, 15.6, 200.0), (89.9, 0.0, 5.0), (41.9, 12.5, 0.5),
+        ]:
+            bearings = rng.uniform(0, 2 * np.pi, 2000)
+            distances = radius * np.sqrt(rng.uniform(0, 1, 2000))
+            lats = np.clip(lat + distances * np.cos(bearings) / geo.KM_PER_DEGREE, -90, 90)
+            lngs = lng + distances * np.sin(bearings) / (
+                geo.KM_PER_DEGREE * max(np.cos(np.radians(lat)), 1e-3)
+            )
+            lngs = (lngs + 180.0) % 360.0 - 180.0
+            inside = geo.haversine_km(lat, lng, lats, lngs) <= radius
+
+            covered = self._in_ranges(geo.cell_ids(lats, lngs), geo.covering_ranges(lat, lng, radius))
+
+            self.assertTrue(covered[inside].all(), (lat, lng, radius))
+
+    def test_rank_matches_brute_force(self):
+        lats, lngs = geo.synthetic_points(5000, seed=3)
+        ids = np.arange(len(lats))
+        lat, lng, radius = float(lats[0]), float(lngs[0]), 50.0
+
+        result = geo.rank(ids, lats, lngs, lat, lng, radius, limit=20)
+
+        distances = geo.haversine_km(lat, lng, lats, lngs)
+        expected = [int(i) for i in np.argsort(distances, kind='stable') if distances[i] <= radius][:20]
+        self.assertEqual([pk for pk, _ in result], expected)
+
+    def test_bbox_ranges_contain_every_point_in_box(self):
+        rng = np.random.default_rng(2)
+        min_lat, min_lng, max_lat, max_lng = 45.1, 5.3, 47.8, 10.4
+        lats = rng.uniform(min_lat, max_lat, 2000)
+        lngs = rng.uniform(min_lng, max_lng, 2000)
+
+        ranges = geo.bbox_ranges(min_lat, min_lng, max_lat, max_lng)
+
+        self.assertLessEqual(len(ranges), 4)
+        self.assertTrue(self._in_ranges(geo.cell_ids(lats, lngs), ranges).all())
+
+
+class NearbyPostsTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lisbon = self.create_post('Lisbon', latitude=38.7223, longitude=-9.1393)
+        self.porto = self.create_post('Porto', latitude=41.1579, longitude=-8.6291)
+        self.create_post('Nowhere')
+
+    def nearby(self, **params):
+        return self.client.get('/api/v1/posts/nearby/', {'lat': 38.71, 'lng': -9.14, **params})
+
+    def test_posts_ordered_by_distance(self):
+        self.assertIsNotNone(Post.objects.get(pk=self.lisbon.pk).geo_cell)
+
+        results = self.nearby(radius=5).json()['results']
+        self.assertEqual([post['id'] for post in results], [self.lisbon.pk])
+        self.assertAlmostEqual(results[0]['distance_km'], 1.37, delta=0.05)
+
+        # Коимбра - между Порту (~110 км) и Лиссабоном (~175 км)
+        results = self.nearby(lat=40.2, lng=-8.42, radius=200).json()['results']
+        self.assertEqual([post['id'] for post in results], [self.porto.pk, self.lisbon.pk])
+
+    def test_invalid_parameters(self):
+        self.assertEqual(self.client.get('/api/v1/posts/nearby/').status_code, 400)
+        self.assertEqual(self.nearby(lat=91).status_code, 400)
+        self.assertEqual(self.nearby(radius=geo.MAX_RADIUS_KM + 1).status_code, 400)
+
+
+class MapTilesTests(PostTestCase):
+    def setUp(self):
+        super().setUp()
+        self.baixa = self.create_post('Baixa', latitude=38.7107, longitude=-9.1366, trending_score=5)
+        self.belem = self.create_post('Belem', latitude=38.6916, longitude=-9.2160)
+        self.porto = self.create_post('Porto', latitude=41.1579, longitude=-8.6291)
+        build_map_tiles()
+
+    def clusters(self, bbox, zoom):
+        tiles = self.client.get('/api/v1/posts/map/', {'bbox': bbox, 'zoom': zoom}).json()['tiles']
+        return [cluster for tile in tiles for cluster in tile['clusters']]
+
+    def test_clusters_split_with_zoom(self):
+        clusters = self.clusters('-10,38,-8,42', 5)
+        self.assertEqual(sorted(cluster['count'] for cluster in clusters), [1, 2])
+        lisbon = max(clusters, key=lambda cluster: cluster['count'])
+        # Представитель кластера - пост с наибольшим trending_score
+        self.assertEqual(lisbon['post']['id'], self.baixa.pk)
+
+        clusters = self.clusters('-9.25,38.68,-9.10,38.72', 12)
+        self.assertEqual(
+            sorted(cluster['post']['id'] for cluster in clusters), [self.baixa.pk, self.belem.pk]
+        )
+
+    def test_moved_post_rebuilds_dirty_tiles(self):
+        self.assertEqual(len(self.clusters('-10,38,-8,42', 5)), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.belem.latitude, self.belem.longitude = 41.15, -8.61
+            self.belem.save()
+        self.apply_async.assert_any_call(countdown=map_tiles.MAP_DEBOUNCE)
+        with self.captureOnCommitCallbacks(execute=True):
+            result = rebuild_dirty_map_tiles()
+
+        self.assertGreater(result['rebuilt_tiles'], 0)
+        self.assertFalse(MapTile.objects.filter(dirty_at__isnull=False).exists())
+        porto = max(self.clusters('-10,38,-8,42', 5), key=lambda cluster: cluster['count'])
+        self.assertEqual(porto['count'], 2)
+        # Инкрементальный пересчет совпадает с полным
+        self.assertEqual(map_tiles.build_all(), 0)
+
+    def test_cached_tiles_are_read_without_queries(self):
+        self.clusters('-10,38,-8,42', 5)
+
+        with self.assertNumQueries(0):
+            tiles = map_tiles.get_tiles(5, map_tiles.tile_range(-10, 38, -8, 42, 5))
+        self.assertEqual(sum(len(clusters) for clusters in tiles.values()), 2)
+
+    def test_invalid_requests(self):
+        url = '/api/v1/posts/map/'
+        self.assertEqual(self.client.get(url, {'zoom': 5}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'bbox': '-10,42,-8,38', 'zoom': 5}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'bbox': '-180,-85,180,85', 'zoom': 10}).status_code, 400)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'GROUPING SETS')
+class FacetTests(PostTestCase):
+    def test_facets_count_filtered_posts(self):
+        other = Category.objects.create(name='Asia', slug='asia')
+        self.create_post('One')
+        self.create_post('Two')
+        self.create_post('Three', category=other)
+        self.create_post('Draft', status='draft')
+
+        response = self.client.get('/api/v1/posts/', {'facets': 'category,month'})
+
+        facets = response.json()['facets']
+        self.assertEqual(
+            [(value['slug'], value['count']) for value in facets['category']],
+            [('europe', 2), ('asia', 1)]
+        )
+        self.assertEqual(facets['month'], [{'month': timezone.now().strftime('%Y-%m'), 'count': 3}])
+
+        response = self.client.get('/api/v1/posts/', {'facets': 'author', 'category': other.pk})
+        self.assertEqual(response.json()['facets']['author'][0]['count'], 1)
+
+    def test_unknown_facet(self):
+        response = self.client.get('/api/v1/posts/', {'facets': 'color'})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,175 @@
+"""
+Трендовые посты.
+
+Вовлеченность (просмотры + комментарии) копится почасовыми корзинами в
+post_engagement. Задача update_trending_scores пересчитывает
+posts.trending_score - сумму вовлеченности за окно с экспоненциальным
+затуханием - только для постов с активностью в окне, а затем сохраняет
+в кэше готовые top-N: общий и по каждой категории. Эндпоинты читают
+эти списки вместо сортировки таблицы постов.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, F, FloatField, Sum, Value, When
+from django.utils import timezone
+
+from .models import Post, PostEngagement
+
+
+WINDOW_HOURS = 72
+HALF_LIFE_HOURS = 12
+COMMENT_WEIGHT = 5
+# Корзины старше удаляются задачей (окно + запас)
+RETENTION_HOURS = 7 * 24
+TOP_N = 50
+TOP_CACHE_KEY = 'trending:top'
+# Ключ общего списка в словаре top-N (остальные ключи - id категорий)
+ALL_CATEGORIES = 0
+
+UPDATE_BATCH_SIZE = 500
+
+
+def current_bucket(now=None):
+    """Начало часа, к которому относится момент now"""
+    return (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def record_engagement(views=None, comments=None, bucket=None):
+    """
+    Прибавляет {post_id: n} просмотров и комментариев к корзине bucket
+    (по умолчанию - текущий час). Один INSERT ... ON CONFLICT на пост;
+    несуществующие (удаленные) посты пропускаются.
+    """
+    views = views or {}
+    comments = comments or {}
+    bucket = connection.ops.adapt_datetimefield_value(bucket or current_bucket())
+    rows = [
+        (bucket, views.get(post_id, 0), comments.get(post_id, 0), post_id)
+        for post_id in sorted(set(views) | set(comments))
+        if views.get(post_id) or comments.get(post_id)
+    ]
+    if not rows:
+        return 0
+
+    table = connection.ops.quote_name(PostEngagement._meta.db_table)
+    posts = connection.ops.quote_name(Post._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (post_id, bucket, views, comments) '
+            f'SELECT id, %s, %s, %s FROM {posts} WHERE id = %s '
+            f'ON CONFLICT (post_id, bucket) DO UPDATE SET '
+            f'views = {table}.views + EXCLUDED.views, '
+            f'comments = {table}.comments + EXCLUDED.comments',
+            rows
+        )
+    return len(rows)
+
+
+def decay_weights(now=None):
+    """{начало часа: вес} для корзин окна, вес = 2 ** (-возраст / период полураспада)"""
+    now = now or timezone.now()
+    latest = current_bucket(now)
+    weights = {}
+    for hours in range(WINDOW_HOURS):
+        bucket = latest - timedelta(hours=hours)
+        age = (now - bucket).total_seconds() / 3600
+        weights[bucket] = 0.5 ** (age / HALF_LIFE_HOURS)
+    return weights
+
+
+def compute_scores(now=None):
+    """{post_id: trending_score} для постов с вовлеченностью в окне"""
+    weights = decay_weights(now)
+    rows = PostEngagement.objects.filter(
+        bucket__gte=min(weights)
+    ).values('post_id').annotate(
+        score=Sum(
+            (F('views') + F('comments') * COMMENT_WEIGHT) * Case(
+                *[When(bucket=bucket, then=Value(weight)) for bucket, weight in weights.items()],
+                default=Value(0.0),
+                output_field=FloatField()
+            ),
+            output_field=FloatField()
+        )
+    ).values_list('post_id', 'score')
+    return {post_id: round(score or 0, 4) for post_id, score in rows}
+
+
+def update_scores(now=None):
+    """
+    Записывает новые trending_score. Трогаются только посты с активностью
+    в окне и посты, у которых счет был ненулевым (они обнуляются).
+    """
+    scores = compute_scores(now)
+    stored = dict(
+        Post.objects.filter(trending_score__gt=0).values_list('id', 'trending_score')
+    )
+    changed = [
+        Post(id=post_id, trending_score=scores.get(post_id, 0))
+        for post_id in set(scores) | set(stored)
+        if scores.get(post_id, 0) != stored.get(post_id, 0)
+    ]
+    Post.objects.bulk_update(changed, ['trending_score'], batch_size=UPDATE_BATCH_SIZE)
+    return len(changed)
+
+
+def build_top_lists():
+    """Сохраняет в кэше top-N id постов: общий и по категориям"""
+    top = defaultdict(list)
+    rows = Post.objects.filter(
+        status='published', trending_score__gt=0
+    ).order_by('-trending_score', '-id').values_list('id', 'category_id')
+    for post_id, category_id in rows.iterator():
+        if len(top[ALL_CATEGORIES]) < TOP_N:
+            top[ALL_CATEGORIES].append(post_id)
+        if category_id is not None and len(top[category_id]) < TOP_N:
+            top[category_id].append(post_id)
+    cache.set(TOP_CACHE_KEY, dict(top), None)
+    return top
+
+
+def prune_engagement(now=None):
+    """Удаляет корзины старше RETENTION_HOURS"""
+    cutoff = current_bucket(now) - timedelta(hours=RETENTION_HOURS)
+    deleted, _ = PostEngagement.objects.filter(bucket__lt=cutoff).delete()
+    return deleted
+
+
+def trending_posts(queryset, limit, category_id=None, exclude_ids=(),
+                   fallback_order='-views_count'):
+    """
+    До limit трендовых постов из queryset в порядке trending_score.
+    Если трендовых меньше limit, список дополняется по fallback_order
+    (для '-views_count' есть частичные индексы posts_popular_idx и
+    posts_category_popular_idx).
+    """
+    exclude_ids = set(exclude_ids)
+    queryset = queryset.filter(status='published')
+    if category_id is not None:
+        queryset = queryset.filter(category_id=category_id)
+
+    top = cache.get(TOP_CACHE_KEY)
+    if top is None:
+        # Списки еще не построены - читаем индекс (status, -trending_score)
+        posts = list(
+            queryset.filter(trending_score__gt=0).exclude(id__in=exclude_ids)
+            .order_by('-trending_score', '-id')[:limit]
+        )
+    else:
+        ids = [
+            post_id for post_id in top.get(category_id or ALL_CATEGORIES, [])
+            if post_id not in exclude_ids
+        ]
+        # Запас на посты, снятые с публикации после построения списка
+        found = queryset.in_bulk(ids[:limit * 2])
+        posts = [found[post_id] for post_id in ids if post_id in found][:limit]
+
+    if len(posts) < limit:
+        seen = exclude_ids | {post.id for post in posts}
+        posts += list(
+            queryset.exclude(id__in=seen).order_by(fallback_order, '-id')[:limit - len(posts)]
+        )
+    return posts
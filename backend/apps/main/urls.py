@@ -6,13 +6,23 @@ urlpatterns = [
     path('categories/', views.CategoryListCreateView.as_view(), name='category-list'),
     path('categories/<slug:slug>/', views.CategoryDetailView.as_view(), name='category-detail'),
     path('categories/<slug:category_slug>/posts/', views.post_by_category, name='posts-by-category'),
+    path('categories/<slug:slug>/bundle/', views.category_bundle, name='category-bundle'),
+    path('categories/<slug:slug>/bundle/manifest/', views.category_bundle_manifest, name='category-bundle-manifest'),
     
     # Posts
     path('', views.PostListCreateView.as_view(), name='post-list'),
     path('my-posts/', views.MyPostsView.as_view(), name='my-posts'),
     path('popular/', views.popular_posts, name='popular-posts'),
+    path('trending/', views.trending_posts, name='trending-posts'),
     path('pinned/', views.pinned_posts_only, name='pinned-posts-only'),
     path('featured/', views.featured_posts, name='featured-posts'),
     path('recent/', views.recent_posts, name='recent-posts'),
+    path('search/', views.search_posts, name='post-search'),
+    path('suggest/', views.suggest_posts, name='post-suggest'),
+    path('nearby/', views.nearby_posts, name='post-nearby'),
+    path('map/', views.map_clusters, name='post-map'),
+    path('batch/', views.batch_posts, name='post-batch'),
     path('<slug:slug>/', views.PostDetailView.as_view(), name='post-detail'),
+    path('<slug:slug>/related/', views.related_posts, name='post-related'),
+    path('<slug:slug>/also-read/', views.also_read_posts, name='post-also-read'),
 ]
\ No newline at end of file
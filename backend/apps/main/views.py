@@ -1,21 +1,65 @@
+import math
+
 from rest_framework import generics, permissions, status, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
 
-from .models import Category, Post
+from .models import Category, CategoryBundle, Post, PostNeighbours
 from .serializers import (
     CategorySerializer,
     PostListSerializer,
     PostDetailSerializer,
-    PostCreateUpdateSerializer
+    PostCreateUpdateSerializer,
+    PostNearbySerializer,
+    PostSearchResultSerializer
 )
 from .permissions import IsAuthorOrReadOnly
+from .counters import apply_pending_views, get_visitor_key
+from .pagination import FeedCursorPagination
+from .search import FullTextSearchFilter, ranked_search, attach_highlights
+from .suggest import suggest, DEFAULT_LIMIT
+from .response_cache import (
+    cache_response,
+    CachedListMixin,
+    POST_LIST_SCOPES,
+    TRENDING_LIST_SCOPES,
+    RELATED_LIST_SCOPES,
+)
+from .conditional import (
+    conditional_response,
+    conditional_view,
+    ConditionalListMixin,
+    ConditionalRetrieveMixin,
+    POST_VALIDATOR_SCOPES,
+    TRENDING_VALIDATOR_SCOPES,
+    RELATED_VALIDATOR_SCOPES,
+    CATEGORY_VALIDATOR_SCOPES,
+)
+from .related import get_neighbour_posts
+from .sparse import sparse_queryset, SparseQuerysetMixin
+from .facets import FacetedListMixin
+from .streaming import ndjson_response, wants_stream
+from .trending import trending_posts as get_trending_posts, TOP_N
+from .home import accepts_gzip, get_snapshot
+from .ranges import ranged_file_response
+from . import bundles, geo, map_tiles, sync
+
 
+# Колонки позиции курсора ленты (нужны и при ?fields=)
+FEED_POSITION_FIELDS = tuple(field for field, _, _ in FeedCursorPagination.ordering)
 
-class CategoryListCreateView(generics.ListCreateAPIView):
+
+class CategoryListCreateView(ConditionalListMixin, generics.ListCreateAPIView):
     """API endpoint для категорий"""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -24,33 +68,51 @@ class CategoryListCreateView(generics.ListCreateAPIView):
     search_fields = ['name', 'description']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    validator_scopes = CATEGORY_VALIDATOR_SCOPES
 
 
-class CategoryDetailView(generics.RetrieveUpdateDestroyAPIView):
+class CategoryDetailView(ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     """API endpoint для конкретной категории"""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
     lookup_field = 'slug'
+    validator_scopes = CATEGORY_VALIDATOR_SCOPES
 
 
-class PostListCreateView(generics.ListCreateAPIView):
+class PostListCreateView(
+    SparseQuerysetMixin, ConditionalListMixin, CachedListMixin, FacetedListMixin,
+    generics.ListCreateAPIView
+):
     """
     API endpoint для постов c поддержкой закрепленных постов.
     Закрепленные посты отображаются первыми в порядке закрепления.
+
+    Пагинация: по умолчанию постраничная (?page=), для ленты доступна
+    курсорная без COUNT(*) - ?pagination=cursor или ?cursor=<курсор>.
+    Ответы анонимным пользователям кэшируются (CachedListMixin).
+    Условные запросы проверяются по версиям областей без запроса к БД:
+    любое сохранение или удаление поста меняет SCOPE_POSTS.
+    Счетчики по категориям, авторам и месяцам для текущего фильтра -
+    ?facets=category,author,month (FacetedListMixin).
     """
     serializer_class = PostListSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'author', 'status']
-    search_fields = ['title', 'content']
-    ordering_fields = ['created_at', 'updated_at', 'views_count', 'title']
+    ordering_fields = [
+        'created_at', 'updated_at', 'views_count', 'unique_views', 'unique_views_7d',
+        'trending_score', 'title'
+    ]
     ordering = ['-created_at']
+    validator_scopes = TRENDING_VALIDATOR_SCOPES
+    validator_field = None
+    sparse_extra_fields = FEED_POSITION_FIELDS
 
     def get_queryset(self):
         """Возвращает посты с учетом прав доступа"""
 
-        queryset = Post.objects.select_related('author', 'category')
+        queryset = Post.objects.select_related('author', 'category').defer('content')
 
         # фильрация по правам доступа
         if not self.request.user.is_authenticated:
@@ -60,12 +122,10 @@ class PostListCreateView(generics.ListCreateAPIView):
                 Q(status='published') | Q(author=self.request.user)
             )
 
-        # Проверяем, нужна ли сортировка с учетом закрепленных постов
-        ordering = self.request.query_params.get('ordering', '')
-        show_pinned_first = not ordering or ordering in ['-created_at', 'created_at']
-        
-        if show_pinned_first:
-            return Post.objects.get_posts_for_feed().filter(
+        if self.show_pinned_first():
+            return Post.objects.get_posts_for_feed().select_related(
+                'author', 'category'
+            ).defer('content').filter(
                 Q(status='published') | (
                     Q(author=self.request.user) if self.request.user.is_authenticated else Q()
                 )
@@ -73,6 +133,26 @@ class PostListCreateView(generics.ListCreateAPIView):
 
         return queryset
     
+    def show_pinned_first(self):
+        """Проверяем, нужна ли сортировка с учетом закрепленных постов"""
+        ordering = self.request.query_params.get('ordering', '')
+        return not ordering or ordering in ['-created_at', 'created_at']
+
+    @property
+    def paginator(self):
+        """Курсорная пагинация для ленты, постраничная - для остальных случаев"""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            use_cursor = (
+                params.get('pagination') == 'cursor'
+                or FeedCursorPagination.cursor_query_param in params
+            )
+            if use_cursor and self.show_pinned_first():
+                self._paginator = FeedCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return PostCreateUpdateSerializer
@@ -88,12 +168,16 @@ class PostListCreateView(generics.ListCreateAPIView):
         
         return response
 
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
+class PostDetailView(
+    SparseQuerysetMixin, ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView
+):
     """API endpoint для конкретного поста"""
     queryset = Post.objects.select_related('author', 'category')
     serializer_class = PostDetailSerializer
     permission_classes = [IsAuthorOrReadOnly]
     lookup_field = 'slug'
+    validator_scopes = POST_VALIDATOR_SCOPES
+    sparse_extra_fields = ('updated_at',)
 
     def get_serializer_class(self):
         if self.request.method in ['PUT', 'PATCH']:
@@ -101,87 +185,388 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
         return PostDetailSerializer
     
     def retrieve(self, request, *args, **kwargs):
-        """Увеличивает счетчик просмотров при GET запросе"""
+        """
+        Увеличивает счетчик просмотров при GET запросе - в том числе
+        когда клиент получает 304.
+        """
         instance = self.get_object()
 
         if request.method == 'GET':
-            instance.increment_views()
+            instance.increment_views(
+                visitor=get_visitor_key(request),
+                reader_id=request.user.pk if request.user.is_authenticated else None
+            )
 
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
+        def render():
+            apply_pending_views([instance])
+            return Response(self.get_serializer(instance).data)
+
+        etag, last_modified = self.get_object_validators(instance)
+        return conditional_response(request, etag, last_modified, render)
     
-class MyPostsView(generics.ListAPIView):
+class MyPostsView(SparseQuerysetMixin, ConditionalListMixin, generics.ListAPIView):
     """API endpoint для постов текущего пользователя"""
     serializer_class = PostListSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'status']
-    search_fields = ['title', 'content']
-    ordering_fields = ['created_at', 'updated_at', 'views_count', 'title']
+    ordering_fields = [
+        'created_at', 'updated_at', 'views_count', 'unique_views', 'unique_views_7d',
+        'trending_score', 'title'
+    ]
     ordering = ['-created_at']
+    validator_scopes = TRENDING_VALIDATOR_SCOPES
+    validator_field = None
 
     def get_queryset(self):
         return Post.objects.filter(
             author=self.request.user
-        ).select_related('author', 'category')
+        ).select_related('author', 'category').defer('content')
     
 
+def category_posts(request, category_slug):
+    """Посты категории - для валидаторов post_by_category"""
+    return Post.objects.filter(category__slug=category_slug, status='published')
+
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional_view(POST_VALIDATOR_SCOPES, queryset=category_posts)
+@cache_response(POST_LIST_SCOPES)
 def post_by_category(request, category_slug):
-    """Посты определенной категории"""
+    """
+    Посты определенной категории: закрепленные первыми, затем по
+    -created_at. Курсорная пагинация в порядке ленты (?cursor=, ?page_size=).
+    ?stream=ndjson - все посты категории потоком NDJSON без пагинации.
+    """
     category = get_object_or_404(Category, slug=category_slug)
     
-    # Получаем посты с учетом закрепления
-    # Используем менеджер модели для получения with_subscription_info
-    posts = Post.objects.with_subscription_info().filter(
-        category=category,
-        status='published'
+    # Получаем посты с учетом закрепления: закрепленные первыми
+    # (материализованный флаг, индекс posts_category_feed_idx)
+    posts = sparse_queryset(
+        Post.objects.get_posts_for_feed().filter(
+            category=category,
+            status='published'
+        ).select_related('author', 'author__subscription', 'category').defer('content'),
+        PostListSerializer,
+        request,
+        extra_fields=FEED_POSITION_FIELDS
     )
-    
-    # Сортируем с учетом закрепленных постов
-    # Используем сложную аннотацию для правильной сортировки
-    from django.db.models import Case, When, Value, DateTimeField, BooleanField
-    from django.utils import timezone
-    
-    posts = posts.annotate(
-        effective_date=Case(
-            When(
-                pin_info__isnull=False,
-                pin_info__user__subscription__status='active',
-                pin_info__user__subscription__end_date__gt=timezone.now(),
-                then='pin_info__pinned_at'
-            ),
-            default='created_at',
-            output_field=DateTimeField()
-        ),
-        is_pinned_flag=Case(
-            When(
-                pin_info__isnull=False,
-                pin_info__user__subscription__status='active',
-                pin_info__user__subscription__end_date__gt=timezone.now(),
-                then=Value(True)
-            ),
-            default=Value(False),
-            output_field=BooleanField()
-        )
-    ).order_by('-is_pinned_flag', 'effective_date', '-created_at')
-    
-    serializer = PostListSerializer(posts, many=True, context={'request': request})
+    if wants_stream(request):
+        return ndjson_response(posts, PostListSerializer, request)
+
+    paginator = FeedCursorPagination()
+    page = paginator.paginate_queryset(posts, request)
+    serializer = PostListSerializer(page, many=True, context={'request': request})
     
     return Response({
         'category': CategorySerializer(category).data,
         'posts': serializer.data,
-        'pinned_posts_count': sum(1 for post in serializer.data if post.get('is_pinned', False))
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'pinned_posts_count': Post.objects.filter(
+            category=category,
+            status='published',
+            is_effectively_pinned=True
+        ).count()
+    })
+
+# Максимум постов в одном запросе batch_posts
+BATCH_LIMIT = 200
+
+
+def open_category_bundle(slug):
+    """
+    (пакет, открытый файл) категории или (None, None), если пакет еще не
+    собран. Файл прежней версии удаляется после коммита новой - тогда
+    запись перечитывается.
+    """
+    for _ in range(2):
+        bundle = CategoryBundle.objects.filter(category__slug=slug).first()
+        if bundle is None:
+            return None, None
+        try:
+            return bundle, bundle.file.storage.open(bundle.file.name, 'rb')
+        except FileNotFoundError:
+            continue
+    return None, None
+
+
+def bundle_not_ready(slug):
+    """404 для неизвестной категории, иначе 503 и запуск сборки пакета"""
+    category = get_object_or_404(Category, slug=slug)
+    bundles.schedule_rebuild(category.id)
+    response = Response({
+        'error': 'Bundle is not built yet'
+    }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = bundles.BUNDLE_DEBOUNCE
+    return response
+
+
+@transaction.non_atomic_requests
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def category_bundle(request, slug):
+    """
+    Офлайн-пакет категории (zip, apps.main.bundles): опубликованные посты
+    с полным текстом, изображения card и комментарии верхнего уровня.
+    Поддерживает Range / If-Range для докачки прерванной загрузки.
+    """
+    bundle, fileobj = open_category_bundle(slug)
+    if bundle is None:
+        return bundle_not_ready(slug)
+
+    response = ranged_file_response(
+        request, fileobj, bundle.size, '"%s"' % bundle.sha256,
+        int(bundle.built_at.timestamp()), bundles.BUNDLE_CONTENT_TYPE
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{slug}-v{bundle.version}.zip"'
+    )
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+@transaction.non_atomic_requests
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def category_bundle_manifest(request, slug):
+    """
+    Манифест текущей версии офлайн-пакета категории: клиент проверяет
+    version / sha256, не скачивая архив.
+    """
+    bundle = CategoryBundle.objects.filter(category__slug=slug).first()
+    if bundle is None:
+        return bundle_not_ready(slug)
+
+    return conditional_response(
+        request, '"%s"' % bundle.sha256, bundle.built_at,
+        lambda: Response({
+            'version': bundle.version,
+            'size': bundle.size,
+            'sha256': bundle.sha256,
+            'built_at': bundle.built_at,
+            'url': request.build_absolute_uri(reverse('category-bundle', kwargs={'slug': slug})),
+            'manifest': bundle.manifest,
+        })
+    )
+
+
+def parse_list_param(request, name):
+    """Значения ?name=a,b&name=c без пустых и повторов, в порядке запроса"""
+    values = []
+    for raw in request.query_params.getlist(name):
+        values.extend(value.strip() for value in raw.split(','))
+    return list(dict.fromkeys(value for value in values if value))
+
+
+def parse_float_param(request, name, low, high, default=None):
+    """Число из параметра запроса; ValueError - нет, не число или вне [low, high]"""
+    raw = request.query_params.get(name, '')
+    if raw == '':
+        if default is None:
+            raise ValueError(f'Parameter "{name}" is required')
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(f'Parameter "{name}" must be a number')
+    if not math.isfinite(value) or not low <= value <= high:
+        raise ValueError(f'Parameter "{name}" must be between {low} and {high}')
+    return value
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+@conditional_view(POST_VALIDATOR_SCOPES)
+def nearby_posts(request):
+    """
+    Опубликованные посты рядом с точкой (apps.main.geo), по возрастанию
+    расстояния. ?lat= и ?lng= обязательны, ?radius= - км (по умолчанию 10,
+    до 200), ?limit= - до 100, ?category= - slug категории.
+    """
+    try:
+        lat = parse_float_param(request, 'lat', -90, 90)
+        lng = parse_float_param(request, 'lng', -180, 180)
+        radius = parse_float_param(
+            request, 'radius', 0, geo.MAX_RADIUS_KM, default=geo.DEFAULT_RADIUS_KM
+        )
+        limit = int(parse_float_param(
+            request, 'limit', 1, geo.MAX_LIMIT, default=geo.DEFAULT_LIMIT
+        ))
+    except ValueError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    candidates = Post.objects.filter(status='published')
+    category_slug = request.query_params.get('category')
+    if category_slug:
+        candidates = candidates.filter(category=get_object_or_404(Category, slug=category_slug))
+    distances = dict(geo.nearby(candidates, lat, lng, radius, limit))
+
+    posts = sparse_queryset(
+        Post.objects.with_subscription_info().filter(id__in=distances).defer('content'),
+        PostNearbySerializer,
+        request
+    )
+    by_id = {post.id: post for post in posts}
+    ordered = []
+    for post_id, distance in distances.items():
+        post = by_id.get(post_id)
+        if post is not None:
+            post.distance_km = round(distance, 3)
+            ordered.append(post)
+
+    serializer = PostNearbySerializer(ordered, many=True, context={'request': request})
+    return Response({
+        'lat': lat,
+        'lng': lng,
+        'radius_km': radius,
+        'results': serializer.data,
+    })
+
+
+@transaction.non_atomic_requests
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def map_clusters(request):
+    """
+    Кластеры постов для карты по тайлам (apps.main.map_tiles).
+    ?bbox=запад,юг,восток,север (градусы; запад > востока - через 180-й
+    меридиан), ?zoom= - зум карты (выше 14 отдаются тайлы зума 14).
+    Каждый тайл - одно чтение из кэша.
+    """
+    try:
+        west, south, east, north = (
+            float(value) for value in request.query_params.get('bbox', '').split(',')
+        )
+        zoom = int(request.query_params.get('zoom', ''))
+        if not (
+            all(math.isfinite(value) for value in (west, south, east, north))
+            and -180 <= west <= 180 and -180 <= east <= 180
+            and -90 <= south <= north <= 90 and zoom >= 0
+        ):
+            raise ValueError
+    except ValueError:
+        return Response({
+            'error': 'Parameters "bbox" (west,south,east,north) and "zoom" are required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    zoom = min(zoom, map_tiles.MAX_ZOOM)
+    try:
+        coordinates = map_tiles.tile_range(west, south, east, north, zoom)
+    except ValueError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+
+    tiles = map_tiles.get_tiles(zoom, coordinates)
+    return Response({
+        'zoom': zoom,
+        'tiles': [
+            {
+                'x': x,
+                'y': y,
+                'count': sum(cluster[map_tiles.COUNT] for cluster in tiles[(x, y)]),
+                'clusters': [map_tiles.cluster_data(cluster) for cluster in tiles[(x, y)]],
+            }
+            for x, y in coordinates if tiles[(x, y)]
+        ],
     })
 
+
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional_view(POST_VALIDATOR_SCOPES)
+def batch_posts(request):
+    """
+    Несколько постов одним запросом: ?ids=1,2,3 и/или ?slugs=a,b (до
+    BATCH_LIMIT). Посты возвращаются в порядке запроса (сначала ids, затем
+    slugs), ненайденные и недоступные перечисляются в missing. Видимость
+    как у списка постов: опубликованные и собственные черновики.
+    """
+    slugs = parse_list_param(request, 'slugs')
+    try:
+        ids = [int(value) for value in parse_list_param(request, 'ids')]
+    except ValueError:
+        return Response({
+            'error': 'Parameter "ids" must be a comma-separated list of integers'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if not ids and not slugs:
+        return Response({
+            'error': 'Parameter "ids" or "slugs" is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) + len(slugs) > BATCH_LIMIT:
+        return Response({
+            'error': f'At most {BATCH_LIMIT} posts can be requested at once'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    posts = sparse_queryset(
+        Post.objects.visible_to(request.user).filter(
+            Q(id__in=ids) | Q(slug__in=slugs)
+        ).select_related('author', 'author__subscription', 'category').defer('content'),
+        PostListSerializer,
+        request,
+        extra_fields=('slug',)
+    )
+    by_id = {post.id: post for post in posts}
+    by_slug = {post.slug: post for post in by_id.values()}
+
+    ordered = {}
+    for post in [by_id.get(post_id) for post_id in ids] + [by_slug.get(slug) for slug in slugs]:
+        if post is not None:
+            ordered.setdefault(post.id, post)
+
+    serializer = PostListSerializer(
+        list(ordered.values()),
+        many=True,
+        context={'request': request}
+    )
+    return Response({
+        'results': serializer.data,
+        'missing': {
+            'ids': [post_id for post_id in ids if post_id not in by_id],
+            'slugs': [slug for slug in slugs if slug not in by_slug],
+        }
+    })
+
+
+# Допустимые значения ?order= для рейтинговых эндпоинтов
+RANKING_ORDERS = {
+    'trending': '-trending_score',
+    'views': '-views_count',
+    'unique_views': '-unique_views',
+    'unique_views_7d': '-unique_views_7d',
+}
+
+
+def get_ranking(request, default='trending'):
+    """Возвращает имя сортировки по параметру ?order="""
+    order = request.query_params.get('order', default)
+    return order if order in RANKING_ORDERS else default
+
+
+def get_ranking_order(request, default='views'):
+    """Возвращает поле сортировки по параметру ?order="""
+    return RANKING_ORDERS[get_ranking(request, default)]
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+@conditional_view(TRENDING_VALIDATOR_SCOPES)
+@cache_response(TRENDING_LIST_SCOPES)
 def popular_posts(request):
-    """10 самых популярных постов"""
-    posts = Post.objects.with_subscription_info().filter(
-        status='published'
-    ).order_by('-views_count')[:10]
+    """
+    10 самых популярных постов.
+    ?order=trending|views|unique_views|unique_views_7d (по умолчанию trending)
+    """
+    queryset = Post.objects.with_subscription_info().defer('content')
+    if get_ranking(request) == 'trending':
+        posts = get_trending_posts(queryset, 10)
+    else:
+        posts = queryset.filter(
+            status='published'
+        ).order_by(get_ranking_order(request))[:10]
     
     serializer = PostListSerializer(
         posts, 
@@ -193,11 +578,144 @@ def popular_posts(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional_view(TRENDING_VALIDATOR_SCOPES)
+@cache_response(TRENDING_LIST_SCOPES)
+def trending_posts(request):
+    """
+    Трендовые посты (вовлеченность за последние дни с затуханием).
+    ?category=<slug> - тренды категории, ?limit= - количество (до 50)
+    """
+    category_id = None
+    category_slug = request.query_params.get('category')
+    if category_slug:
+        category_id = get_object_or_404(Category, slug=category_slug).id
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), TOP_N))
+    except ValueError:
+        limit = 10
+
+    posts = get_trending_posts(
+        Post.objects.with_subscription_info().defer('content'),
+        limit,
+        category_id=category_id
+    )
+    serializer = PostListSerializer(
+        posts,
+        many=True,
+        context={'request': request}
+    )
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+@conditional_view(RELATED_VALIDATOR_SCOPES)
+@cache_response(RELATED_LIST_SCOPES)
+def related_posts(request, slug):
+    """
+    Похожие посты ("ещё по теме") из предрассчитанной таблицы соседей.
+    ?limit= - количество (до RELATED_POSTS_K)
+    """
+    post = get_object_or_404(Post.objects.only('id'), slug=slug, status='published')
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 6)), settings.RELATED_POSTS_K))
+    except ValueError:
+        limit = 6
+
+    posts = get_neighbour_posts(
+        post.id,
+        Post.objects.with_subscription_info().defer('content'),
+        limit
+    )
+    serializer = PostListSerializer(
+        posts,
+        many=True,
+        context={'request': request}
+    )
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+@conditional_view(RELATED_VALIDATOR_SCOPES)
+@cache_response(RELATED_LIST_SCOPES)
+def also_read_posts(request, slug):
+    """
+    Посты, которые читали и комментировали читатели этого поста.
+    ?limit= - количество (до RELATED_POSTS_K)
+    """
+    post = get_object_or_404(Post.objects.only('id'), slug=slug, status='published')
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 6)), settings.RELATED_POSTS_K))
+    except ValueError:
+        limit = 6
+
+    posts = get_neighbour_posts(
+        post.id,
+        Post.objects.with_subscription_info().defer('content'),
+        limit,
+        kind=PostNeighbours.KIND_CO_ENGAGEMENT
+    )
+    serializer = PostListSerializer(
+        posts,
+        many=True,
+        context={'request': request}
+    )
+    return Response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def search_posts(request):
+    """
+    Полнотекстовый поиск по опубликованным постам.
+    ?q= - запрос (слова, "фраза", -исключение), результаты по релевантности
+    с подсвеченными фрагментами.
+    """
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({
+            'error': 'Query parameter "q" is required'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    posts = ranked_search(
+        Post.objects.with_subscription_info().filter(status='published').defer('content'),
+        query
+    )
+    paginator = PageNumberPagination()
+    page = attach_highlights(paginator.paginate_queryset(posts, request), query)
+
+    serializer = PostSearchResultSerializer(
+        page,
+        many=True,
+        context={'request': request}
+    )
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def suggest_posts(request):
+    """
+    Автодополнение для строки поиска: заголовки постов и категории.
+    ?q= - введенный префикс, ?limit= - количество подсказок (до 20)
+    """
+    try:
+        limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    return Response(suggest(request.query_params.get('q', ''), limit))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+@conditional_view(POST_VALIDATOR_SCOPES)
+@cache_response(POST_LIST_SCOPES)
 def recent_posts(request):
     """10 последних опубликованных постов"""
     posts = Post.objects.with_subscription_info().filter(
         status='published'
-    ).order_by('-created_at')[:10]
+    ).defer('content').order_by('-created_at')[:10]
     
     serializer = PostListSerializer(
         posts, 
@@ -208,6 +726,8 @@ def recent_posts(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional_view(POST_VALIDATOR_SCOPES)
+@cache_response(POST_LIST_SCOPES)
 def pinned_posts_only(request):
     """Только закрепленные посты"""
     posts = Post.objects.pinned_posts()
@@ -224,26 +744,36 @@ def pinned_posts_only(request):
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional_view(TRENDING_VALIDATOR_SCOPES)
+@cache_response(TRENDING_LIST_SCOPES)
 def featured_posts(request):
     """
     Рекомендуемые посты для главной страницы:
     - Закрепленные посты (максимум 3)
-    - Популярные посты за последнюю неделю
+    - Трендовые посты (?order=trending, по умолчанию) или популярные
+      посты за последнюю неделю (?order=views|unique_views|unique_views_7d)
     """
     from django.utils import timezone
     from datetime import timedelta
     
     # Получаем последние 3 закрепленных поста
     pinned_posts = Post.objects.pinned_posts()[:3]
+    pinned_ids = [post.id for post in pinned_posts]
     
-    # Получаем популярные посты за неделю (исключая уже закрепленные)
-    week_ago = timezone.now() - timedelta(days=7)
-    popular_posts = Post.objects.with_subscription_info().filter(
-        status='published',
-        created_at__gte=week_ago
-    ).exclude(
-        id__in=[post.id for post in pinned_posts]
-    ).order_by('-views_count')[:6]
+    # Трендовые/популярные посты (исключая уже закрепленные)
+    queryset = Post.objects.with_subscription_info().defer('content')
+    if get_ranking(request) == 'trending':
+        popular_posts = get_trending_posts(
+            queryset, 6, exclude_ids=pinned_ids, fallback_order='-created_at'
+        )
+    else:
+        week_ago = timezone.now() - timedelta(days=7)
+        popular_posts = queryset.filter(
+            status='published',
+            created_at__gte=week_ago
+        ).exclude(
+            id__in=pinned_ids
+        ).order_by(get_ranking_order(request))[:6]
     
     # Сериализуем данные
     pinned_serializer = PostListSerializer(
@@ -263,6 +793,61 @@ def featured_posts(request):
         'total_pinned': Post.objects.pinned_posts().count()
     })
 
+@transaction.non_atomic_requests
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def home_snapshot(request):
+    """
+    Главная страница одним ответом: рекомендуемые, закрепленные, новые и
+    популярные посты и категории. Отдается готовый снимок из кэша
+    (apps.main.home) без запросов к БД; built_at - время сборки снимка.
+    """
+    snapshot = get_snapshot()
+    etag = 'W/' + snapshot['etag']
+    last_modified = int(snapshot['built_at'].timestamp())
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        if accepts_gzip(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            response = HttpResponse(snapshot['gzip'], content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(snapshot['body'], content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, no_cache=True)
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def sync_changes(request):
+    """
+    Изменения постов, категорий и комментариев для офлайн-клиентов.
+    ?since=<токен> - токен next из предыдущего ответа (без него - полная
+    выгрузка), ?limit= - строк каждого типа в ответе (до 500). Запросы
+    повторяются, пока has_more = true.
+    """
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', sync.DEFAULT_LIMIT)), sync.MAX_LIMIT))
+    except ValueError:
+        limit = sync.DEFAULT_LIMIT
+
+    try:
+        data = sync.changes(request.query_params.get('since'), limit, request)
+    except sync.InvalidToken:
+        return Response({
+            'error': 'Invalid sync token'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except sync.ExpiredToken:
+        return Response({
+            'error': 'Sync token expired, full sync required'
+        }, status=status.HTTP_410_GONE)
+    return Response(data)
+
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def toggle_post_pin_status(request, slug):
@@ -282,7 +867,7 @@ def toggle_post_pin_status(request, slug):
         from apps.subscribe.models import PinnedPost
         
         # Проверяем, закреплен ли пост
-        if post.is_pinned:
+        if hasattr(post, 'pin_info'):
             # Открепляем
             post.pin_info.delete()
             message = 'Post unpinned successfully'
@@ -296,6 +881,9 @@ def toggle_post_pin_status(request, slug):
             PinnedPost.objects.create(user=request.user, post=post)
             message = 'Post pinned successfully'
             is_pinned = True
+
+        # Флаг закрепления обновлен сигналом - перечитываем его
+        post.refresh_from_db(fields=['is_effectively_pinned', 'feed_pinned_at', 'pin_expires_at'])
         
         return Response({
             'message': message,
@@ -0,0 +1,28 @@
+"""
+Водяные знаки изменений в порядке коммита.
+
+Отметка времени (updated_at, created_at) ставится до коммита: строка,
+закоммиченная позже читателя, может получить время меньше уже
+прочитанного им, и чтение "после отметки" ее пропустит. Поэтому
+таблицы, которые дочитываются инкрементально, хранят change_txid -
+номер транзакции, последней изменившей строку. Его ставит триггер
+stamp_change_txid (миграция main 0021); аргументы триггера - колонки,
+изменение которых строку не меняет (счетчики и т.п.).
+
+Читатель сначала берет snapshot_xmin(): все транзакции с меньшим
+номером уже завершены, поэтому строки с change_txid < xmin больше не
+появятся. Следующее чтение начинается с этой границы.
+"""
+from django.db import connections
+
+
+def snapshot_xmin(using='default'):
+    """Номер самой старой незавершенной транзакции (граница чтения)"""
+    with connections[using].cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def changed_between(queryset, since, until, field='change_txid'):
+    """Строки queryset, измененные транзакциями с номером в [since, until)"""
+    return queryset.filter(**{f'{field}__gte': since, f'{field}__lt': until})
@@ -0,0 +1,129 @@
+"""
+Учет ссылок на блобы ContentAddressedStorage и сборка мусора.
+
+Сигналы сохранения/удаления Post и User корректируют
+MediaBlob.ref_count в транзакции изменения. Блобы без ссылок удаляются
+задачей collect_media_blobs после grace-периода: файл загружается в
+хранилище раньше, чем коммитится строка, которая на него ссылается.
+
+Повторная загрузка того же содержимого сначала обновляет released_at
+строки (MediaBlob.objects.register), затем записывает файл. Сборщик
+удаляет строки под блокировкой и перепроверяет released_at, поэтому
+загрузка либо выводит блоб из-под удаления, либо ждет коммита сборщика и
+создает строку и файл заново. Файлы удаляются после коммита и только для
+удаленных строк; блоб, который за это время загрузили снова, остается.
+"""
+from datetime import timedelta
+
+from django.apps import apps
+from django.db import transaction
+from django.utils import timezone
+
+from .models import CONTENT_ADDRESSED_FIELDS, MediaBlob
+from .storage import content_addressed_storage
+from .variants import IMAGE_FIELDS, get_variant_storage, variant_name
+
+
+GC_GRACE_PERIOD = timedelta(hours=24)
+GC_BATCH_SIZE = 500
+
+
+def referenced_names(names):
+    """Имена из names, на которые ссылается хотя бы одна строка"""
+    names = list(names)
+    referenced = set()
+    for model_label, field in CONTENT_ADDRESSED_FIELDS:
+        referenced.update(
+            apps.get_model(model_label)._base_manager.filter(
+                **{f'{field}__in': names}
+            ).values_list(field, flat=True)
+        )
+    return referenced
+
+
+def variant_names(name):
+    """Все возможные имена вариантов блоба"""
+    return {
+        variant_name(name, spec, extension)
+        for config in IMAGE_FIELDS.values()
+        for spec in config.specs
+        for extension in ('webp', 'jpg')
+    }
+
+
+def collect_garbage(grace_period=GC_GRACE_PERIOD, dry_run=False):
+    """
+    Удаляет блобы без ссылок, освобожденные раньше grace_period, и их
+    варианты. Перед удалением ссылки перепроверяются по таблицам, чтобы
+    расхождение счетчика не привело к потере файла.
+    Возвращает (удалено блобов, освобождено байт).
+    """
+    storage = content_addressed_storage()
+    variant_storage = get_variant_storage(storage)
+    cutoff = timezone.now() - grace_period
+    deleted = freed = 0
+    last_id = 0
+    while True:
+        batch = list(
+            MediaBlob.objects.filter(
+                ref_count=0, released_at__lt=cutoff, id__gt=last_id
+            ).order_by('id').values_list('id', 'name', 'size')[:GC_BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        still_used = referenced_names(name for _, name, _ in batch)
+        if still_used:
+            # Счетчик разошелся с таблицами - восстанавливаем его
+            repair_references(still_used)
+        orphans = [(pk, name, size) for pk, name, size in batch if name not in still_used]
+        if dry_run:
+            deleted += len(orphans)
+            freed += sum(size for _, _, size in orphans)
+            continue
+
+        with transaction.atomic():
+            removed = list(
+                MediaBlob.objects.select_for_update().filter(
+                    id__in=[pk for pk, _, _ in orphans], ref_count=0, released_at__lt=cutoff
+                ).values_list('id', 'name', 'size')
+            )
+            MediaBlob.objects.filter(id__in=[pk for pk, _, _ in removed]).delete()
+            names = [name for _, name, _ in removed]
+            transaction.on_commit(
+                lambda names=names: delete_files(storage, variant_storage, names)
+            )
+            deleted += len(removed)
+            freed += sum(size for _, _, size in removed)
+    return deleted, freed
+
+
+def delete_files(storage, variant_storage, names):
+    """
+    Удаляет файлы блобов names и их вариантов. Вызывается после коммита
+    удаления строк; блобы, снова зарегистрированные загрузкой, пропускаются.
+    """
+    registered = set(MediaBlob.objects.filter(name__in=names).values_list('name', flat=True))
+    for name in names:
+        if name in registered:
+            continue
+        storage.delete_blob(name)
+        for variant in variant_names(name):
+            if variant_storage.exists(variant):
+                variant_storage.delete(variant)
+
+
+def repair_references(names):
+    """Пересчитывает ref_count блобов names по таблицам"""
+    counts = dict.fromkeys(names, 0)
+    for model_label, field in CONTENT_ADDRESSED_FIELDS:
+        rows = apps.get_model(model_label)._base_manager.filter(
+            **{f'{field}__in': list(names)}
+        ).values_list(field, flat=True)
+        for name in rows:
+            counts[name] += 1
+    for name, count in counts.items():
+        MediaBlob.objects.filter(name=name).update(
+            ref_count=count, released_at=None if count else timezone.now()
+        )
+    return counts
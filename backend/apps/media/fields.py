@@ -0,0 +1,35 @@
+from rest_framework import serializers
+
+from .variants import get_config, variant_urls
+
+
+class ImageVariantsField(serializers.Field):
+    """
+    Карта вариантов изображения для клиента:
+    {'thumbnail': {'width', 'height', 'webp', 'jpeg'}, 'card': ..., 'full': ...}.
+    Пустой словарь - варианты еще не готовы, используется оригинал.
+    """
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        config = get_config(instance._meta.label, self.image_field)
+        return variant_urls(
+            getattr(instance, self.image_field),
+            getattr(instance, config.variants_field),
+            self.context.get('request')
+        )
+
+
+def image_variants(instance, image_field, request=None):
+    """То же, что ImageVariantsField, для ответов, собираемых вручную"""
+    config = get_config(instance._meta.label, image_field)
+    return variant_urls(
+        getattr(instance, image_field),
+        getattr(instance, config.variants_field),
+        request
+    )
@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.media.variants import IMAGE_FIELDS, is_current, process
+
+
+class Command(BaseCommand):
+    help = 'Generate image variants (thumbnail/card/full, WebP + JPEG) for existing uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of images processed in parallel'
+        )
+        parser.add_argument(
+            '--model',
+            choices=sorted({label for label, _ in IMAGE_FIELDS}),
+            help='Only process one model'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Regenerate variants that are already up to date'
+        )
+        parser.add_argument(
+            '--queue',
+            action='store_true',
+            help='Enqueue Celery tasks instead of processing in this process'
+        )
+
+    def _pending(self, model_label, config, force):
+        model = apps.get_model(model_label)
+        rows = model._base_manager.exclude(**{config.field: ''}).exclude(
+            **{f'{config.field}__isnull': True}
+        ).values_list('pk', config.field, config.variants_field).order_by('pk')
+        for pk, name, variants in rows.iterator(chunk_size=1000):
+            if force or not is_current(variants, name):
+                yield pk
+
+    def _process(self, model_label, pk, field, force):
+        try:
+            return process(model_label, pk, field, force=force)
+        finally:
+            # Каждый поток держит свое соединение с БД
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        from apps.media.tasks import generate_image_variants
+
+        force = options['force']
+        jobs = [
+            (model_label, pk, field)
+            for (model_label, field), config in IMAGE_FIELDS.items()
+            if not options['model'] or options['model'] == model_label
+            for pk in self._pending(model_label, config, force)
+        ]
+        if options['queue']:
+            for model_label, pk, field in jobs:
+                generate_image_variants.delay(model_label, pk, field, force=force)
+            self.stdout.write(self.style.SUCCESS(f'Queued {len(jobs)} images'))
+            return
+
+        processed = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {
+                executor.submit(self._process, model_label, pk, field, force): (model_label, pk)
+                for model_label, pk, field in jobs
+            }
+            for future in as_completed(futures):
+                model_label, pk = futures[future]
+                try:
+                    future.result()
+                    processed += 1
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{model_label} {pk}: {exc}')
+                if (processed + failed) % 100 == 0:
+                    self.stdout.write(f'Processed {processed + failed}/{len(jobs)}...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants for {processed} images, {failed} failed'
+        ))
@@ -0,0 +1,99 @@
+import hashlib
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.media.models import CONTENT_ADDRESSED_FIELDS, MediaBlob
+from apps.media.storage import content_addressed_storage, is_blob_name
+from apps.media.variants import IMAGE_FIELDS, delete_variant_files
+
+
+class Command(BaseCommand):
+    help = (
+        'Move existing uploads referenced by Post.image and User.avatar into '
+        'content-addressed storage, deduplicating identical files'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many files and bytes would be saved'
+        )
+        parser.add_argument(
+            '--keep-originals',
+            action='store_true',
+            help='Do not delete the original files after moving them'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = content_addressed_storage()
+        legacy = FileSystemStorage(location=storage.location, base_url=storage.base_url)
+
+        # Имя исходного файла -> [(модель, поле, pk), ...]
+        references = {}
+        for model_label, field in CONTENT_ADDRESSED_FIELDS:
+            rows = apps.get_model(model_label)._base_manager.exclude(
+                **{field: ''}
+            ).exclude(**{f'{field}__isnull': True}).values_list('pk', field)
+            for pk, name in rows.iterator(chunk_size=1000):
+                if not is_blob_name(name):
+                    references.setdefault(name, []).append((model_label, field, pk))
+
+        missing = 0
+        bytes_before = 0
+        digests = {}
+        for name, rows in sorted(references.items()):
+            if not legacy.exists(name):
+                missing += 1
+                self.stderr.write(f'Missing file: {name}')
+                continue
+            bytes_before += legacy.size(name)
+            if dry_run:
+                digests.setdefault(self._digest(legacy.path(name)), legacy.size(name))
+                continue
+
+            with legacy.open(name, 'rb') as source:
+                blob = storage.save(name, File(source, name=name))
+            digests.setdefault(blob, storage.size(blob))
+            with transaction.atomic():
+                relinked = sum(
+                    self._relink(model_label, field, pk, name, blob, legacy)
+                    for model_label, field, pk in rows
+                )
+                MediaBlob.objects.adjust_references({blob: relinked})
+            if not options['keep_originals']:
+                legacy.delete(name)
+
+        bytes_after = sum(digests.values())
+        verb = 'Would move' if dry_run else 'Moved'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(references) - missing} files into {len(digests)} blobs, '
+            f'{bytes_before - bytes_after} bytes saved ({missing} missing)'
+        ))
+        if not dry_run and references:
+            self.stdout.write('Run backfill_image_variants to rebuild image variants.')
+
+    def _digest(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _relink(self, model_label, field, pk, old_name, blob, legacy):
+        """Переводит строку на блоб; варианты старого файла удаляются"""
+        model = apps.get_model(model_label)
+        config = IMAGE_FIELDS.get((model_label, field))
+        updates = {field: blob}
+        if config is not None:
+            variants = model._base_manager.filter(pk=pk).values_list(
+                config.variants_field, flat=True
+            ).first()
+            delete_variant_files(legacy, variants)
+            updates[config.variants_field] = {}
+        return model._base_manager.filter(pk=pk, **{field: old_name}).update(**updates)
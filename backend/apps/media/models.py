@@ -0,0 +1,72 @@
+from django.db import models
+from django.db.models.functions import Now
+
+from apps.main.models import adjust_counter
+
+
+# Поля, хранящиеся в ContentAddressedStorage: (модель, поле)
+CONTENT_ADDRESSED_FIELDS = (
+    ('main.Post', 'image'),
+    ('accounts.User', 'avatar'),
+)
+
+
+class MediaBlobManager(models.Manager):
+    """Менеджер блобов с учетом ссылок"""
+
+    def register(self, name, digest, size):
+        """
+        Запись о сохраненном блобе; повторная загрузка продлевает его жизнь.
+        Если сборщик мусора удалил строку между чтением и обновлением,
+        она создается заново.
+        """
+        while True:
+            blob, created = self.get_or_create(
+                name=name, defaults={'digest': digest, 'size': size}
+            )
+            if created or blob.ref_count > 0:
+                return blob
+            if self.filter(pk=blob.pk, ref_count=0).update(released_at=Now()):
+                return blob
+
+    def adjust_references(self, deltas):
+        """
+        Применяет {имя файла: дельта} к ref_count. Файлы вне хранилища
+        блобов игнорируются. Блоб без ссылок получает released_at.
+        """
+        deltas = {name: delta for name, delta in deltas.items() if name and delta}
+        if not deltas:
+            return 0
+        ids = dict(self.filter(name__in=list(deltas)).values_list('name', 'id'))
+        updated = adjust_counter(self.get_queryset(), 'ref_count', {
+            ids[name]: delta for name, delta in deltas.items() if name in ids
+        })
+        self.filter(id__in=ids.values(), ref_count=0, released_at__isnull=True).update(
+            released_at=Now()
+        )
+        self.filter(id__in=ids.values(), ref_count__gt=0).update(released_at=None)
+        return updated
+
+
+class MediaBlob(models.Model):
+    """Файл контентно-адресуемого хранилища и число ссылок на него"""
+    name = models.CharField(max_length=255, unique=True)
+    digest = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Когда блоб остался без ссылок (сборщик мусора ждет grace-период)
+    released_at = models.DateTimeField(null=True, blank=True, db_default=Now())
+
+    objects = MediaBlobManager()
+
+    class Meta:
+        db_table = 'media_blobs'
+        verbose_name = 'Media Blob'
+        verbose_name_plural = 'Media Blobs'
+        indexes = [
+            models.Index(fields=['ref_count', 'released_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.ref_count} refs)'
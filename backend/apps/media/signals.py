@@ -0,0 +1,91 @@
+from collections import Counter
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .models import CONTENT_ADDRESSED_FIELDS, MediaBlob
+from .variants import IMAGE_FIELDS, is_current
+
+
+def queue_variants(sender, instance, **kwargs):
+    """Ставит генерацию вариантов, если файл изменился с последней генерации"""
+    from .tasks import generate_image_variants
+
+    label = sender._meta.label
+    deferred = instance.get_deferred_fields()
+    for (model_label, field), config in IMAGE_FIELDS.items():
+        if model_label != label or {field, config.variants_field} & deferred:
+            continue
+        fieldfile = getattr(instance, field)
+        variants = getattr(instance, config.variants_field)
+        if is_current(variants, fieldfile.name) or (not fieldfile and not variants):
+            continue
+        pk = instance.pk
+        transaction.on_commit(
+            lambda pk=pk, field=field: generate_image_variants.delay(label, pk, field)
+        )
+
+
+def remember_previous_files(sender, instance, raw=False, **kwargs):
+    """Запоминает текущие имена файлов перед сохранением (для ref_count)"""
+    if raw or instance._state.adding:
+        return
+    fields = [
+        field for model_label, field in CONTENT_ADDRESSED_FIELDS
+        if model_label == sender._meta.label and field not in instance.get_deferred_fields()
+    ]
+    if fields:
+        instance._previous_files = sender._base_manager.filter(
+            pk=instance.pk
+        ).values(*fields).first() or {}
+
+
+def count_file_references(sender, instance, created, raw=False, **kwargs):
+    """+1 ссылка на новый файл, -1 на замененный"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_files', {})
+    deltas = Counter()
+    for model_label, field in CONTENT_ADDRESSED_FIELDS:
+        if model_label != sender._meta.label or (not created and field not in previous):
+            continue
+        old_name = previous.get(field) or ''
+        new_name = getattr(instance, field).name or ''
+        if old_name != new_name:
+            deltas[old_name] -= 1
+            deltas[new_name] += 1
+    MediaBlob.objects.adjust_references(deltas)
+    instance._previous_files = {}
+
+
+def release_file_references(sender, instance, **kwargs):
+    """-1 ссылка на файлы удаленного объекта"""
+    deltas = Counter()
+    for model_label, field in CONTENT_ADDRESSED_FIELDS:
+        if model_label == sender._meta.label and field not in instance.get_deferred_fields():
+            deltas[getattr(instance, field).name or ''] -= 1
+    MediaBlob.objects.adjust_references(deltas)
+
+
+for model_label in {model_label for model_label, _ in IMAGE_FIELDS}:
+    post_save.connect(
+        queue_variants,
+        sender=apps.get_model(model_label),
+        dispatch_uid=f'media.queue_variants.{model_label}'
+    )
+
+for model_label in {model_label for model_label, _ in CONTENT_ADDRESSED_FIELDS}:
+    model = apps.get_model(model_label)
+    pre_save.connect(
+        remember_previous_files, sender=model,
+        dispatch_uid=f'media.remember_previous_files.{model_label}'
+    )
+    post_save.connect(
+        count_file_references, sender=model,
+        dispatch_uid=f'media.count_file_references.{model_label}'
+    )
+    post_delete.connect(
+        release_file_references, sender=model,
+        dispatch_uid=f'media.release_file_references.{model_label}'
+    )
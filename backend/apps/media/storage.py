@@ -0,0 +1,102 @@
+"""
+Контентно-адресуемое хранилище для Post.image и User.avatar.
+
+Имя файла - SHA-256 содержимого: blobs/ab/cd/abcd...ef.jpg. Хэш
+считается потоково, пока загрузка пишется во временный файл; одинаковые
+загрузки хранятся один раз. Содержимое по URL никогда не меняется,
+поэтому файлы можно отдавать с бессрочным кэшированием.
+
+Учет ссылок и удаление ненужных файлов - apps.media.models.MediaBlob и
+задача collect_media_blobs; delete() хранилища ничего не удаляет, так как
+файл может использоваться другими объектами.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+
+BLOB_PREFIX = 'blobs'
+EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+
+def blob_name(digest, extension):
+    return posixpath.join(BLOB_PREFIX, digest[:2], digest[2:4], f'{digest}{extension}')
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(f'{BLOB_PREFIX}/')
+
+
+def normalize_extension(name):
+    extension = os.path.splitext(name)[1].lower()
+    return EXTENSION_ALIASES.get(extension, extension)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage, сохраняющий файлы под SHA-256 содержимого"""
+    # Файлы разделяются между объектами (см. apps.media.variants)
+    shares_files = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Производные файлы (варианты) пишутся обычным хранилищем рядом с блобами
+        self.variant_storage = FileSystemStorage(**kwargs)
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым, одинаковое имя - тот же файл
+        return name
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        tmp_dir = os.path.join(self.location, BLOB_PREFIX, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+
+            name = blob_name(digest.hexdigest(), normalize_extension(name))
+            # Сначала запись о блобе: она выводит его из-под сборщика мусора
+            # (см. apps.media.blobs.collect_garbage). Файл записывается
+            # всегда, даже если уже есть, - сборщик мог удалить его до
+            # register(), а после register() его уже не удалит
+            MediaBlob.objects.register(name, digest.hexdigest(), size)
+            path = self.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        """Файлы удаляет только сборщик мусора (collect_media_blobs)"""
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+_storage = None
+
+
+def content_addressed_storage():
+    """Хранилище для полей изображений (callable, чтобы не попадать в миграции)"""
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage(
+            location=settings.MEDIA_ROOT, base_url=settings.MEDIA_URL
+        )
+    return _storage
@@ -0,0 +1,18 @@
+from celery import shared_task
+from .variants import process
+
+
+@shared_task
+def generate_image_variants(model_label, pk, field, force=False):
+    """Генерация вариантов изображения (thumbnail/card/full, WebP + JPEG)"""
+    updated = process(model_label, pk, field, force=force)
+    return {'model': model_label, 'pk': pk, 'field': field, 'updated': updated}
+
+
+@shared_task
+def collect_media_blobs():
+    """Удаление блобов без ссылок (после grace-периода) и их вариантов"""
+    from .blobs import collect_garbage
+
+    deleted, freed = collect_garbage()
+    return {'deleted_blobs': deleted, 'freed_bytes': freed}
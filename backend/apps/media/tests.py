@@ -0,0 +1,224 @@
+import io
+import os
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.request import Request
+
+from apps.main.models import Category, Post
+from apps.main.serializers import PostListSerializer
+
+from . import blobs
+from .blobs import collect_garbage
+from .models import MediaBlob
+from .storage import ContentAddressedStorage, is_blob_name
+from .tasks import generate_image_variants
+
+
+def png(width, height, color='red'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ImageVariantsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name, base_url='/media/')
+        for patcher in (
+            mock.patch.object(Post._meta.get_field('image'), 'storage', self.storage),
+            mock.patch.object(blobs, 'content_addressed_storage', return_value=self.storage),
+            # Задачи, которые сигналы ставят после коммита, в тестах не нужны
+            mock.patch('celery.app.task.Task.apply_async'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.author = get_user_model().objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+        self.category = Category.objects.create(name='Europe', slug='europe')
+
+    def create_post(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(
+                title='Post', content='Text', author=self.author, category=self.category,
+                status='published', image=ContentFile(image, name='photo.png')
+            )
+
+    def serialized_variants(self, post):
+        request = Request(RequestFactory().get('/'))
+        return PostListSerializer(post, context={'request': request}).data['image_variants']
+
+    def variant_files(self, post):
+        return [
+            entry[key]
+            for entry in post.image_variants['variants'].values()
+            for key in ('webp', 'jpeg')
+        ]
+
+    def test_variants_follow_uploaded_image(self):
+        post = self.create_post(png(800, 500))
+        self.assertEqual(self.serialized_variants(post), {})
+
+        self.assertTrue(generate_image_variants('main.Post', post.pk, 'image')['updated'])
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants['source'], post.image.name)
+        sizes = {
+            name: (entry['width'], entry['height'])
+            for name, entry in post.image_variants['variants'].items()
+        }
+        self.assertEqual(sizes, {'full': (800, 500), 'card': (600, 375), 'thumbnail': (200, 200)})
+        self.assertTrue(all(self.storage.exists(name) for name in self.variant_files(post)))
+        card = self.serialized_variants(post)['card']
+        self.assertTrue(card['webp'].startswith('http://testserver/media/blobs/'))
+        # Карта актуальна - повторная генерация не нужна
+        self.assertFalse(generate_image_variants('main.Post', post.pk, 'image')['updated'])
+
+    def test_replaced_image_hides_stale_variants(self):
+        post = self.create_post(png(300, 300))
+        generate_image_variants('main.Post', post.pk, 'image')
+        post.refresh_from_db()
+
+        post.image = ContentFile(png(300, 300, 'blue'), name='other.png')
+        post.save()
+
+        self.assertEqual(self.serialized_variants(post), {})
+
+    def test_garbage_collection_deletes_files_after_commit(self):
+        post = self.create_post(png(300, 300))
+        generate_image_variants('main.Post', post.pk, 'image')
+        post.refresh_from_db()
+        name, files = post.image.name, self.variant_files(post)
+        Post.objects.filter(pk=post.pk).delete()
+        MediaBlob.objects.update(released_at=timezone.now() - timedelta(days=2))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(collect_garbage(grace_period=timedelta(days=1))[0], 1)
+        self.assertTrue(self.storage.exists(name))
+
+        callbacks[0]()
+        self.assertFalse([file for file in (name, *files) if self.storage.exists(file)])
+
+    def test_reuploaded_blob_keeps_its_files(self):
+        post = self.create_post(png(300, 300))
+        name = post.image.name
+        Post.objects.filter(pk=post.pk).delete()
+        MediaBlob.objects.update(released_at=timezone.now() - timedelta(days=2))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            collect_garbage(grace_period=timedelta(days=1))
+        # Загрузка того же содержимого между удалением строки и файлов
+        self.storage.save('copy.png', ContentFile(png(300, 300)))
+        callbacks[0]()
+
+        self.assertTrue(self.storage.exists(name))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BlobReferenceTests(TestCase):
+    def setUp(self):
+        self.author = get_user_model().objects.create_user(
+            username='author', email='author@example.com', password='password'
+        )
+        self.category = Category.objects.create(name='Europe', slug='europe')
+        self.first = MediaBlob.objects.register('blobs/aa/first.jpg', 'a' * 64, 10)
+        self.second = MediaBlob.objects.register('blobs/bb/second.jpg', 'b' * 64, 20)
+
+    def create_post(self, title, image):
+        return Post.objects.create(
+            title=title, content='Text', author=self.author, category=self.category,
+            status='published', image=image
+        )
+
+    def assertReferences(self, blob, ref_count, released):
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, ref_count)
+        self.assertEqual(blob.released_at is not None, released)
+
+    def test_new_blob_is_released_until_referenced(self):
+        self.assertReferences(self.first, 0, True)
+
+        self.create_post('One', self.first.name)
+        self.create_post('Two', self.first.name)
+
+        self.assertReferences(self.first, 2, False)
+
+    def test_replaced_and_deleted_files_release_references(self):
+        post = self.create_post('One', self.first.name)
+
+        post.image = self.second.name
+        post.save()
+        self.assertReferences(self.first, 0, True)
+        self.assertReferences(self.second, 1, False)
+
+        post.delete()
+        self.assertReferences(self.second, 0, True)
+
+    def test_files_outside_blob_storage_are_ignored(self):
+        self.create_post('One', 'posts/legacy.jpg')
+
+        self.assertFalse(MediaBlob.objects.filter(name='posts/legacy.jpg').exists())
+
+    def test_garbage_collection_after_grace_period(self):
+        self.create_post('One', self.first.name)
+        MediaBlob.objects.update(released_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(collect_garbage(grace_period=timedelta(days=3)), (0, 0))
+        self.assertEqual(collect_garbage(grace_period=timedelta(days=1)), (1, 20))
+        self.assertEqual(
+            list(MediaBlob.objects.values_list('name', flat=True)), [self.first.name]
+        )
+
+    def test_garbage_collection_repairs_drifted_counter(self):
+        self.create_post('One', self.first.name)
+        MediaBlob.objects.filter(pk=self.first.pk).update(
+            ref_count=0, released_at=timezone.now() - timedelta(days=2)
+        )
+
+        collect_garbage(grace_period=timedelta(days=1))
+
+        self.assertReferences(self.first, 1, False)
+
+    def test_reupload_takes_blob_back_from_collector(self):
+        MediaBlob.objects.update(released_at=timezone.now() - timedelta(days=2))
+
+        MediaBlob.objects.register(self.first.name, self.first.digest, self.first.size)
+
+        self.assertEqual(collect_garbage(grace_period=timedelta(days=1)), (1, 20))
+        self.assertTrue(MediaBlob.objects.filter(pk=self.first.pk).exists())
+
+
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentAddressedStorage(location=directory.name, base_url='/media/')
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save('photo.JPEG', ContentFile(b'image bytes'))
+        second = self.storage.save('copy.jpg', ContentFile(b'image bytes'))
+        other = self.storage.save('other.jpg', ContentFile(b'other bytes'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertTrue(is_blob_name(first))
+        self.assertTrue(first.endswith('.jpg'))
+        self.assertEqual(MediaBlob.objects.get(name=first).size, len(b'image bytes'))
+        self.assertEqual(MediaBlob.objects.count(), 2)
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(first))), [os.path.basename(first)])
+
+    def test_delete_keeps_shared_file(self):
+        name = self.storage.save('photo.jpg', ContentFile(b'image bytes'))
+
+        self.storage.delete(name)
+
+        self.assertTrue(self.storage.exists(name))
@@ -0,0 +1,231 @@
+"""
+Производные изображения (варианты) для загруженных картинок.
+
+После загрузки Post.image / User.avatar задача generate_image_variants
+создает уменьшенные и пережатые копии (thumbnail, card, full) в WebP и
+JPEG и записывает карту вариантов в JSON-поле модели:
+
+    {'source': 'posts/photo.jpg',
+     'variants': {'card': {'width': 600, 'height': 400,
+                           'webp': 'posts/variants/photo_1a2b3c4d_card.webp',
+                           'jpeg': 'posts/variants/photo_1a2b3c4d_card.jpg'}, ...}}
+
+'source' - имя исходного файла, для которого построены варианты; если
+оно не совпадает с текущим файлом, карта считается устаревшей.
+"""
+import hashlib
+import io
+import os
+from dataclasses import dataclass
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from apps.main.response_cache import SCOPE_POSTS, bump_scope_versions
+
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+JPEG_BACKGROUND = (255, 255, 255)
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    name: str
+    width: int
+    height: int
+    # True - обрезка до точного размера, False - вписывание в рамку
+    crop: bool = False
+
+
+@dataclass(frozen=True)
+class ImageFieldConfig:
+    model: str
+    field: str
+    variants_field: str
+    specs: tuple
+    # Области кэша ответов, которые нужно инвалидировать после обновления
+    scopes: tuple = ()
+
+
+POST_IMAGE_SPECS = (
+    VariantSpec('full', 1600, 1600),
+    VariantSpec('card', 600, 400),
+    VariantSpec('thumbnail', 200, 200, crop=True),
+)
+
+AVATAR_SPECS = (
+    VariantSpec('full', 512, 512, crop=True),
+    VariantSpec('card', 256, 256, crop=True),
+    VariantSpec('thumbnail', 64, 64, crop=True),
+)
+
+IMAGE_FIELDS = {
+    ('main.Post', 'image'): ImageFieldConfig(
+        'main.Post', 'image', 'image_variants', POST_IMAGE_SPECS, scopes=(SCOPE_POSTS,)
+    ),
+    ('accounts.User', 'avatar'): ImageFieldConfig(
+        'accounts.User', 'avatar', 'avatar_variants', AVATAR_SPECS
+    ),
+}
+
+
+def get_config(model_label, field):
+    return IMAGE_FIELDS[(model_label, field)]
+
+
+def is_current(variants, source_name):
+    """Построена ли карта вариантов для текущего файла"""
+    return bool(source_name) and (variants or {}).get('source') == source_name
+
+
+def variant_name(source_name, spec, extension):
+    """
+    Детерминированное имя файла варианта: повторная генерация для того же
+    исходника перезаписывает те же файлы.
+    """
+    directory, filename = os.path.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    digest = hashlib.sha1(source_name.encode()).hexdigest()[:8]
+    return os.path.join(directory, 'variants', f'{stem}_{digest}_{spec.name}.{extension}')
+
+
+def _resize(image, spec):
+    if spec.crop:
+        return ImageOps.fit(image, (spec.width, spec.height), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((spec.width, spec.height), Image.Resampling.LANCZOS)
+    return resized
+
+
+def _encode(image, fmt):
+    buffer = io.BytesIO()
+    if fmt == 'JPEG':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, JPEG_BACKGROUND)
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def get_variant_storage(storage):
+    """
+    Хранилище для файлов вариантов. ContentAddressedStorage пишет их
+    обычным хранилищем (имена вариантов выводятся из имени блоба).
+    """
+    return getattr(storage, 'variant_storage', storage)
+
+
+def render_variants(fieldfile, specs):
+    """
+    Строит варианты исходника (specs - от большего к меньшему, каждый
+    следующий уменьшается из предыдущего) и сохраняет их в хранилище поля.
+    """
+    storage = get_variant_storage(fieldfile.storage)
+    source_name = fieldfile.name
+    largest = specs[0]
+    with fieldfile.storage.open(source_name, 'rb') as source:
+        image = Image.open(source)
+        # JPEG декодируется сразу в уменьшенном масштабе
+        image.draft('RGB', (largest.width, largest.height))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    variants = {}
+    current = image
+    for spec in specs:
+        current = _resize(current, spec)
+        entry = {'width': current.width, 'height': current.height}
+        for key, fmt in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+            name = variant_name(source_name, spec, 'webp' if key == 'webp' else 'jpg')
+            if storage.exists(name):
+                storage.delete(name)
+            entry[key] = storage.save(name, ContentFile(_encode(current, fmt)))
+        variants[spec.name] = entry
+    return {'source': source_name, 'variants': variants}
+
+
+def delete_variant_files(storage, variants, keep=()):
+    """
+    Удаляет файлы карты вариантов (кроме keep). Варианты общих файлов
+    (ContentAddressedStorage) удаляются вместе с блобом сборщиком мусора.
+    """
+    if getattr(storage, 'shares_files', False):
+        return
+    storage = get_variant_storage(storage)
+    for entry in (variants or {}).get('variants', {}).values():
+        for key in ('webp', 'jpeg'):
+            name = entry.get(key)
+            if name and name not in keep and storage.exists(name):
+                storage.delete(name)
+
+
+def process(model_label, pk, field, force=False):
+    """
+    Генерирует варианты для поля field объекта pk и сохраняет карту.
+    Возвращает True, если карта обновлена.
+    """
+    config = get_config(model_label, field)
+    model = apps.get_model(model_label)
+    instance = model._base_manager.filter(pk=pk).only(
+        'pk', config.field, config.variants_field
+    ).first()
+    if instance is None:
+        return False
+
+    fieldfile = getattr(instance, config.field)
+    old_variants = getattr(instance, config.variants_field) or {}
+    if not fieldfile:
+        new_variants = {}
+    elif is_current(old_variants, fieldfile.name) and not force:
+        return False
+    else:
+        new_variants = render_variants(fieldfile, config.specs)
+
+    # Пишем карту, только если файл не сменился, пока строились варианты
+    if fieldfile.name:
+        unchanged = Q(**{config.field: fieldfile.name})
+    else:
+        unchanged = Q(**{config.field: ''}) | Q(**{f'{config.field}__isnull': True})
+    with transaction.atomic():
+        updated = model._base_manager.filter(unchanged, pk=pk).update(
+            **{config.variants_field: new_variants}
+        )
+        if updated and config.scopes:
+            bump_scope_versions(*config.scopes)
+
+    if updated:
+        keep = {
+            name for entry in new_variants.get('variants', {}).values()
+            for name in (entry['webp'], entry['jpeg'])
+        }
+        delete_variant_files(fieldfile.storage, old_variants, keep=keep)
+    return bool(updated)
+
+
+def variant_urls(fieldfile, variants, request=None):
+    """
+    {имя варианта: {'width', 'height', 'webp', 'jpeg'}} с URL файлов или
+    {} если вариантов еще нет (клиент использует оригинал).
+    """
+    if not fieldfile or not is_current(variants, fieldfile.name):
+        return {}
+    storage = get_variant_storage(fieldfile.storage)
+    result = {}
+    for name, entry in variants.get('variants', {}).items():
+        urls = {key: storage.url(entry[key]) for key in ('webp', 'jpeg')}
+        if request is not None:
+            urls = {key: request.build_absolute_uri(url) for key, url in urls.items()}
+        result[name] = {'width': entry['width'], 'height': entry['height'], **urls}
+    return result
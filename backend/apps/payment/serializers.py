@@ -2,9 +2,10 @@ from django.db import models
 from rest_framework import serializers
 from decimal import Decimal
 from .models import Payment, PaymentAttempt, Refund, WebhookEvent
+from apps.main.sparse import SparseFieldsMixin
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Сериализатор для платежей"""
     user_info = serializers.SerializerMethodField()
     subscription_info = serializers.SerializerMethodField()
@@ -23,6 +24,17 @@ class PaymentSerializer(serializers.ModelSerializer):
         read_only_fields = [
             'id', 'user', 'status', 'created_at', 'updated_at', 'processed_at'
         ]
+        # Колонки для вычисляемых полей (см. apps.main.sparse)
+        sparse_sources = {
+            'user_info': ('user__id', 'user__username', 'user__email'),
+            'subscription_info': (
+                'subscription__id', 'subscription__plan__name', 'subscription__start_date',
+                'subscription__end_date', 'subscription__status'
+            ),
+            'is_successful': ('status',),
+            'is_pending': ('status',),
+            'can_be_refunded': ('status', 'payment_method'),
+        }
 
     def get_user_info(self, obj):
         """Возвращает информацию о пользователе"""
@@ -23,9 +23,10 @@ from .serializers import (
 )
 from .services import StripeService, PaymentService, WebhookService
 from apps.subscribe.models import SubscriptionPlan
+from apps.main.sparse import sparse_queryset, SparseQuerysetMixin
 
 
-class PaymentListView(generics.ListAPIView):
+class PaymentListView(SparseQuerysetMixin, generics.ListAPIView):
     """Список платежей пользователя"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -37,7 +38,7 @@ class PaymentListView(generics.ListAPIView):
         ).select_related('subscription', 'subscription__plan').order_by('-created_at')
 
 
-class PaymentDetailView(generics.RetrieveAPIView):
+class PaymentDetailView(SparseQuerysetMixin, generics.RetrieveAPIView):
     """Детальная информация о платеже"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -326,11 +327,15 @@ def payment_analytics(request):
 @permission_classes([permissions.IsAuthenticated])
 def user_payment_history(request):
     """История платежей пользователя"""
-    payments = Payment.objects.filter(
-        user=request.user
-    ).select_related('subscription', 'subscription__plan').order_by('-created_at')
+    payments = sparse_queryset(
+        Payment.objects.filter(
+            user=request.user
+        ).select_related('subscription', 'subscription__plan').order_by('-created_at'),
+        PaymentSerializer,
+        request
+    )
     
-    serializer = PaymentSerializer(payments, many=True)
+    serializer = PaymentSerializer(payments, many=True, context={'request': request})
     return Response({
         'count': payments.count(),
         'results': serializer.data
@@ -6,9 +6,17 @@ from .models import Subscription, PinnedPost, SubscriptionHistory
 @shared_task
 def check_expired_subscriptions():
     """Периодическая задача для проверки истекших подписок"""
+    from apps.main.models import Post
+    from apps.main.response_cache import bump_scope_versions, SCOPE_POSTS
+
     now = timezone.now()
 
-    expired_subscriptions = Subscription.object.filter(
+    # Снимаем флаг закрепления с постов, чьи подписки уже истекли по времени
+    unpinned_posts = Post.objects.sync_pin_state()
+    if unpinned_posts:
+        bump_scope_versions(SCOPE_POSTS)
+
+    expired_subscriptions = Subscription.objects.filter(
         status='active',
         end_date__lt=now,
     )
@@ -17,7 +25,8 @@ def check_expired_subscriptions():
     pinned_posts_removed = 0
 
     for subscription in expired_subscriptions:
-        subscription.delete()
+        # expire() вместо delete(): запись истории ниже ссылается на подписку
+        subscription.expire()
         expired_count += 1
 
         # Удаляем закрепленный пост, если он есть
@@ -37,7 +46,8 @@ def check_expired_subscriptions():
     
     return {
         'expired_subscriptions': expired_count,
-        'pinned_posts_removed': pinned_posts_removed
+        'pinned_posts_removed': pinned_posts_removed,
+        'pin_states_updated': unpinned_posts
     }
 
 @shared_task
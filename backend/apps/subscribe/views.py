@@ -17,16 +17,25 @@ from .serializers import (
     UnpinPostSerializer
 )
 from apps.main.models import Post
+from apps.main.conditional import (
+    conditional_view,
+    ConditionalListMixin,
+    ConditionalRetrieveMixin,
+    POST_VALIDATOR_SCOPES,
+)
+from apps.main.counters import apply_pending_views
+from apps.main.response_cache import track_counter_posts
+from apps.media.fields import image_variants
 
 
-class SubscriptionPlanListView(generics.ListAPIView):
+class SubscriptionPlanListView(ConditionalListMixin, generics.ListAPIView):
     """Список доступных тарифных планов"""
     queryset = SubscriptionPlan.objects.filter(is_active=True)
     serializer_class = SubscriptionPlanSerializer
     permission_classes = [permissions.AllowAny]
 
 
-class SubscriptionPlanDetailView(generics.RetrieveAPIView):
+class SubscriptionPlanDetailView(ConditionalRetrieveMixin, generics.RetrieveAPIView):
     """Детальная информация о тарифном плане"""
     queryset = SubscriptionPlan.objects.filter(is_active=True)
     serializer_class = SubscriptionPlanSerializer
@@ -228,16 +237,20 @@ def cancel_subscription(request):
     
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@conditional_view(POST_VALIDATOR_SCOPES)
 def pinned_posts_list(request):
     """Возвращает список всех закрепленных постов для отображения в топе"""
     # Получаем только закрепленные посты пользователей с активной подпиской
     pinned_posts = PinnedPost.objects.select_related(
         'post', 'post__author', 'post__category', 'user__subscription'
-    ).filter(
+    ).defer('post__content', 'post__search_vector').filter(
         user__subscription__status='active',
         user__subscription__end_date__gt=timezone.now(),
         post__status='published'
     ).order_by('pinned_at')
+    pinned_posts = list(pinned_posts)
+    apply_pending_views([pinned_post.post for pinned_post in pinned_posts])
+    track_counter_posts(request, [pinned_post.post_id for pinned_post in pinned_posts])
 
     # Формируем ответ с информацией о посте
     posts_data = []
@@ -247,8 +260,9 @@ def pinned_posts_list(request):
             'id': post.id,
             'title': post.title,
             'slug': post.slug,
-            'content': post.content[:200] + '...' if len(post.content) > 200 else post.content,
+            'content': post.excerpt,
             'image': post.image.url if post.image else None,
+            'image_variants': image_variants(post, 'image', request),
             'category': post.category.name if post.category else None,
             'author': {
                 'id': post.author.id,
@@ -263,7 +277,7 @@ def pinned_posts_list(request):
         })
     
     return Response({
-        'count': int(posts_data),
+        'count': len(posts_data),
         'results': posts_data,
     })
 
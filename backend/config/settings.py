@@ -17,6 +17,7 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -32,6 +33,7 @@ LOCAL_APPS = [
     'apps.comments',
     'apps.subscribe',
     'apps.payment',
+    'apps.media',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
@@ -225,6 +227,9 @@ os.makedirs(BASE_DIR / 'logs', exist_ok=True)
 # URL фронтенда для редиректов
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:5173')
 
+# Публичный URL бэкенда: абсолютные URL в ответах, собранных вне запроса
+SITE_URL = config('SITE_URL', default='http://localhost:8000')
+
 # Stripe настройки
 STRIPE_PUBLISHABLE_KEY = config('STRIPE_PUBLISHABLE_KEY', default='')
 STRIPE_SECRET_KEY = config('STRIPE_SECRET_KEY', default='')
@@ -247,8 +252,96 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_ACCEPT_CONTENT = ['json']
 
+# Кэш (Redis)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default='redis://localhost:6379/2'),
+        'KEY_PREFIX': 'travel',
+    }
+}
+
+# Автодополнение заголовков (apps.main.suggest)
+SUGGEST_CACHE_TIMEOUT = config('SUGGEST_CACHE_TIMEOUT', default=300, cast=int)
+
+# Конфигурация полнотекстового поиска PostgreSQL (apps.main.search)
+SEARCH_CONFIG = config('SEARCH_CONFIG', default='english')
+
+# Буфер счетчиков просмотров (apps.main.counters)
+# Для тестов: VIEW_COUNTER_BACKEND=apps.main.counters.LocMemViewCounter
+VIEW_COUNTER_BACKEND = config('VIEW_COUNTER_BACKEND', default='apps.main.counters.RedisViewCounter')
+VIEW_COUNTER_REDIS_URL = config('VIEW_COUNTER_REDIS_URL', default='redis://localhost:6379/1')
+# Число доверенных обратных прокси перед приложением (nginx и т.п.), которые
+# дописывают адрес клиента в X-Forwarded-For; 0 - запросы приходят напрямую,
+# X-Forwarded-For не учитывается. За прокси задается явно
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', default=0, cast=int)
+
+# Рекомендации: число соседей поста
+RELATED_POSTS_K = config('RELATED_POSTS_K', default=10, cast=int)
+
 # Celery Beat настройки для периодических задач
 CELERY_BEAT_SCHEDULE = {
+    'flush-post-view-counts': {
+        'task': 'apps.main.tasks.flush_view_counts',
+        'schedule': 60.0,  # Каждую минуту
+    },
+    'flush-post-unique-views': {
+        'task': 'apps.main.tasks.flush_unique_views',
+        'schedule': 300.0,  # Каждые 5 минут
+    },
+    'refresh-post-unique-views-window': {
+        'task': 'apps.main.tasks.flush_unique_views',
+        'schedule': 86400.0,  # Каждый день
+        'kwargs': {'full': True},
+    },
+    'update-trending-scores': {
+        'task': 'apps.main.tasks.update_trending_scores',
+        'schedule': 300.0,  # Каждые 5 минут
+    },
+    'rebuild-home-snapshot': {
+        'task': 'apps.main.tasks.rebuild_home_snapshot',
+        'schedule': 300.0,  # Каждые 5 минут
+    },
+    'prune-sync-tombstones': {
+        'task': 'apps.main.tasks.prune_sync_tombstones',
+        'schedule': 86400.0,  # Каждый день
+    },
+    'refresh-category-bundles': {
+        'task': 'apps.main.tasks.refresh_category_bundles',
+        'schedule': 3600.0,  # Каждый час
+    },
+    'rebuild-dirty-map-tiles': {
+        'task': 'apps.main.tasks.rebuild_dirty_map_tiles',
+        'schedule': 300.0,  # Каждые 5 минут
+    },
+    'build-map-tiles': {
+        'task': 'apps.main.tasks.build_map_tiles',
+        'schedule': 86400.0,  # Каждый день
+    },
+    'update-related-posts': {
+        'task': 'apps.main.tasks.update_related_posts',
+        'schedule': 600.0,  # Каждые 10 минут (очередь, пропущенная после сбоев)
+    },
+    'rebuild-related-posts': {
+        'task': 'apps.main.tasks.rebuild_related_posts',
+        'schedule': 86400.0,  # Каждый день
+    },
+    'flush-post-readers': {
+        'task': 'apps.main.tasks.flush_post_readers',
+        'schedule': 60.0,  # Каждую минуту
+    },
+    'refresh-co-engagement': {
+        'task': 'apps.main.tasks.refresh_co_engagement',
+        'schedule': 900.0,  # Каждые 15 минут
+    },
+    'rebuild-co-engagement': {
+        'task': 'apps.main.tasks.rebuild_co_engagement',
+        'schedule': 86400.0,  # Каждый день
+    },
+    'collect-media-blobs': {
+        'task': 'apps.media.tasks.collect_media_blobs',
+        'schedule': 86400.0,  # Каждый день
+    },
     'check-expired-subscriptions': {
         'task': 'apps.subscribe.tasks.check_expired_subscriptions',
         'schedule': 3600.0,  # Каждый час
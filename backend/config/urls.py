@@ -3,9 +3,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from apps.main.views import home_snapshot, sync_changes
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/auth/', include('apps.accounts.urls')),
+    path('api/v1/home/', home_snapshot, name='home'),
+    path('api/v1/sync/', sync_changes, name='sync'),
     path('api/v1/posts/', include('apps.main.urls')),
     path('api/v1/comments/', include('apps.comments.urls')),
     path('api/v1/subscribe/', include('apps.subscribe.urls')),